@@ -1,10 +1,10 @@
 import time
-from datetime import timedelta, timezone
+from datetime import timedelta
 from flask import Flask, session, url_for, jsonify, Response, g
 import uuid
 from flask import render_template,  request, redirect, current_app
 from flask_socketio import SocketIO
-from flask_session import Session
+from services.session_service import ElidingMongoDBSessionInterface
 from pymongo import MongoClient
 import bcrypt
 import os
@@ -22,12 +22,19 @@ from routes.min import register_min_socketio_events
 import glob
 from models.bot import Bot
 from flask_cors import CORS
-from services.logs_service import LogsService
+from services.admin_cache import admin_cache
+from services.geoip_service import geoip, geo_enricher
+from services.settings_service import SettingsService
+from services.container import ServiceContainer
+from services.index_registry import ensure_indexes
+from services.logs_service import RequestLogWriter, parse_sample_rates
 from models.log import LogLevel, LogTag, LogEntry
 import traceback
 from datetime import datetime
 import json
-from services.admin_service import AdminService
+from services.circuit_breaker import generation_breaker, CircuitState
+from services.db_metrics import round_trip_counter
+from services.usage_service import UsageMeter
 from urllib.parse import urlparse
 from flask_mail import Mail, Message
 
@@ -76,9 +83,13 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
 
     # Setup MongoDB
-    client = MongoClient(app.config['MONGODB_URI'])
+    client = MongoClient(app.config['MONGODB_URI'],
+                         event_listeners=[round_trip_counter])
     db = client.get_database()
     app.db = db
+    # Skipped after the first start of a deploy, see ensure_indexes.py
+    ensure_indexes(db)
+    app.services = ServiceContainer(db)
     app.config['SESSION_MONGODB'] = client
     app.config['ONLINE_USERS'] = 0
     app.config['NOTIFICATIONS'] = []
@@ -139,19 +150,24 @@ def create_app(config_class=Config):
                     'healthcheck',
                     'robots.txt'}
 
-    SENSITIVE_HEADERS = {
-        'Authorization',
-        'Cookie',
-        'X-Api-Key',
-        'X-CSRFToken', 'password'
-    }
+    SENSITIVE_FIELDS = {'password', 'new_password', 'confirm_password', 'token', 'code'}
 
     @app.before_request
     def skip_auth_on_options():
         if request.method == 'OPTIONS':
             return Response(status=204)
 
-    logs_service = LogsService(app.db)
+    logs_service = app.services.logs_service
+    admin_cache.listen(app.db)
+    geoip.load_async()
+    geo_enricher.start(app.db)
+    request_log_writer = RequestLogWriter(
+        app.db,
+        batch_size=app.config['REQUEST_LOG_BATCH_SIZE'],
+        flush_interval=app.config['REQUEST_LOG_FLUSH_INTERVAL'],
+        max_queue=app.config['REQUEST_LOG_QUEUE_SIZE'],
+        sample_rates=parse_sample_rates(app.config['REQUEST_LOG_SAMPLING']))
+    app.request_log_writer = request_log_writer
 
     app.config['MAIL_SERVER'] = os.environ.get('SMTP_SERVER')
     app.config['MAIL_PORT'] = int(os.environ.get('SMTP_PORT', 465))
@@ -200,14 +216,14 @@ def create_app(config_class=Config):
     #
     #     if admin_id:
     #         # print(f"[DB] Fetching admin by ID: {admin_id}")
-    #         admin = AdminService(app.db).get_admin_by_id(admin_id)
+    #         admin = app.services.admin_service.get_admin_by_id(admin_id)
     #         # print(f"[DB] Admin fetched: {admin}")
     #     else:
     #         sec_key = request.headers.get('SECRET_KEY')
     #         # print(
     #             f"[SECURITY] No admin_id found. Checking for SECRET_KEY in headers: {sec_key}")
     #         if sec_key:
-    #             admin = AdminService(app.db).get_admin_by_key(sec_key)
+    #             admin = app.services.admin_service.get_admin_by_key(sec_key)
     #             # print(f"[DB] Admin fetched using SECRET_KEY: {admin}")
     #         else:
     #             # print("[ERROR] No admin_id or SECRET_KEY provided. Returning 403.")
@@ -270,19 +286,19 @@ def create_app(config_class=Config):
         # Attempt admin fetch by ID
         if admin_id:
             # # print(f"[DB] Fetching admin by ID: {admin_id}")
-            admin = AdminService(app.db).get_admin_by_id(admin_id)
+            admin = app.services.admin_service.get_admin_by_id(admin_id)
 
         # If no admin yet, try SECRET_KEY
         if not admin and sec_key:
             # # print(f"[DB] Fetching admin by SECRET_KEY: {sec_key}")
-            admin = AdminService(app.db).get_admin_by_key(sec_key)
+            admin = app.services.admin_service.get_admin_by_key(sec_key)
 
         # If still no admin, use default fallback
         if not admin:
             fallback_admin_id = os.environ.get('DEFAULT_ADMIN_ID')
             # # print(f"[FALLBACK] No valid admin_id or SECRET_KEY. Using DEFAULT_ADMIN_ID: {
             # fallback_admin_id}")
-            admin = AdminService(app.db).get_admin_by_id(fallback_admin_id)
+            admin = app.services.admin_service.get_admin_by_id(fallback_admin_id)
 
         # Final check
         if not admin:
@@ -310,31 +326,25 @@ def create_app(config_class=Config):
 
     @app.before_request
     def log_request():
-        """Comprehensive request logging middleware"""
-        try:
-            path = request.path.strip(
-                '/').split('/')[0] if request.path else 'root'
-
-            # Skip ignored paths
-            if path in IGNORE_PATHS:
-                return
-
-            # Prepare request data
-            request_id = str(uuid.uuid4())
-            g.request_id = request_id  # Store in Flask's g for later use
+        """Tag the request for logging; the record itself is written after the response"""
+        path = request.path.strip('/').split('/')[0] if request.path else 'root'
+        if path in IGNORE_PATHS:
+            return
 
-            # Redact sensitive headers
-            headers = dict(request.headers)
-            for header in SENSITIVE_HEADERS:
-                if header in headers:
-                    headers[header] = '[REDACTED]'
+        g.request_id = str(uuid.uuid4())
+        # Exception logs reference this as related_request
+        g.log_id = g.request_id
+        g.request_started = time.time()
+        round_trip_counter.start()
 
-            # Get user/agent information
-            user_id = session.get('user_id')
-            admin_id = session.get('admin_id')
-            ip_address = request.headers.get(
-                'X-Forwarded-For', request.remote_addr)
-            user_agent = request.headers.get('User-Agent')
+    @app.after_request
+    def log_response(response):
+        """Queue one compact request+response record for the background log writer"""
+        db_round_trips = round_trip_counter.stop()
+        if not hasattr(g, 'log_id'):
+            return response
+        try:
+            path = request.path.strip('/').split('/')[0] if request.path else 'root'
 
             # Determine log level based on path
             if path.startswith('admin'):
@@ -347,79 +357,55 @@ def create_app(config_class=Config):
                 log_level = LogLevel.INFO
                 log_tag = LogTag.ACCESS
 
-            # Create request data payload
+            if not request_log_writer.should_log(path, log_tag, response.status_code):
+                return response
+
             request_data = {
-                'request_id': request_id,
+                'request_id': g.request_id,
                 'method': request.method,
                 'path': request.path,
                 'endpoint': request.endpoint,
                 'args': dict(request.args),
-                'headers': headers,
-                'ip': ip_address,
-                'user_agent': user_agent,
+                'ip': request.headers.get('X-Forwarded-For', request.remote_addr),
+                'user_agent': request.headers.get('User-Agent'),
+                'referer': request.headers.get('Referer'),
                 'content_type': request.content_type,
                 'content_length': request.content_length
             }
-
-            # For form data
             if request.form:
-                request_data['form_data'] = dict(request.form)
-
-            # For JSON data
+                request_data['form_data'] = {
+                    k: '[REDACTED]' if k in SENSITIVE_FIELDS else v
+                    for k, v in request.form.items()}
             if request.is_json:
-                try:
-                    request_data['json_data'] = request.get_json()
-                except Exception as e:
-                    request_data['json_data_error'] = f'Invalid JSON payload: {
-                        str(e)}'
-
-            # Create the log entry
-            log_entry = logs_service.create_log(
+                body = request.get_json(silent=True)
+                if isinstance(body, dict):
+                    body = {k: '[REDACTED]' if k in SENSITIVE_FIELDS else v
+                            for k, v in body.items()}
+                request_data['json_data'] = body
+
+            log_entry = LogEntry(
                 level=log_level,
                 tag=log_tag,
                 message=f"{request.method} {request.path}",
-                user_id=user_id,
-                admin_id=admin_id,
+                user_id=session.get('user_id'),
+                admin_id=session.get('admin_id'),
                 data={
                     'request': request_data,
-                    'session': {
-                        'session_id': session.get('_id'),
-                        'session_data': {k: v for k, v in session.items()
-                                         if not k.startswith('_')}
+                    'response': {
+                        'status_code': response.status_code,
+                        'content_length': response.content_length,
+                        'content_type': response.content_type
                     }
                 }
             )
-
-            # Store log ID for potential error correlation
-            g.log_id = log_entry.log_id
-
+            log_entry.log_id = g.log_id
+            record = log_entry.to_dict()
+            record['db_round_trips'] = db_round_trips['total']
+            record['duration'] = round(time.time() - g.request_started, 4)
+            request_log_writer.submit(record)
         except Exception as e:
             app.logger.error(f"Failed to log request: {
                              str(e)}\n{traceback.format_exc()}")
-
-    @app.after_request
-    def log_response(response):
-        """Log response information"""
-
-        # admin_id = session.get('admin_id')
-        try:
-            if hasattr(g, 'log_id') and hasattr(g, 'request_id'):
-                logs_service.logs_collection.update_one(
-                    {'log_id': g.log_id},
-                    {'$set': {
-                        'response': {
-                            'status_code': response.status_code,
-                            'content_length': response.content_length,
-                            'content_type': response.content_type,
-                            'headers': dict(response.headers)
-                        },
-                        'completed_at': datetime.now(timezone.utc),
-                        'duration': (datetime.now(timezone.utc) - g.get('request_start_time', datetime.now(timezone.utc))).total_seconds()
-                    }}
-                )
-        except Exception as e:
-            app.logger.error(f"Failed to log response: {
-                             str(e)}\n{traceback.format_exc()}")
         return response
 
     @app.errorhandler(Exception)
@@ -558,69 +544,69 @@ def create_app(config_class=Config):
 
         return {'error': 'Something went wrong'}, 500
 
-    conf = db.config.find_one({"id": "settings"})
-    if conf:
-        app.config['SETTINGS'] = conf
-    else:
-        # Initialize default superadmin settings
-        app.config['SETTINGS'] = {
-            'id': 'settings',
-            'logo': {
-                'large': '/static/img/logo.svg',
-                'small': '/static/img/logo-desktop-mini.svg',
-            },
-            'apiKeys': {
-                'claude': Config.CLAUDE_KEY,
-                'openAi': Config.OPENAI_KEY,
-                'deepseek': Config.DEEPSEEK_KEY,
-                'gemini': Config.GEMINI_KEY
-            },
-            'model': 'gemini_2.0_flash',
-            'theme': 'system',
-            'sound': '/static/sounds/notification.wav',
-            'backend_url': Config.BACKEND_URL,
-            'prompt': """you are a customer service assistant..."""
-        }
-        db.config.insert_one(app.config['SETTINGS'])
-    if not app.config['SETTINGS'].get('2fa'):
-
-        app.config['SETTINGS']['2fa'] = {
-            "duration": 1, "unit": 'days'}
+    app.settings_service = SettingsService(db)
+    # Defaults for a fresh install, and for keys added since the stored settings were created
+    app.settings_service.initialize({
+        'logo': {
+            'large': '/static/img/logo.svg',
+            'small': '/static/img/logo-desktop-mini.svg',
+        },
+        'apiKeys': {
+            'claude': Config.CLAUDE_KEY,
+            'openAi': Config.OPENAI_KEY,
+            'deepseek': Config.DEEPSEEK_KEY,
+            'gemini': Config.GEMINI_KEY
+        },
+        'model': 'gemini_2.0_flash',
+        'theme': 'system',
+        'sound': '/static/sounds/notification.wav',
+        'backend_url': Config.BACKEND_URL,
+        'prompt': """you are a customer service assistant...""",
+        '2fa': {"duration": 1, "unit": 'days'}
+    })
 
     @app.context_processor
     def inject_settings():
         """Inject settings into templates, combining superadmin settings with admin-specific settings"""
-        settings_data = app.config['SETTINGS'].copy()
-
         admin_id = session.get('admin_id')
-        if admin_id:
-            admin_service = AdminService(app.db)
-            admin = admin_service.get_admin_by_id(admin_id)
-            if admin:
-                # Merge admin-specific settings with superadmin settings
-                # Admin settings take precedence for overlapping keys
-                if admin.settings:
-                    settings_data.update(admin.settings)
-
-                # Special handling for languages and subjects
-                if 'languages' in admin.settings:
-                    settings_data['languages'] = admin.settings['languages']
-                if 'subjects' in admin.settings:
-                    settings_data['subjects'] = admin.settings['subjects']
-
-        return {'settings': settings_data}
+        admin = app.services.admin_service.get_admin_by_id(admin_id) if admin_id else None
+        # Precomputed per admin and settings version, admin settings take precedence
+        return {'settings': app.settings_service.for_admin(admin)}
 
     app.bot = Bot(Config.BOT_NAME, app=app)
+    app.usage_meter = UsageMeter(db, app.config['USAGE_FLUSH_INTERVAL'])
 
     # app.config['SETTINGS']['backend_url'] = 'https://192.168.22.249:5000'
 
-    # Setup Flask-Session
-    Session(app)
+    # Setup Flask-Session, unchanged sessions are not rewritten
+    app.session_interface = ElidingMongoDBSessionInterface(
+        app,
+        client=client,
+        db=app.config['SESSION_MONGODB_DB'],
+        collection=app.config['SESSION_MONGODB_COLLECT'],
+        key_prefix=app.config['SESSION_KEY_PREFIX'],
+        use_signer=app.config['SESSION_USE_SIGNER'],
+        permanent=app.config['SESSION_PERMANENT'],
+    )
 
     # Setup SocketIO
     socketio = SocketIO(app,  async_mode="threading",
                         manage_session=False, cors_allowed_origins="*")
     app.socketio = socketio
+
+    def on_bot_circuit_change(breaker, old_state, new_state):
+        """Surface bot circuit breaker transitions to admins"""
+        status = breaker.status()
+        level = LogLevel.INFO if new_state == CircuitState.CLOSED else LogLevel.WARNING
+        logs_service.create_log(
+            level=level,
+            tag=LogTag.SYSTEM,
+            message=f"Bot circuit {old_state} -> {new_state}",
+            data=status
+        )
+        socketio.emit('bot_status', status, room='admin')
+
+    generation_breaker.add_listener(on_bot_circuit_change)
     
 
 
@@ -669,20 +655,18 @@ def create_app(config_class=Config):
     def render_chatbot(client_sec):
         # print(session.items())
         if client_sec:
-            admin_service = AdminService(app.db)
+            admin_service = app.services.admin_service
             admin = admin_service.get_admin_from_sec(client_sec)
+            if not admin:
+                return "Invalid Secrect Key", 403
             if session.get('admin_id') != admin.admin_id:
                 session.clear()
-            if admin:
-
-                session['admin_id'] = admin.admin_id
-            else:
-                return "Invalid Secrect Key", 403
+            session['admin_id'] = admin.admin_id
         else:
             admin_id = os.environ.get('DEFAULT_ADMIN_ID')
             session['admin_id'] = admin_id
 
-        return Response(render_template('js/init_chat.js', backend_url=app.config['SETTINGS']['backend_url']), mimetype='application/javascript')
+        return Response(render_template('js/init_chat.js', backend_url=app.settings_service.current()['backend_url']), mimetype='application/javascript')
 
     @app.route("/site-map")
     def site_map():
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Chat Rollups Backfill Script
+Rebuilds the `chat_rollups` dashboard counters from the chats collection
+with one aggregation per granularity. Run once after deploying rollups,
+or again to repair drift; ChatService keeps them current afterwards.
+"""
+
+import os
+import time
+import argparse
+from pymongo import MongoClient
+from services.rollup_service import ChatRollupService
+from services.index_registry import ensure_indexes
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def backfill(admin_id=None):
+    print("=== Chat Rollups Backfill ===")
+
+    mongo_uri = os.environ.get(
+        'MONGODB_URI', 'mongodb://localhost:27017/chatbot')
+    client = MongoClient(mongo_uri)
+    db = client.get_database()
+    # The rebuild upserts rely on the unique rollup bucket index
+    ensure_indexes(db)
+
+    started = time.time()
+    written = ChatRollupService(db).rebuild(admin_id)
+    scope = f"admin {admin_id}" if admin_id else "all admins"
+    print(f"✅ Wrote {written} rollup buckets for {scope} in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild dashboard chat rollups")
+    parser.add_argument("--admin-id", help="only rebuild this admin's rollups")
+    args = parser.parse_args()
+    backfill(args.admin_id)
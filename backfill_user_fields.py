@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+User Fields Backfill Script
+Fills in derived fields that reads used to patch up one document at a time:
+users' `company` and `city`/`country`, and chats without an `admin_id`.
+Works in _id-ordered batches with one bulk write per batch, only touches
+documents still missing the field, and can be stopped and re-run safely.
+"""
+
+import os
+import time
+import argparse
+from pymongo import MongoClient, UpdateOne
+from services.geoip_service import geoip, remote_lookup
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MISSING = [None, ""]
+
+
+def in_batches(collection, query, projection, batch_size):
+    """Yield lists of matching documents in _id order, resuming after the last _id seen"""
+    last_id = None
+    while True:
+        batch_query = {"$and": [query, {"_id": {"$gt": last_id}}]} if last_id else query
+        batch = list(collection.find(batch_query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]["_id"]
+
+
+def progress(label, done, total, started):
+    print(f"  {label}: {done}/{total} ({time.time() - started:.1f}s)")
+
+
+def backfill_company(db, batch_size, dry_run):
+    query = {"company": {"$in": MISSING}, "name": {"$nin": MISSING}}
+    total = db.users.count_documents(query)
+    print(f"🏢 company: {total} users")
+    if dry_run or not total:
+        return
+
+    started, done = time.time(), 0
+    for batch in in_batches(db.users, query, {"_id": 1, "name": 1}, batch_size):
+        # Same rule as User: the company defaults to the user's name
+        result = db.users.bulk_write([
+            UpdateOne({"_id": user["_id"], "company": {"$in": MISSING}},
+                      {"$set": {"company": user["name"]}})
+            for user in batch
+        ], ordered=False)
+        done += result.modified_count
+        progress("company", done, total, started)
+
+
+def backfill_geo(db, batch_size, dry_run, remote):
+    query = {"country": {"$in": MISSING}, "ip": {"$nin": MISSING}}
+    total = db.users.count_documents(query)
+    print(f"🌍 city/country: {total} users")
+    if dry_run or not total:
+        return
+
+    geoip.load()
+    started, seen, done = time.time(), 0, 0
+    for batch in in_batches(db.users, query, {"_id": 1, "ip": 1}, batch_size):
+        operations = []
+        for user in batch:
+            location = geoip.lookup(user["ip"])
+            if location is None and remote:
+                location = remote_lookup(user["ip"])
+            if location:
+                city, country = location
+                operations.append(UpdateOne(
+                    {"_id": user["_id"], "country": {"$in": MISSING}},
+                    {"$set": {"city": city, "country": country}}))
+        if operations:
+            done += db.users.bulk_write(operations, ordered=False).modified_count
+        seen += len(batch)
+        progress(f"city/country ({seen} checked)", done, total, started)
+    if done < total:
+        print(f"  ⚠️  {total - done} users have private or unknown addresses")
+
+
+def backfill_chat_admin(db, batch_size, dry_run, admin_id):
+    query = {"$or": [{"admin_id": {"$exists": False}}, {"admin_id": {"$in": MISSING}}]}
+    total = db.chats.count_documents(query)
+    print(f"👤 chat admin_id: {total} chats")
+    if dry_run or not total:
+        return
+    if not admin_id:
+        print("  ⏭️  skipped, pass --admin-id to assign these chats")
+        return
+    if not db.admins.find_one({"admin_id": admin_id}, {"_id": 1}):
+        print(f"  ❌ no admin with id {admin_id}")
+        return
+
+    started, done = time.time(), 0
+    for batch in in_batches(db.chats, query, {"_id": 1}, batch_size):
+        result = db.chats.update_many(
+            {"$and": [{"_id": {"$in": [chat["_id"] for chat in batch]}}, query]},
+            {"$set": {"admin_id": admin_id}}
+        )
+        done += result.modified_count
+        progress("chat admin_id", done, total, started)
+    print("  ℹ️  run backfill_chat_rollups.py so the dashboard charts count them")
+
+
+def backfill(fields, batch_size, dry_run, remote, admin_id):
+    print("=== User Fields Backfill ===")
+
+    mongo_uri = os.environ.get(
+        'MONGODB_URI', 'mongodb://localhost:27017/chatbot')
+    client = MongoClient(mongo_uri)
+    db = client.get_database()
+
+    started = time.time()
+    if "company" in fields:
+        backfill_company(db, batch_size, dry_run)
+    if "geo" in fields:
+        backfill_geo(db, batch_size, dry_run, remote)
+    if "chat-admin" in fields:
+        backfill_chat_admin(db, batch_size, dry_run, admin_id)
+    print(f"✅ Done in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill derived user and chat fields")
+    parser.add_argument("--only", action="append", choices=["company", "geo", "chat-admin"],
+                        help="limit to these fields (repeatable), default all")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--admin-id", help="admin to assign chats that have none")
+    parser.add_argument("--remote", action="store_true",
+                        help="look up addresses missing from the GeoIP database online (slow, rate limited)")
+    parser.add_argument("--dry-run", action="store_true", help="only count what is missing")
+    args = parser.parse_args()
+    backfill(set(args.only or ["company", "geo", "chat-admin"]),
+             args.batch_size, args.dry_run, args.remote, args.admin_id)
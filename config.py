@@ -24,3 +24,14 @@ class Config:
     BOT_NAME = os.environ.get('BOT_NAME', "GO Globe Bot")
     PORT = os.environ.get('SVR_PORT', 5000)
     BACKEND_URL = os.environ.get('BACKEND_URL')
+    # Hand chats to an admin instead of apologising while the bot circuit is open
+    BOT_OUTAGE_HANDOFF = os.environ.get(
+        'BOT_OUTAGE_HANDOFF', 'false').lower() == 'true'
+    # Seconds between usage metering writes, 0 writes every bot reply through
+    USAGE_FLUSH_INTERVAL = float(os.environ.get('USAGE_FLUSH_INTERVAL', 5))
+    # Request logs are queued and written in batches by a background thread
+    REQUEST_LOG_BATCH_SIZE = int(os.environ.get('REQUEST_LOG_BATCH_SIZE', 200))
+    REQUEST_LOG_FLUSH_INTERVAL = float(os.environ.get('REQUEST_LOG_FLUSH_INTERVAL', 2))
+    REQUEST_LOG_QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE_SIZE', 10000))
+    # Fraction of requests logged per path segment or tag, e.g. "api=0.1,ADMIN=1,default=1"
+    REQUEST_LOG_SAMPLING = os.environ.get('REQUEST_LOG_SAMPLING', '')
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Index Provisioning Script
+Creates every index in services/index_registry.py. Run it once per deploy;
+the app also applies the registry at startup, but skips it when this
+version was already applied, so running it here keeps index builds out of
+the first requests after a release.
+"""
+
+import os
+import time
+import argparse
+from pymongo import MongoClient
+from services.index_registry import INDEXES, ensure_indexes, registry_fingerprint
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def provision(force=False, dry_run=False):
+    print("=== Index Provisioning ===")
+
+    if dry_run:
+        for name, models in INDEXES.items():
+            print(f"📇 {name}")
+            for model in models:
+                print(f"    {model.document['name']}")
+        print(f"Registry fingerprint: {registry_fingerprint()[:12]}")
+        return
+
+    mongo_uri = os.environ.get(
+        'MONGODB_URI', 'mongodb://localhost:27017/chatbot')
+    client = MongoClient(mongo_uri)
+    db = client.get_database()
+
+    started = time.time()
+    if not ensure_indexes(db, force=force):
+        print("⏭️  Registry already applied, pass --force to apply it again")
+        return
+    print(f"Done in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the indexes the app relies on")
+    parser.add_argument("--force", action="store_true", help="apply even if this registry version was applied")
+    parser.add_argument("--dry-run", action="store_true", help="only list the registered indexes")
+    args = parser.parse_args()
+    provision(force=args.force, dry_run=args.dry_run)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Channel Messages Migration Script
+Moves WhatsApp and Messenger messages from the arrays embedded in each
+thread document into the whatsapp_messages / facebook_messages collections,
+then trims each thread to its most recent messages and records its
+message_count. Until a thread is migrated it keeps growing its full array.
+Safe to stop and re-run: copies are keyed by (thread, message id).
+"""
+
+import os
+import time
+import argparse
+from pymongo import MongoClient, UpdateOne
+from services.channel_messages import RECENT_MESSAGES
+from services.index_registry import ensure_indexes
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHANNELS = {
+    "whatsapp": ("whatsapp", "whatsapp_messages", "phone_no"),
+    "facebook": ("facebook", "facebook_messages", "sender_id"),
+}
+
+
+def migrate_channel(db, name, dry_run):
+    threads_name, messages_name, thread_field = CHANNELS[name]
+    threads, messages = db[threads_name], db[messages_name]
+
+    pending_filter = {"message_count": {"$exists": False}}
+    pending = threads.count_documents(pending_filter)
+    print(f"💬 {name}: {pending} threads to migrate")
+    if dry_run or not pending:
+        return
+
+    started, done, copied = time.time(), 0, 0
+    for thread in threads.find(pending_filter, {"_id": 1, thread_field: 1, "messages": 1}):
+        thread_id = thread.get(thread_field)
+        operations = [
+            UpdateOne({"thread": thread_id, "id": message["id"]},
+                      {"$setOnInsert": {**message, "thread": thread_id}}, upsert=True)
+            for message in thread.get("messages") or [] if message.get("id")
+        ]
+        if operations:
+            result = messages.bulk_write(operations, ordered=False)
+            copied += result.upserted_count
+
+        threads.update_one(
+            {"_id": thread["_id"], "message_count": {"$exists": False}},
+            {"$set": {"message_count": messages.count_documents({"thread": thread_id})},
+             "$push": {"messages": {"$each": [], "$slice": -RECENT_MESSAGES}}}
+        )
+        done += 1
+        if done % 100 == 0:
+            print(f"  {done}/{pending} threads, {copied} messages ({time.time() - started:.1f}s)")
+    print(f"✅ {name}: {done} threads, {copied} messages copied in {time.time() - started:.1f}s")
+
+
+def migrate(channels, dry_run=False):
+    print("=== Channel Messages Migration ===")
+
+    mongo_uri = os.environ.get(
+        'MONGODB_URI', 'mongodb://localhost:27017/chatbot')
+    client = MongoClient(mongo_uri)
+    db = client.get_database()
+    # Copies are looked up by (thread, id)
+    ensure_indexes(db)
+
+    for name in channels:
+        migrate_channel(db, name, dry_run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move channel messages into their own collections")
+    parser.add_argument("--only", action="append", choices=list(CHANNELS),
+                        help="limit to these channels (repeatable), default all")
+    parser.add_argument("--dry-run", action="store_true", help="only count threads still to migrate")
+    args = parser.parse_args()
+    migrate(args.only or list(CHANNELS), dry_run=args.dry_run)
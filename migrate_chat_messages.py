@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Chat Messages Migration Script
+Moves the embedded `chats.messages` arrays into bucketed `chat_messages`
+documents, one chat at a time, so memory use stays flat on large databases.
+
+Safe to stop and re-run: only chats that still embed messages are picked up,
+and chats that get a new message meanwhile are migrated by ChatService.add_message.
+"""
+
+import os
+import sys
+import time
+import argparse
+from pymongo import MongoClient
+from services.chat_service import ChatService
+from services.index_registry import ensure_indexes
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def migrate(batch_size=100, limit=None, dry_run=False):
+    print("=== Chat Messages Migration ===")
+
+    mongo_uri = os.environ.get(
+        'MONGODB_URI', 'mongodb://localhost:27017/chatbot')
+    client = MongoClient(mongo_uri)
+    db = client.get_database()
+    # Bucket upserts rely on the unique (room_id, bucket) index
+    ensure_indexes(db)
+    chat_service = ChatService(db)
+
+    pending_filter = {"messages": {"$exists": True}}
+    pending = db.chats.count_documents(pending_filter)
+    print(f"Chats to migrate: {pending}")
+    if dry_run or not pending:
+        return
+
+    cursor = db.chats.find(
+        pending_filter,
+        {"_id": 0, "room_id": 1, "admin_id": 1, "messages": 1},
+        batch_size=batch_size
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+
+    started = time.time()
+    migrated = skipped = failed = messages = 0
+    try:
+        for chat_data in cursor:
+            try:
+                if chat_service.migrate_chat(chat_data):
+                    migrated += 1
+                    messages += len(chat_data.get("messages") or [])
+                else:
+                    # Changed while being read; the next run picks it up again
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                print(f"❌ {chat_data.get('room_id')}: {e}")
+
+            done = migrated + skipped + failed
+            if done % batch_size == 0:
+                print(f"   {done}/{pending} chats ({messages} messages) "
+                      f"in {time.time() - started:.1f}s")
+    finally:
+        cursor.close()
+
+    print()
+    print(f"✅ Migrated {migrated} chats ({messages} messages) in {time.time() - started:.1f}s")
+    if skipped or failed:
+        print(f"   Skipped {skipped}, failed {failed}. Run again to retry them.")
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move chat messages into chat_messages buckets")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--limit", type=int, help="migrate at most this many chats")
+    parser.add_argument("--dry-run", action="store_true", help="only count pending chats")
+    args = parser.parse_args()
+    migrate(args.batch_size, args.limit, args.dry_run)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Logs Retention Migration Script
+Stamps existing logs with the `expires_at` their level's retention gives
+them, so the TTL index on the logs collection starts removing old
+entries. Logs written by the app already carry it.
+"""
+
+import os
+import time
+import argparse
+from pymongo import MongoClient
+from services.logs_service import LogsService, LOG_RETENTION_DAYS
+from services.index_registry import ensure_indexes
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def migrate(dry_run=False):
+    print("=== Logs Retention Migration ===")
+
+    mongo_uri = os.environ.get(
+        'MONGODB_URI', 'mongodb://localhost:27017/chatbot')
+    client = MongoClient(mongo_uri)
+    db = client.get_database()
+
+    # Creates the level/tag/text/TTL indexes if this deploy has not yet
+    ensure_indexes(db)
+    logs_collection = LogsService(db).logs_collection
+
+    started = time.time()
+    for level, days in LOG_RETENTION_DAYS.items():
+        query = {"level": level, "expires_at": {"$exists": False},
+                 "timestamp": {"$type": "date"}}
+        if days <= 0:
+            print(f"⏭️  {level}: kept forever")
+            continue
+        if dry_run:
+            print(f"🔍 {level}: {logs_collection.count_documents(query)} logs would expire after {days:g} days")
+            continue
+        result = logs_collection.update_many(
+            query,
+            [{"$set": {"expires_at": {"$add": ["$timestamp", int(days * 86400 * 1000)]}}}]
+        )
+        print(f"✅ {level}: {result.modified_count} logs expire after {days:g} days")
+
+    print(f"Done in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply log retention to existing logs")
+    parser.add_argument("--dry-run", action="store_true", help="only count logs per level")
+    args = parser.parse_args()
+    migrate(args.dry_run)
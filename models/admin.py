@@ -34,7 +34,7 @@ class Admin:
         }
         self.expo_tokens = expo_tokens
 
-        # Superadmin settings are now stored in app.config['SETTINGS']
+        # Superadmin settings are stored in the config collection, see SettingsService
         # Only store admin-specific settings here
         if self.role == 'superadmin':
             self.settings = settings or {}  # Superadmins don't need local settings
@@ -1,257 +1,45 @@
 import os
 import pickle
-import requests
 from io import BytesIO
 from dotenv import load_dotenv
 from PIL import Image
-from google import genai
 from google.genai import types
 import json
+import time
+from services.tool_registry import tool_registry
+from services.latency_service import elapsed_ms
+from services.llm_transport import get_transport
 
 
 load_dotenv()
 
 
 class Bot:
-    def __init__(self, name, app):
-        self.gm_key = app.config['SETTINGS']['apiKeys']['gemini']
-        self.base_prompt = app.config["SETTINGS"]["prompt"]
+    def __init__(self, name, app, client=None):
+        self.settings_service = app.settings_service
+        self.gm_key = self.settings_service.current()['apiKeys']['gemini']
         
-        self.client = genai.Client(api_key=os.getenv('GEMINI_KEY'))
+        # Live, recording or replaying client depending on LLM_TRANSPORT
+        self.client = client or get_transport().genai_client(os.getenv('GEMINI_KEY'))
         
         # Hardcoded model assignments
         self.transcription_model = "gemini-2.5-flash-lite"
         self.audio_generation_model = "gemini-2.5-flash-preview-tts"
         self.text_model = "gemini-2.5-flash"
         
-        # Aldar Exchange API base URL
-        self.aldar_base_url = "https://aldarexchangeuat.net/ONLINEApp"
-        
-        # Define Aldar Exchange tools
-        self.tools = [
-            types.Tool(
-                function_declarations=[
-                    types.FunctionDeclaration(
-                        name="get_exchange_rate",
-                        description="""Retrieve the most up-to-date exchange rate for a requested rate category. This function should be used whenever the user asks about:
-
-exchange rate values,
-
-currency rates,
-
-price of a currency,
-
-“how much is 1 ___ in QR?”,
-
-comparisons between currencies,
-
-forex rate info,
-
-standard exchange rate data.
-
-If the user asks anything about what a currency is worth, what the current rate is, or a question containing words like “rate”, “exchange”, “forex”, “value”, or “convert price” without needing a full conversion calculation, call this function.
-
-Use rate_type = 1 for standard exchange rates unless the user clearly specifies another type code.""",
-                        parameters={
-                            "type": "object",
-                            "properties": {
-                                "rate_type": {
-                                    "type": "integer",
-                                    "description": "The rate type code (e.g., 1 for standard rate)"
-                                }
-                            },
-                            "required": ["rate_type"]
-                        }
-                    ),
-                    types.FunctionDeclaration(
-                        name="get_branch_details",
-                        description="""
-Return full details about all Aldar Exchange branches. Data includes:
-
-branch names,
-
-addresses,
-
-phone numbers,
-
-geographic coordinates,
-
-working days and working hours,
-
-break times if available,
-
-operational info.
-
-This function must be called whenever the user asks or implies anything related to:
-
-
-branch contact numbers (“phone number?”, “call?”, “whatsapp?”),
-
-office timings (“what time open?”, “closing time?”, “working hours?”, “weekend timing?”, “holiday timing?”),
-
-availability queries (“are they open now?”, “when can I visit?”, “do they open Friday?”),
-
-physical accessibility (“where is branch?”, “address?”, “full location?”),
-
-branch comparisons or lists (“all branches?”, “what branches exist?”).
-
-Even if the user does not explicitly say “branch,” but asks something about timing, hours, opening, closing, or phone number, assume they want branch details and call this function.
-
-                        """,
-                        parameters={
-                            "type": "object",
-                            "properties": {}
-                        }
-                    ),
-                    types.FunctionDeclaration(
-                        name="calculate_exchange",
-                        description="""Perform currency exchange conversion between QAR and a foreign currency based on either a given QAR value or foreign currency value. The function uses live rates supplied by Aldar Exchange.
-
-Call this function if the user asks:
-
-to convert money amount (“convert 100 USD to QAR”),
-
-“how much will I get?” style questions,
-
-conversion with specific amount,
-
-buying or selling currency values,
-
-transfer vs cash exchange amounts.
-
-Rules:
+        # Aldar Exchange tools are shared with the voice bridge
+        self.tool_registry = tool_registry
+        self.aldar_base_url = tool_registry.base_url
+        self.tools = tool_registry.gemini_tools("text")
 
-transaction_type defines method:
-
-'tt' = telegraphic transfer,
-
-'BUY' = customer buying foreign currency,
-
-'SELL' = customer selling foreign currency.
-
-Only one amount field should contain value:
-
-If user provides QAR → put in local_amount and set foreign_amount = 0,
-
-If user provides foreign value → put in foreign_amount and set local_amount = 0.
-
-User may phrase request indirectly, such as:
-
-“How much is 500 AED?”,
-
-“What do I get for 100 QAR in USD?”,
-
-“rate calculator?”,
-
-“exchange amount?”.
-In these cases, call this function.""",
-                        parameters={
-                            "type": "object",
-                            "properties": {
-                                "transaction_type": {
-                                    "type": "string",
-                                    "description": "Transaction type: 'tt' for transfer, 'BUY' for buying currency, 'SELL' for selling currency",
-                                    "enum": ["tt", "BUY", "SELL"]
-                                },
-                                "currency_code": {
-                                    "type": "string",
-                                    "description": "3-letter ISO currency code (e.g., USD, EUR, GBP)"
-                                },
-                                "local_amount": {
-                                    "type": "number",
-                                    "description": "Amount in local currency (QAR). Use 0 if specifying foreign amount."
-                                },
-                                "foreign_amount": {
-                                    "type": "number",
-                                    "description": "Amount in foreign currency. Use 0 if specifying local amount."
-                                }
-                            },
-                            "required": ["transaction_type", "currency_code", "local_amount", "foreign_amount"]
-                        }
-                    ),
-                    types.FunctionDeclaration(
-                        name="get_transaction_status",
-                        description="""Retrieve the status and details of a sent transaction using a reference number. The function returns:
-
-transaction stage (success, pending, failed, in progress),
-
-success or error message,
-
-additional info (if available).
-
-Call this function whenever user asks about:
-
-track money transfer,
-
-payment status,
-
-receipt check,
-
-transaction verification,
-
-reference checking,
-
-“Where is my money?”,
-
-“Did my transaction go through?”,
-
-“Is my transfer complete?”.
-
-Even vague requests such as “check my transfer”, “track my remittance”, or “confirm payment” should trigger this function as long as user provides or mentions a reference number.""",
-                        parameters={
-                            "type": "object",
-                            "properties": {
-                                "transaction_ref_no": {
-                                    "type": "string",
-                                    "description": "The transaction reference number (e.g., 63897333251760, 1882910250001460)"
-                                }
-                            },
-                            "required": ["transaction_ref_no"]
-                        }
-                    )
-                ]
-            )
-        ]
+    @property
+    def base_prompt(self):
+        # Follows superadmin prompt edits made in any worker
+        return self.settings_service.current()["prompt"]
 
     def _call_aldar_api(self, function_name, parameters):
         """Execute actual API calls to Aldar Exchange"""
-        try:
-            if function_name == "get_exchange_rate":
-                rate_type = parameters.get("rate_type", 1)
-                url = f"{self.aldar_base_url}/api/User/GetRate"
-                response = requests.get(url, params={"type": rate_type})
-                response.raise_for_status()
-                return response.json()
-            
-            elif function_name == "get_branch_details":
-                url = f"{self.aldar_base_url}/api/User/GetBranchesDetails"
-                response = requests.get(url)
-                response.raise_for_status()
-                branches = response.json()
-                return {"branches": branches, "total_count": len(branches)}
-            
-            elif function_name == "calculate_exchange":
-                url = f"{self.aldar_base_url}/api/User/GetRate"
-                params = {
-                    "type": parameters.get("transaction_type"),
-                    "curcode": parameters.get("currency_code"),
-                    "lcyamount": parameters.get("local_amount", 0),
-                    "fcyamount": parameters.get("foreign_amount", 0)
-                }
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                return response.json()
-            
-
-            elif function_name == "get_transaction_status":
-                tran_ref_no = parameters.get("transaction_ref_no")
-                url = f"{self.aldar_base_url}/api/User/GetTransactionDetails"
-                response = requests.get(url, params={"tranRefNo": tran_ref_no})
-                response.raise_for_status()
-                return response.json()
-
-        except requests.exceptions.RequestException as e:
-            return {"error": f"API call failed: {str(e)}"}
+        return self.tool_registry.execute(function_name, parameters)
 
     def transcribe(self, audio_bytes):
         """Transcribe audio to text"""
@@ -337,15 +125,28 @@ Even vague requests such as “check my transfer”, “track my remittance”,
         
         return response_text, response_audio
 
-    def respond(self, input, id, type="text"):
-        """Main response method - handles text, audio input with function calling"""
+    def respond(self, input, id, type="text", timings=None):
+        """Main response method - handles text, audio input with function calling
+
+        If a `timings` dict is passed it is filled with per-stage latencies in
+        milliseconds: history_load_ms, model_ms (one entry per model round),
+        tools (name and ms per call) and history_save_ms.
+        """
+        timings = timings if timings is not None else {}
+        timings.setdefault("model_ms", [])
+        timings.setdefault("tools", [])
+
         if type == "audio":
+            started = time.perf_counter()
             input = self.transcribe(input)
+            timings["transcribe_ms"] = elapsed_ms(started)
         
         print(f"User input: {input}")
         
         # Load chat history and system instruction
+        started = time.perf_counter()
         history, system_instruction = self._load_chat(id)
+        timings["history_load_ms"] = elapsed_ms(started)
         # print("BOT RESPONDING ================== ")
         # print(history)
         # print(system_instruction)
@@ -363,7 +164,9 @@ Even vague requests such as “check my transfer”, “track my remittance”,
         )
         
         # Send initial message with tools enabled
+        started = time.perf_counter()
         response = chat.send_message(input)
+        timings["model_ms"].append(elapsed_ms(started))
         
         # Handle function calls
         while response.candidates[0].content.parts:
@@ -377,15 +180,20 @@ Even vague requests such as “check my transfer”, “track my remittance”,
                 print(f"Function called: {function_name}")
                 print(f"Arguments: {function_args}")
                 
+                started = time.perf_counter()
                 function_response = self._call_aldar_api(function_name, function_args)
+                timings["tools"].append(
+                    {"name": function_name, "ms": elapsed_ms(started)})
                 print(f"Function response: {function_response}")
                 
+                started = time.perf_counter()
                 response = chat.send_message(
                     types.Part.from_function_response(
                         name=function_name,
                         response=function_response
                     )
                 )
+                timings["model_ms"].append(elapsed_ms(started))
             else:
                 break
 
@@ -402,7 +210,9 @@ Even vague requests such as “check my transfer”, “track my remittance”,
         ))
         
         # Save updated history
+        started = time.perf_counter()
         self._save_chat(history, system_instruction, id)
+        timings["history_save_ms"] = elapsed_ms(started)
         
         return response.text, tokens
 
@@ -523,15 +333,17 @@ Even vague requests such as “check my transfer”, “track my remittance”,
 
 
 if __name__ == "__main__":
+    from types import SimpleNamespace
     from flask import Flask
     app = Flask(__name__)
-    app.config['SETTINGS'] = {
+    test_settings = {
         'apiKeys': {
             'gemini': os.getenv('GEMINI_KEY')
         },
         'prompt': "You are a helpful AI assistant specialized in helping users with currency exchange information.",
         'model': 'gemini-2.5-flash'
     }
+    app.settings_service = SimpleNamespace(current=lambda: test_settings)
 
     bot = Bot('test', app)
 
@@ -4,21 +4,30 @@ from uuid import uuid4
 
 
 class Message:
-    def __init__(self, sender, content, m_type="text",timestamp=None):
+    def __init__(self, sender, content, m_type="text",timestamp=None, timings=None, seq=None):
         self.id = uuid4()
         self.sender = sender
         self.content = content
         self.timestamp = timestamp or datetime.utcnow()
         self.m_type = m_type
+        # Bot turn latencies in ms, only set on bot replies
+        self.timings = timings
+        # 1-based position in the chat, assigned when stored in chat_messages
+        self.seq = seq
 
     def to_dict(self):
-        return {
+        data = {
                 "id":str(self.id),
             "sender": self.sender,
             "content": self.content,
             "type":self.m_type,
             "timestamp": self.timestamp
         }
+        if self.timings:
+            data["timings"] = self.timings
+        if self.seq is not None:
+            data["seq"] = self.seq
+        return data
 
     @classmethod
     def from_dict(cls, data):
@@ -26,7 +35,9 @@ class Message:
             sender=data.get("sender"),
             content=data.get("content"),
             m_type=data.get("type"),
-            timestamp=data.get("timestamp")
+            timestamp=data.get("timestamp"),
+            timings=data.get("timings"),
+            seq=data.get("seq")
         )
         msg.id = data.get("id")
         return msg
@@ -37,13 +48,17 @@ class Message:
 
 class Chat:
     def __init__(self, chat_id, user_id, bot_name="bot", messages=None,
-                 admin_required=False, admin_present=False, open=True, subject=None, exported=False, admin_id=None, lead_id=None, viewed=False, archived=False):
+                 admin_required=False, admin_present=False, open=True, subject=None, exported=False, admin_id=None, lead_id=None, viewed=False, archived=False,
+                 message_count=None, last_message=None, username=None):
         self.chat_id = chat_id
         # Generate room_id from user_id and first 8 chars of chat_id
         self.room_id = f"{user_id}-{chat_id[:8]}"
         self.user_id = user_id
         self.bot_name = bot_name
+        # Only the loaded tail of the conversation, the full history lives in chat_messages
         self.messages = messages or []
+        self.message_count = message_count if message_count is not None else len(self.messages)
+        self.last_message = last_message or (self.messages[-1] if self.messages else None)
         self.admin_required = admin_required
         self.admin_present = admin_present
         self.created_at = datetime.utcnow()
@@ -55,10 +70,14 @@ class Chat:
         self.lead_id = lead_id
         self.viewed = viewed
         self.archived = archived
+        # Display name copied from the user at creation so list views need no user lookup
+        self.username = username
 
     def add_message(self, sender, content):
         message = Message(sender, content)
         self.messages.append(message)
+        self.message_count += 1
+        self.last_message = message
         self.updated_at = datetime.utcnow()
         return message
 
@@ -69,6 +88,8 @@ class Chat:
             "user_id": self.user_id,
             "bot_name": self.bot_name,
             "messages": [m.to_dict() for m in self.messages],
+            "message_count": self.message_count,
+            "last_message": self.last_message.to_dict() if self.last_message else None,
             "admin_required": self.admin_required,
             "admin_present": self.admin_present,
             "subject": self.subject,
@@ -78,12 +99,16 @@ class Chat:
             "admin_id": self.admin_id,
             'lead_id': self.lead_id,
             'viewed': self.viewed,
-            'archived': self.archived
+            'archived': self.archived,
+            'username': self.username
         }
 
     @classmethod
     def from_dict(cls, data):
         messages = [Message.from_dict(m) for m in data.get("messages", [])]
+        last_message = Message.from_dict(data["last_message"]) if data.get("last_message") else None
+        if not messages and last_message:
+            messages = [last_message]
         chat = cls(
             chat_id=data.get('chat_id'),
             user_id=data.get("user_id"),
@@ -96,7 +121,10 @@ class Chat:
             admin_id=data.get('admin_id', None),
             lead_id=data.get("lead_id", None),
             viewed=data.get('viewed', False),
-            archived=data.get('archived', False)
+            archived=data.get('archived', False),
+            message_count=data.get('message_count'),
+            last_message=last_message,
+            username=data.get('username')
         )
         # Make sure to load the room_id from the data
         chat.room_id = data.get("room_id")
@@ -105,3 +133,50 @@ class Chat:
         if not chat.updated_at:
             chat.updated_at = chat.created_at
         return chat
+
+
+class ChatSummary:
+    """Lightweight chat row for list views: metadata and the last message only."""
+
+    FIELDS = (
+        "chat_id", "room_id", "user_id", "bot_name", "subject", "admin_id", "lead_id",
+        "admin_required", "admin_present", "viewed", "archived", "exported", "open",
+        "created_at", "updated_at", "message_count", "last_message", "username",
+    )
+    __slots__ = FIELDS + ("messages",)
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        # Templates read chat.messages[-1]; keep the raw dict, no Message objects
+        self.messages = [self.last_message] if self.last_message else []
+
+    @classmethod
+    def projection(cls, aggregate=False):
+        """Fields to fetch; unmigrated chats only contribute their last embedded message."""
+        fields = {name: 1 for name in cls.FIELDS}
+        fields["_id"] = 0
+        fields["messages"] = {"$slice": ["$messages", -1]} if aggregate else {"$slice": -1}
+        return fields
+
+    @classmethod
+    def from_dict(cls, data):
+        messages = data.get("messages") or []
+        summary = cls(**{name: data.get(name) for name in cls.FIELDS})
+        if not summary.last_message and messages:
+            summary.last_message = messages[-1]
+            summary.messages = [messages[-1]]
+        summary.bot_name = summary.bot_name or "ChatBot"
+        for flag in ("admin_required", "admin_present", "viewed", "archived", "exported"):
+            setattr(summary, flag, bool(getattr(summary, flag)))
+        summary.open = summary.open is not False
+        if summary.message_count is None:
+            summary.message_count = len(messages)
+        summary.created_at = summary.created_at or datetime.utcnow()
+        summary.updated_at = summary.updated_at or summary.created_at
+        return summary
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        data["messages"] = list(self.messages)
+        return data
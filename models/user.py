@@ -1,5 +1,4 @@
 from datetime import datetime
-import requests
 import re
 
 
@@ -72,7 +71,7 @@ class User:
         chat_ids=None,
         desg=None,
         loc=None,
-        db=None, company=None
+        company=None
     ):
         self.user_id = user_id
         self.name = name
@@ -90,20 +89,8 @@ class User:
         self.loc = loc
         self.company = company
 
-        if ip.split(".")[0] not in ["192", "127"] and (city == None or country == None):
-
-            geo = requests.get(f"http://ip-api.com/json/{ip}")
-            # print(geo)
-            geo = geo.json()
-            # print(geo)
-            self.country = geo.get("country", None)
-            self.city = geo.get("city")
-            if geo["status"] != "fail" and db != None:
-                x = db.update_one(
-                    {"user_id": user_id}, {
-                        "$set": {"city": city, "country": country}}
-                )
-                # print(x)
+        # Geo fields are filled in by UserService/GeoEnricher, never here
+
         # if not self.company:
         #
         #     blocked_domains = {
@@ -168,7 +155,7 @@ class User:
             phone=data.get("phone"),
             desg=data.get("desg"),
             loc=data.get("loc"),
-            db=data.get("db", None), company=data.get('company', None)
+            company=data.get('company', None)
         )
         user.created_at = data.get("created_at", datetime.utcnow())
         user.last_active = data.get("last_active", datetime.utcnow())
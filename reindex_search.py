@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Search Index Backfill Script
+Builds `search_terms` / `user_terms` on chats created before chat search was
+indexed. New chats and messages are indexed by ChatService as they are stored.
+
+Safe to stop and re-run: only chats without `user_terms` are picked up
+unless --all is given.
+"""
+
+import os
+import time
+import argparse
+from pymongo import MongoClient
+from services.search_service import SearchService
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def reindex(batch_size=100, limit=None, rebuild_all=False, dry_run=False):
+    print("=== Search Index Backfill ===")
+
+    mongo_uri = os.environ.get(
+        'MONGODB_URI', 'mongodb://localhost:27017/chatbot')
+    client = MongoClient(mongo_uri)
+    db = client.get_database()
+    search_service = SearchService(db)
+
+    pending_filter = {} if rebuild_all else {"user_terms": {"$exists": False}}
+    pending = db.chats.count_documents(pending_filter)
+    print(f"Chats to index: {pending}")
+    if dry_run or not pending:
+        return
+
+    cursor = db.chats.find(
+        pending_filter,
+        {"_id": 0, "room_id": 1, "user_id": 1, "messages.content": 1},
+        batch_size=batch_size
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+
+    started = time.time()
+    indexed = failed = 0
+    try:
+        for chat_data in cursor:
+            try:
+                search_service.reindex_chat(chat_data)
+                indexed += 1
+            except Exception as e:
+                failed += 1
+                print(f"❌ {chat_data.get('room_id')}: {e}")
+
+            done = indexed + failed
+            if done % batch_size == 0:
+                print(f"   {done}/{pending} chats in {time.time() - started:.1f}s")
+    finally:
+        cursor.close()
+
+    print()
+    print(f"✅ Indexed {indexed} chats in {time.time() - started:.1f}s")
+    if failed:
+        print(f"   Failed {failed}. Run again to retry them.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the chat search index")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--limit", type=int, help="index at most this many chats")
+    parser.add_argument("--all", action="store_true", help="rebuild every chat, not only unindexed ones")
+    parser.add_argument("--dry-run", action="store_true", help="only count pending chats")
+    args = parser.parse_args()
+    reindex(args.batch_size, args.limit, args.all, args.dry_run)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Conversation Replay Harness
+Replays a sample of stored conversations through Bot.respond and reports
+per-turn latency, tokens, tool calls and tool cache hit rate.
+
+The user turns come from the web chats (`chat_messages`) and from WhatsApp
+and Messenger threads. By default the bot talks to the real providers; use
+--transport replay --cassette <file> to run offline (see
+services/llm_transport.py).
+
+Examples:
+    python replay_conversations.py --sample 50 --concurrency 4 --save-baseline bin/replay/baseline.json
+    python replay_conversations.py --transport replay --cassette bin/cassettes/prod.jsonl \\
+        --baseline bin/replay/baseline.json --fail-on-regression
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from uuid import uuid4
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+from services.latency_service import percentile
+from services.llm_transport import create_transport, set_transport
+
+load_dotenv()
+
+SYSTEM_SENDERS = {"SYSTEM", "bot"}
+
+# Metrics compared against the baseline; True means higher is worse
+BASELINE_METRICS = {
+    "latency_ms.p50": True,
+    "latency_ms.p95": True,
+    "latency_ms.p99": True,
+    "model_ms.p95": True,
+    "tokens.input_per_turn": True,
+    "tokens.output_per_turn": True,
+    "cost_per_turn": True,
+    "tool_calls_per_turn": True,
+    "tool_cache.hit_rate": False,
+    "error_rate": True,
+}
+
+
+def load_conversations(db, sources, sample, since_days, max_turns, seed):
+    """Return [{"source", "id", "turns": [user text, ...]}] sampled from the corpus"""
+    since = datetime.utcnow() - timedelta(days=since_days)
+    conversations = []
+
+    if "chats" in sources:
+        bot_names = {chat["room_id"]: chat.get("bot_name", "bot") for chat in db.chats.find(
+            {"updated_at": {"$gte": since}, "message_count": {"$gte": 2}},
+            {"_id": 0, "room_id": 1, "bot_name": 1}
+        )}
+        room_ids = sorted(bot_names)
+        if sample and len(room_ids) > sample:
+            room_ids = random.Random(seed).sample(room_ids, sample)
+        threads = {}
+        cursor = db.chat_messages.find(
+            {"room_id": {"$in": room_ids}},
+            {"_id": 0, "room_id": 1, "messages.sender": 1, "messages.content": 1,
+             "messages.type": 1, "messages.seq": 1}
+        ).sort([("room_id", 1), ("bucket", 1)])
+        for bucket in cursor:
+            threads.setdefault(bucket["room_id"], []).extend(bucket.get("messages", []))
+        for room_id, messages in threads.items():
+            bot_senders = SYSTEM_SENDERS | {bot_names[room_id]}
+            messages.sort(key=lambda m: m.get("seq", 0))
+            turns = _user_turns(messages, bot_senders, "content")
+            if turns:
+                conversations.append({"source": "chats", "id": room_id, "turns": turns})
+
+    for source, id_field in (("whatsapp", "phone_no"), ("facebook", "sender_id")):
+        if source not in sources:
+            continue
+        # Threads keep only their recent messages embedded; the full history is in
+        # <source>_messages, except for threads migrate_channel_messages.py hasn't moved yet
+        threads = {}
+        migrated = []
+        cursor = db[source].find(
+            {"updated_at": {"$gte": since}},
+            {id_field: 1, "message_count": 1, "messages.sender": 1, "messages.message": 1, "messages.type": 1}
+        )
+        for thread in cursor:
+            if "message_count" in thread:
+                migrated.append(thread[id_field])
+                threads[thread[id_field]] = []
+            else:
+                threads[thread[id_field]] = thread.get("messages", [])
+        cursor = db[f"{source}_messages"].find(
+            {"thread": {"$in": migrated}},
+            {"_id": 0, "thread": 1, "sender": 1, "message": 1, "type": 1}
+        ).sort([("thread", 1), ("time", 1)])
+        for message in cursor:
+            threads[message["thread"]].append(message)
+        for thread_id, messages in threads.items():
+            turns = _user_turns(messages, SYSTEM_SENDERS, "message")
+            if turns:
+                conversations.append({"source": source, "id": thread_id, "turns": turns})
+
+    rng = random.Random(seed)
+    if sample and len(conversations) > sample:
+        conversations = rng.sample(conversations, sample)
+    for conversation in conversations:
+        conversation["turns"] = conversation["turns"][:max_turns]
+    return conversations
+
+
+def _user_turns(messages, bot_senders, content_field):
+    """The last user text before each bot reply, in order"""
+    turns = []
+    pending = None
+    for message in messages:
+        if message.get("sender") in bot_senders:
+            if message.get("sender") != "SYSTEM" and pending:
+                turns.append(pending)
+                pending = None
+        elif message.get("type", "text") == "text" and message.get(content_field):
+            pending = message[content_field]
+    return turns
+
+
+class ReplayRun:
+    def __init__(self, bot, admin=None):
+        self.bot = bot
+        self.admin = admin
+        self.results = []
+        self._lock = threading.Lock()
+
+    def replay(self, conversation):
+        chat_id = f"replay-{uuid4().hex[:12]}"
+        try:
+            self.bot.create_chat(chat_id, self.admin)
+            for index, turn in enumerate(conversation["turns"]):
+                self._turn(conversation, index, turn, chat_id)
+        finally:
+            path = f"bin/chat/{chat_id}.chatpl"
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _turn(self, conversation, index, text, chat_id):
+        timings = {}
+        result = {"source": conversation["source"], "conversation": conversation["id"],
+                  "turn": index}
+        started = time.perf_counter()
+        try:
+            _, tokens = self.bot.respond(text, chat_id, timings=timings)
+            result["tokens"] = tokens
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["timings"] = timings
+        with self._lock:
+            self.results.append(result)
+
+
+def _stats(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 1),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+def summarize(results, cache_stats, wall_seconds):
+    ok = [r for r in results if "error" not in r]
+    tool_names = {}
+    for r in ok:
+        for call in r["timings"].get("tools", []):
+            tool_names[call["name"]] = tool_names.get(call["name"], 0) + 1
+
+    turns = len(ok) or 1
+    input_tokens = sum(r["tokens"]["input"] for r in ok)
+    output_tokens = sum(r["tokens"]["output"] for r in ok)
+    tool_calls = sum(tool_names.values())
+    return {
+        "turns": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 3) if results else 0,
+        "turns_per_second": round(len(results) / wall_seconds, 2) if wall_seconds else None,
+        "latency_ms": _stats([r["latency_ms"] for r in ok]),
+        "model_ms": _stats([sum(r["timings"].get("model_ms", [])) for r in ok]),
+        "model_rounds_per_turn": round(sum(len(r["timings"].get("model_ms", [])) for r in ok) / turns, 2),
+        "history_ms": _stats([r["timings"].get("history_load_ms", 0) +
+                              r["timings"].get("history_save_ms", 0) for r in ok]),
+        "tokens": {
+            "input": input_tokens,
+            "output": output_tokens,
+            "input_per_turn": round(input_tokens / turns, 1),
+            "output_per_turn": round(output_tokens / turns, 1),
+        },
+        "cost_per_turn": round(sum(r["tokens"]["cost"] for r in ok) / turns, 6),
+        "tool_calls": tool_names,
+        "tool_calls_per_turn": round(tool_calls / turns, 3),
+        "tool_cache": cache_stats,
+    }
+
+
+def _metric(summary, path):
+    value = summary
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def diff_baseline(summary, baseline, threshold):
+    """Print metric changes and return the names of regressed metrics"""
+    regressions = []
+    print(f"\n{'metric':<26}{'baseline':>14}{'current':>14}{'change':>10}")
+    for path, higher_is_worse in BASELINE_METRICS.items():
+        old, new = _metric(baseline, path), _metric(summary, path)
+        if old is None or new is None:
+            print(f"{path:<26}{str(old):>14}{str(new):>14}{'-':>10}")
+            continue
+        change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+        worse = change > threshold if higher_is_worse else change < -threshold
+        flag = "  ⚠️" if worse else ""
+        print(f"{path:<26}{old:>14}{new:>14}{change:>+10.1%}{flag}")
+        if worse:
+            regressions.append(path)
+    return regressions
+
+
+def print_summary(summary):
+    latency = summary["latency_ms"]
+    print("\n=== Replay Summary ===")
+    print(f"Turns: {summary['turns']} ({summary['errors']} errors), "
+          f"{summary['turns_per_second']} turns/s")
+    print(f"Latency ms: p50 {latency['p50']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+    print(f"Model ms p95: {summary['model_ms']['p95']}  "
+          f"rounds/turn: {summary['model_rounds_per_turn']}")
+    print(f"Tokens/turn: in {summary['tokens']['input_per_turn']}  "
+          f"out {summary['tokens']['output_per_turn']}  cost/turn {summary['cost_per_turn']}")
+    print(f"Tool calls/turn: {summary['tool_calls_per_turn']}  {summary['tool_calls']}")
+    print(f"Tool cache: {summary['tool_cache']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored conversations through the bot")
+    parser.add_argument("--source", action="append", choices=["chats", "whatsapp", "facebook"],
+                        help="corpus to sample from, repeatable (default: all)")
+    parser.add_argument("--sample", type=int, default=20, help="conversations to replay")
+    parser.add_argument("--since-days", type=int, default=30)
+    parser.add_argument("--max-turns", type=int, default=10, help="user turns per conversation")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--admin-id", help="replay with this admin's prompt and knowledge files")
+    parser.add_argument("--transport", choices=["live", "record", "replay"],
+                        help="overrides LLM_TRANSPORT")
+    parser.add_argument("--cassette", help="overrides LLM_CASSETTE")
+    parser.add_argument("--output", help="write per-turn results and the summary as JSON")
+    parser.add_argument("--save-baseline", help="write the summary as the new baseline")
+    parser.add_argument("--baseline", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change counted as a regression (default 0.1)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    # The transport must be in place before the bot builds its client
+    set_transport(create_transport(args.transport, args.cassette))
+
+    from models.bot import Bot
+    from services.admin_service import AdminService
+    from services.settings_service import SettingsService
+    from services.tool_registry import tool_registry
+
+    client = MongoClient(os.environ.get('MONGODB_URI', 'mongodb://localhost:27017/chatbot'))
+    db = client.get_database()
+
+    if not db.config.find_one({"id": "settings"}, {"_id": 1}):
+        print("❌ No settings document found, start the app once first.")
+        sys.exit(1)
+
+    admin = AdminService(db).get_admin_by_id(args.admin_id) if args.admin_id else None
+    bot = Bot("replay", SimpleNamespace(settings_service=SettingsService(db)))
+
+    conversations = load_conversations(db, set(args.source or ["chats", "whatsapp", "facebook"]),
+                                       args.sample, args.since_days, args.max_turns, args.seed)
+    total_turns = sum(len(c["turns"]) for c in conversations)
+    print(f"Replaying {len(conversations)} conversations ({total_turns} turns) "
+          f"with concurrency {args.concurrency}")
+    if not conversations:
+        sys.exit(1)
+
+    tool_registry.clear_cache()
+    run = ReplayRun(bot, admin)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(run.replay, conversations))
+    wall_seconds = time.perf_counter() - started
+
+    summary = summarize(run.results, tool_registry.cache_stats(), wall_seconds)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": run.results}, f, indent=2, default=str)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = diff_baseline(summary, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n⚠️ Regressed: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
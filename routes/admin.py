@@ -1,6 +1,3 @@
-from services.whatsapp_service import WhatsappService
-from services.call_service import CallService
-from services.notification_service import NotificationService
 from flask_mail import Mail
 from flask import request, flash, make_response, send_file
 import zipfile
@@ -14,11 +11,8 @@ from datetime import datetime, timedelta
 from collections import Counter
 from services.timezone import UTCZoneManager
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import lru_cache
 import logging
 # from # p# # print import p# print
-from services.usage_service import UsageService
 from urllib.parse import urlparse
 import xml.etree.ElementTree as ET
 import requests
@@ -36,22 +30,26 @@ from flask import (
     url_for,
     current_app,
     flash,
+    Response,
+    stream_with_context,
 )
 from flask_socketio import join_room, emit
 from functools import wraps
 from . import admin_bp
-from services.chat_service import ChatService
-from services.user_service import UserService
+from services.chat_service import MESSAGE_PAGE_SIZE
+from services.channel_messages import RECENT_MESSAGES
+from services.circuit_breaker import generation_breaker
+from services.search_service import SEARCH_PAGE_SIZE
+from services.pagination import next_cursor
+from services.call_service import TRANSCRIPT_PAGE_SIZE
 from werkzeug.utils import secure_filename
 import pdf2image
-from services.logs_service import LogsService
+from services.logs_service import LOG_PAGE_SIZE, MAX_LOG_PAGE_SIZE
 from models.log import LogLevel, LogTag
-from services.admin_service import AdminService
+from services.settings_service import thaw
 from services.email_service import send_email
 from datetime import datetime, timedelta
-from collections import Counter, defaultdict
-import calendar
-from functools import lru_cache
+from collections import Counter
 from io import BytesIO
 
 UPLOAD_FOLDER = os.path.join(os.getcwd(), "user_data")
@@ -77,7 +75,7 @@ def admin_required(_func=None, *, roles=None):
                 session["next"] = request.path
                 return redirect(url_for("admin.login"))
 
-            admin_service = AdminService(current_app.db)
+            admin_service = current_app.services.admin_service
             current_admin = admin_service.get_admin_by_id(session["admin_id"])
 
             if not current_admin or not current_admin.has_permission(roles):
@@ -119,25 +117,26 @@ def changelogs_page():
 @admin_required
 def view_logs():
     """Main logs page"""
-    admin = AdminService(current_app.db).get_admin_by_id(
+    admin = current_app.services.admin_service.get_admin_by_id(
         session.get("admin_id"))
-    logs_service = LogsService(current_app.db)
+    logs_service = current_app.services.logs_service
 
     # Regular admins only see their own logs
     admin_filter = session.get(
         "admin_id") if admin.role != "superadmin" else None
-    logs = logs_service.get_recent_logs(admin_filter, 1000)
+    logs = logs_service.get_recent_logs(admin_filter, LOG_PAGE_SIZE)
 
-    return render_template("admin/logs.html", logs=logs, selected_log=None)
+    return render_template("admin/logs.html", logs=logs, selected_log=None,
+                           next_cursor=next_cursor(logs, LOG_PAGE_SIZE, "timestamp", "log_id"))
 
 
 @admin_bp.route("/logs/filter")
 @admin_required
 def filter_logs():
     """Filter logs with HTMX"""
-    admin = AdminService(current_app.db).get_admin_by_id(
+    admin = current_app.services.admin_service.get_admin_by_id(
         session.get("admin_id"))
-    logs_service = LogsService(current_app.db)
+    logs_service = current_app.services.logs_service
 
     # Get filter parameters
     levels = request.args.getlist("level")
@@ -146,7 +145,10 @@ def filter_logs():
     admin_id = admin.admin_id
     message_search = request.args.get("message_search", "").strip()
     sort_order = request.args.get("sort", "timestamp_desc")
-    limit = request.args.get("limit", 1000)
+    # "All" is a page of the largest size, older pages follow the cursor
+    limit = min(request.args.get("limit", LOG_PAGE_SIZE, type=int) or MAX_LOG_PAGE_SIZE,
+                MAX_LOG_PAGE_SIZE)
+    cursor = request.args.get("cursor")
 
     # Parse dates
     start_date = end_date = None
@@ -182,7 +184,10 @@ def filter_logs():
         end_date=end_date,
         limit=limit,
         current_admin_id=current_admin_id,
+        cursor=cursor,
     )
+    # Next page in timestamp order, taken before any in-page re-sorting below
+    older_cursor = next_cursor(logs, limit, "timestamp", "log_id")
 
     # Apply sorting
     if sort_order == "timestamp_asc":
@@ -199,16 +204,16 @@ def filter_logs():
         logs.sort(key=lambda x: level_priority.get(
             x.level, 0), reverse=reverse)
 
-    return render_template("admin/logs_table.html", logs=logs)
+    return render_template("admin/logs_table.html", logs=logs, next_cursor=older_cursor)
 
 
 @admin_bp.route("/log/<string:log_id>")
 @admin_required
 def view_log_detail(log_id):
     """View individual log details"""
-    admin = AdminService(current_app.db).get_admin_by_id(
+    admin = current_app.services.admin_service.get_admin_by_id(
         session.get("admin_id"))
-    logs_service = LogsService(current_app.db)
+    logs_service = current_app.services.logs_service
 
     log = logs_service.get_log_by_id(log_id)
     if not log:
@@ -243,7 +248,7 @@ def forgot_password():
     if not username or not email:
         return jsonify({"error": "Username and email are required"}), 400
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin = admin_service.get_admin_by_username(username)
 
     if not admin or admin.email != email:
@@ -298,7 +303,7 @@ def forgot_password():
 
 @admin_bp.route("/reset-password/<token>", methods=["GET", "POST"])
 def reset_password(token):
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin = admin_service.validate_password_reset_token(token)
 
     if not admin:
@@ -354,7 +359,7 @@ def login():
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin = admin_service.authenticate_admin(username, password)
 
     if not admin:
@@ -364,12 +369,12 @@ def login():
         # No 2FA required, complete login
         return complete_admin_login(admin)
     # Check if IP is trusted (completed 2FA within last 30 mins)
-    if admin_service.is_ip_trusted(admin.admin_id, ip_address,current_app.config['SETTINGS'].get('2fa')):
+    if admin_service.is_ip_trusted(admin.admin_id, ip_address,current_app.settings_service.current().get('2fa')):
         # IP is trusted, proceed with login
         return complete_admin_login(admin)
 
     # IP not trusted, require 2FA
-    token_info = admin_service.create_2fa_token(admin.admin_id, ip_address,current_app.config['SETTINGS'].get('2fa'))
+    token_info = admin_service.create_2fa_token(admin.admin_id, ip_address,current_app.settings_service.current().get('2fa'))
     if not token_info:
         return (
             jsonify({"error": "Failed to create 2FA token", "requires_2fa": True}),
@@ -440,7 +445,7 @@ def verify_2fa():
     if not admin_id or not code:
         return jsonify({"error": "Admin ID and code are required"}), 400
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     verification = admin_service.verify_2fa_code(admin_id, ip_address, code)
 
     if not verification.get("success"):
@@ -465,7 +470,7 @@ def onboard():
         data = request.json
         # # printdata)
         admin_id = session.get("admin_id")
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         admin_service.update_admin_login(
             admin_id, data["username"], data["password"], data["email"], data["phone"]
         )
@@ -476,9 +481,9 @@ def onboard():
 @admin_bp.route("/chat/<room_id>", methods=["GET"])
 @admin_required
 def chat(room_id):
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
-    chat = chat_service.get_chat_by_room_id(room_id)
+    chat_service = current_app.services.chat_service
+    user_service = current_app.services.user_service
+    chat = chat_service.get_chat_by_room_id(room_id, message_limit=MESSAGE_PAGE_SIZE)
     if not chat:
         return redirect(url_for("admin.get_all_chats"))
     # Get initial chats with pagination
@@ -489,7 +494,9 @@ def chat(room_id):
     )
     # Prepare chat data with usernames
     user = user_service.get_user_by_id(chat.user_id)
-    chat_service.set_chat_viewed(chat.room_id)
+    # Metadata is already loaded, so opening a viewed chat costs no write
+    if not chat.viewed:
+        chat_service.set_chat_viewed(chat.room_id)
     chat_counts = chat_service.get_chat_counts_by_filter(session.get("admin_id"))
     if request.headers.get("HX-Request"):
         return render_template(
@@ -526,29 +533,27 @@ def get_chat_list():
     page = request.args.get('page', 0, type=int)
     limit = request.args.get('limit', 20, type=int)
     filter_type = request.args.get('filter', 'all')
+    cursor = request.args.get('cursor')
     
     room_id = None
     if request.referrer:
         room_id = request.referrer.split("/")[-1]
     
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
+    chat_service = current_app.services.chat_service
+    user_service = current_app.services.user_service
     
     # Get chats based on filter with pagination
     chats = chat_service.get_filtered_chats_paginated(
         admin_id=session.get("admin_id"),
         filter_type=filter_type,
         limit=limit,
-        skip=page * limit
+        skip=page * limit,
+        cursor=cursor
     )
     
     # Prepare chat data with usernames
-    chats_data = []
-    for c in chats:
-        data = c.to_dict()
-        data["username"] = user_service.get_user_by_id(c.user_id).name
-        chats_data.append(data)
-    chats_data.sort(key=lambda x: x["updated_at"], reverse=True)
+    user_service.attach_usernames(chats)
+    chats_data = [c.to_dict() for c in chats]
     cchat = chat_service.get_chat_by_room_id(room_id) if room_id else None
     
     # Check if this is a pagination request
@@ -559,6 +564,7 @@ def get_chat_list():
             "components/chat-items-only.html", 
             chats=chats_data, 
             cur_chat=cchat,
+            next_cursor=next_cursor(chats, limit, "updated_at", "room_id"),
         )
     return render_template(
         "components/chat-list.html", 
@@ -566,6 +572,7 @@ def get_chat_list():
         cur_chat=cchat,
         has_more=len(chats_data) == limit,
         next_page=page + 1,
+        next_cursor=next_cursor(chats, limit, "updated_at", "room_id"),
     )
 
 
@@ -576,42 +583,24 @@ def search():
     if not query:
         return render_template("components/search-results.html", search_chats=[])
 
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
-    chats = chat_service.get_all_chats(session.get("admin_id"))
-
-    search_chats = set()
-    for chat in chats:
-        user = user_service.get_user_by_id(chat.user_id)
-        if not user:
-            continue
-
-        chat.username = user.name
-
-        # Match against user fields
-        if (
-            query in user.name.lower() or
-            (user.country and query in user.country.lower()) or
-            (user.city and query in user.city.lower())
-        ):
-            search_chats.add(chat)
-            continue
-
-        # Match against messages
-        if any(query in message.content.lower() for message in chat.messages):
-            search_chats.add(chat)
+    page = request.form.get("page", 0, type=int)
+    search_service = current_app.services.search_service
+    user_service = current_app.services.user_service
+    search_chats = search_service.search_chats(
+        query, session.get("admin_id"), limit=SEARCH_PAGE_SIZE, skip=page * SEARCH_PAGE_SIZE)
+    user_service.attach_usernames(search_chats)
 
     return render_template(
         "components/search-results.html",
-        search_chats=list(search_chats)
+        search_chats=search_chats
     )
 
 
 @admin_bp.route("/chat/<room_id>/user")
 def chat_user(room_id):
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
 
-    user_service = UserService(current_app.db)
+    user_service = current_app.services.user_service
     user = user_service.get_user_by_id(
         chat_service.get_chat_by_room_id(room_id).user_id
     )
@@ -623,17 +612,38 @@ def chat_user(room_id):
 @admin_required
 def chat_mini(room_id):
 
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
 
-    chat = chat_service.get_chat_by_room_id(room_id)
+    chat = chat_service.get_chat_by_room_id(room_id, message_limit=MESSAGE_PAGE_SIZE)
     return render_template("admin/fragments/chat_mini.html", chat=chat, username="Ana")
 
 
+@admin_bp.route("/chat/<room_id>/messages", methods=["GET"])
+@admin_required
+def chat_messages(room_id):
+    """Older messages of a chat, for paging backwards in the chat view"""
+    before = request.args.get("before", type=int)
+    limit = min(max(request.args.get("limit", MESSAGE_PAGE_SIZE, type=int), 1), 200)
+
+    chat_service = current_app.services.chat_service
+    chat = chat_service.get_chat_by_room_id(room_id)
+    if not chat:
+        return "Chat not found", 404
+    chat.messages = chat_service.get_messages(room_id, limit=limit, before=before)
+
+    if request.headers.get("HX-Request"):
+        return render_template("components/message-page.html", chat=chat, username="Ana")
+    return jsonify({
+        "messages": [m.to_dict() for m in chat.messages],
+        "has_more": bool(chat.messages and (chat.messages[0].seq or 0) > 1),
+    })
+
+
 @admin_bp.route("/user/<string:user_id>/details", methods=["GET"])
 @admin_required
 def get_user_details(user_id):
 
-    user_service = UserService(current_app.db)
+    user_service = current_app.services.user_service
     user = user_service.get_user_by_id(user_id)
     if request.headers.get("HX-Request"):
         return render_template("components/chat-user-info.html", user=user)
@@ -651,29 +661,23 @@ def filter_chats(filter):
     # Validate and sanitize inputs
     limit = min(max(limit, 1), 100)  # Limit between 1-100
     page = max(page, 0)  # Ensure non-negative page
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
+    chat_service = current_app.services.chat_service
+    user_service = current_app.services.user_service
     
     # Get filtered chats with pagination
     chats = chat_service.get_filtered_chats_paginated(
         admin_id=session.get("admin_id"),
         filter_type=filter,
         limit=limit,
-        skip=page * limit
+        skip=page * limit,
+        cursor=request.args.get('cursor')
     )
     
-    # Batch fetch users to reduce individual queries
-    user_ids = [c.user_id for c in chats]
-    users_dict = user_service.get_users_by_ids(user_ids)  # Single query for all users
-    # # printusers_dict)
+    # Single query for the users of chats without a stored username
+    user_service.attach_usernames(chats)
     
     # Build chat data with usernames
-    chats_data = [
-        {**chat.to_dict(), "username": users_dict[chat.user_id]['name']}
-        for chat in chats
-    ]
-
-    chats_data.sort(key=lambda x: x['updated_at'], reverse=True)
+    chats_data = [chat.to_dict() for chat in chats]
     
     # Determine template based on request type
     template = (
@@ -682,7 +686,8 @@ def filter_chats(filter):
     )
     
     # Build context conditionally
-    context = {"chats": chats_data}
+    context = {"chats": chats_data,
+               "next_cursor": next_cursor(chats, limit, "updated_at", "room_id")}
 
     if not is_pagination:
         context.update({
@@ -706,11 +711,11 @@ def get_country_id(file_path, target_country):
 @admin_bp.route("/chat/<room_id>/export", methods=["POST"])
 @admin_required
 def export_chat(room_id):
-    chat_service = ChatService(current_app.db)
-    chat = chat_service.get_chat_by_room_id(room_id)
+    chat_service = current_app.services.chat_service
+    chat = chat_service.get_chat_by_room_id(room_id, message_limit=None)
 
     if chat:
-        user_service = UserService(current_app.db)
+        user_service = current_app.services.user_service
         user = user_service.get_user_by_id(chat.user_id)
         # try:
         erp_url = os.environ.get("ERP_URL")
@@ -764,13 +769,10 @@ def export_chat(room_id):
 @admin_bp.route("/chat/<room_id>/archive", methods=["POST"])
 @admin_required
 def archive_chat(room_id):
-    chat_service = ChatService(current_app.db)
-    chat = chat_service.get_chat_by_room_id(room_id)
-
-    if chat:
-        if not chat_service.archive_chat(room_id):
-            return "Error in exporting: Chat not found", 404
+    chat_service = current_app.services.chat_service
 
+    # archive_chat reports whether the chat exists, no lookup needed
+    if chat_service.archive_chat(room_id):
         return "success", 200
 
     return "Chat not found", 404
@@ -780,15 +782,15 @@ def archive_chat(room_id):
 @admin_bp.route('/chat-counts')
 @admin_required
 def chat_couts():
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
     return jsonify(
             chat_service.get_chat_counts_by_filter(session.get('admin_id')))
 
 @admin_bp.route("/chat/<room_id>/intervene",methods=["POST"])
 @admin_required
 def intervene(room_id):
-    admin_service = AdminService(current_app.db)
-    chat_service = ChatService(current_app.db)
+    admin_service = current_app.services.admin_service
+    chat_service = current_app.services.chat_service
     chat_service.set_admin_required(room_id,True)
     return "",200
 
@@ -814,7 +816,7 @@ def receive_audio_blob(chat_id):
         # printresp)
 
         # Get admin info from session
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         admin = admin_service.get_admin_by_id(session.get('admin_id'))
         
         if not admin:
@@ -822,7 +824,7 @@ def receive_audio_blob(chat_id):
                 return "Admin not found", 404
             return jsonify({"error": "Admin not found"}), 404
 
-        chat_service = ChatService(current_app.db)
+        chat_service = current_app.services.chat_service
         
         # Get chat by room_id (using the provided chat_id directly as it should be room_id)
         chat = chat_service.get_chat_by_room_id(chat_id)
@@ -891,8 +893,8 @@ def send_message(room_id):
         # # # printf'{room_id}')
         if not message:
             return "", 302
-        chat_service = ChatService(current_app.db)
-        user_service = UserService(current_app.db)
+        chat_service = current_app.services.chat_service
+        user_service = current_app.services.user_service
 
         chat = chat_service.get_chat_by_room_id(room_id)
         if not chat:
@@ -1191,199 +1193,20 @@ def logout():
     return redirect(url_for("admin.login"))
 
 
-def generate_stats(chat_list):
-    """Simplified and optimized stats generation."""
-    if not chat_list:
-        return get_empty_stats()
-    
-    now = datetime.utcnow()
-    time_boundaries = calculate_time_boundaries(now)
-    
-    # Define time periods and their configurations
-    periods = {
-        'today': {
-            'boundary': time_boundaries['today_start'],
-            'format': lambda dt: dt.strftime("%H:00"),
-            'labels': get_time_labels(now)['hours']
-        },
-        'this-week': {
-            'boundary': time_boundaries['week_start'], 
-            'format': lambda dt: dt.strftime("%A"),
-            'labels': get_time_labels(now)['days']
-        },
-        'this-month': {
-            'boundary': time_boundaries['month_start'],
-            'format': lambda dt: dt.day,
-            'labels': get_time_labels(now)['days_in_month']
-        },
-        'this-year': {
-            'boundary': time_boundaries['year_start'],
-            'format': lambda dt: dt.strftime("%b"), 
-            'labels': get_time_labels(now)['months']
-        },
-        'all-time': {
-            'boundary': None,  # No boundary for all-time
-            'format': lambda dt: dt.strftime("%Y"),
-            'labels': None  # Will be calculated dynamically
-        }
-    }
-    
-    # Initialize counters for all periods
-    counters = {}
-    for period in periods:
-        counters[period] = {'total': defaultdict(int), 'admin': defaultdict(int)}
-    
-    # Single pass through all chats
-    for chat in chat_list:
-        created = chat.created_at
-        is_admin_required = chat.admin_required
-        
-        for period_name, config in periods.items():
-            # Check if chat falls within this period's boundary
-            if config['boundary'] is None or created >= config['boundary']:
-                label = config['format'](created)
-                counters[period_name]['total'][label] += 1
-                if is_admin_required:
-                    counters[period_name]['admin'][label] += 1
-    
-    # Build final response
-    result = {}
-    for period_name, config in periods.items():
-        labels = config['labels']
-        if period_name == 'all-time':
-            # For all-time, use sorted years from actual data
-            labels = sorted(counters[period_name]['total'].keys())
-        
-        result[period_name] = {
-            "labels": labels,
-            "totalChats": [counters[period_name]['total'][label] for label in labels],
-            "adminRequired": [counters[period_name]['admin'][label] for label in labels],
-        }
-    
-    return result
-
-def calculate_time_boundaries(now):
-    """Pre-calculate all time boundaries."""
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    return {
-        'today_start': today_start,
-        'week_start': today_start - timedelta(days=today_start.weekday()),
-        'month_start': now.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
-        'year_start': now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0),
-    }
-
-@lru_cache(maxsize=32)
-def get_time_labels(now):
-    """Get all time labels with caching."""
-    days_in_month = calendar.monthrange(now.year, now.month)[1]
-    
-    return {
-        'hours': [f"{str(h).zfill(2)}:00" for h in range(24)],
-        'days': ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
-        'days_in_month': list(range(1, days_in_month + 1)),
-        'months': ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"],
-    }
-
-def get_empty_stats():
-    """Return empty stats structure when no chats exist."""
-    now = datetime.utcnow()
-    labels = get_time_labels(now)
-    
-    return {
-        "today": {
-            "labels": labels['hours'],
-            "totalChats": [0] * 24,
-            "adminRequired": [0] * 24,
-        },
-        "this-week": {
-            "labels": labels['days'],
-            "totalChats": [0] * 7,
-            "adminRequired": [0] * 7,
-        },
-        "this-month": {
-            "labels": labels['days_in_month'],
-            "totalChats": [0] * len(labels['days_in_month']),
-            "adminRequired": [0] * len(labels['days_in_month']),
-        },
-        "this-year": {
-            "labels": labels['months'],
-            "totalChats": [0] * 12,
-            "adminRequired": [0] * 12,
-        },
-        "all-time": {
-            "labels": [],
-            "totalChats": [],
-            "adminRequired": [],
-        },
-    }
-
-
-def get_user(chat,user_service):
-    chat.__setattr__('username',user_service.get_user_by_id(chat.user_id).name)
-    return chat
-
-
-@lru_cache(maxsize=256)
-def get_cached_user(user_id, user_service):
-    """Cache user lookups to avoid repeated database calls."""
-    try:
-        return user_service.get_user_by_id(user_id)
-    except Exception as e:
-        logger.warning(f"Failed to get user {user_id}: {e}")
-        return None
-
 def enrich_chats_with_usernames(chats, user_service):
-    """Efficiently add usernames to chats using parallel processing."""
+    """Add usernames to chats with a single batched user query."""
     if not chats:
         return []
-    
-    # Get unique user IDs to minimize database calls
-    unique_user_ids = list(set(chat.user_id for chat in chats if hasattr(chat, 'user_id')))
-    
-    # Fetch users in parallel
-    user_cache = {}
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_user_id = {
-            executor.submit(get_cached_user,
-                            user_id, user_service): user_id 
-            for user_id in unique_user_ids
-        }
-        
-        for future in as_completed(future_to_user_id):
-            user_id = future_to_user_id[future]
-            try:
-                user = future.result()
-                user_cache[user_id] = user.name if user else "Unknown User"
-            except Exception as e:
-                logger.warning(f"Failed to fetch user {user_id}: {e}")
-                user_cache[user_id] = "Unknown User"
-    
-    # Add usernames to chats
-    for chat in chats:
-        if hasattr(chat, 'user_id'):
-            chat.username = user_cache.get(chat.user_id, "Unknown User")
-    
-    return chats
+    return user_service.attach_usernames(chats)
 
 
 def get_dashboard_data(admin_id, chat_service, user_service, limit=50):
-    """Get optimized dashboard data with 500+ limit handling."""
-    # Get chats with limit+1 to detect if there are more than the limit
+    """Get the latest chats and chart stats for the dashboard."""
     chats = chat_service.get_all_chats(admin_id, limit=limit)
-    
-    # For stats, use higher limit with 500+ handling
-    stats_limit = 501  # Get 501 to detect if there are 500+
-    chats_for_stats = chat_service.get_chats_with_full_messages(admin_id, limit=stats_limit)
-    
-    # Handle 500+ case
-    if len(chats_for_stats) == 501:
-        # Truncate to 500 and note that there are more
-        chats_for_stats = chats_for_stats[:500]
-        # You could add a flag here if needed: has_more_than_500 = True
-    
-    # Generate stats from the dataset (max 500 chats)
-    stats_data = generate_stats(chats_for_stats)
-    
+
+    # Counters are kept per hour/day/month/year, so this is a few indexed reads at any scale
+    stats_data = chat_service.rollups.get_dashboard_stats(admin_id)
+
     # Enrich chats with usernames efficiently  
     enriched_chats = enrich_chats_with_usernames(chats, user_service)
     
@@ -1392,41 +1215,66 @@ def get_dashboard_data(admin_id, chat_service, user_service, limit=50):
 @admin_bp.route("/dashboard")
 @admin_required
 def index():
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin = admin_service.get_admin_by_id(session.get("admin_id"))
     
     if admin.onboarding:
         return redirect(url_for("admin.onboard"))
     
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
+    chat_service = current_app.services.chat_service
+    user_service = current_app.services.user_service
     
     # Use the optimized function
     admin_id = session.get("admin_id")
     enriched_chats, stats_data = get_dashboard_data(admin_id, chat_service, user_service)
+    latency = current_app.services.latency_service.get_latency_series(admin_id, "today")
     
     return render_template(
         "admin/index.html",
         chats=enriched_chats,
         data=stats_data,
+        latency=latency["overall"],
         username="Ana",
         online_users=current_app.config.get("ONLINE_USERS", 0),
     )
 
 
+@admin_bp.route("/latency-stats")
+@admin_required
+def latency_stats():
+    """Bot response latency percentiles for the dashboard charts"""
+    period = request.args.get("period", "today")
+    metric = request.args.get("metric", "total_ms")
+    if metric not in ("total_ms", "queue_wait_ms", "history_load_ms", "tts_ms", "emit_ms"):
+        return jsonify({"error": "Unknown metric"}), 400
+    try:
+        series = current_app.services.latency_service.get_latency_series(
+            session.get("admin_id"), period, metric)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(series)
+
+
+
+
+@admin_bp.route("/bot-status")
+@admin_required
+def bot_status():
+    """Current state of the bot generation circuit breaker"""
+    return jsonify(generation_breaker.status())
 
 
 @admin_bp.route("/join/<room_id>")
 @admin_required
 def join_chat(room_id):
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
     chat = chat_service.get_chat_by_room_id(room_id)
 
     if not chat:
         return jsonify({"error": "Chat not found"}), 404
 
     # Mark admin as present in this chat
-    chat_service.set_admin_present(chat.chat_id, True)
+    chat_service.set_admin_present(chat.room_id, True)
 
     # Notify the room that admin has joined
     current_app.socketio.emit(
@@ -1444,34 +1292,36 @@ def join_chat(room_id):
 @admin_bp.route("/settings", methods=["GET"])
 @admin_required
 def settings():
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
+    superadmin_settings = thaw(current_app.settings_service.current())
+
     # Initialize settings data based on role
     if current_admin.role == "superadmin":
         settings_data = {
-            **current_app.config["SETTINGS"], **current_admin.settings}
+            **superadmin_settings, **current_admin.settings}
     else:
         settings_data = current_admin.settings
 
     # Validate logo paths for superadmin
     if current_admin.role == "superadmin":
         settings_data["logo"]["large"] = (
-            current_app.config["SETTINGS"]["logo"]["large"]
+            superadmin_settings["logo"]["large"]
             if os.path.exists(
                 os.path.join(
                     os.getcwd(
-                    ), current_app.config["SETTINGS"]["logo"]["large"][1:]
+                    ), superadmin_settings["logo"]["large"][1:]
                 )
             )
             else ""
         )
         settings_data["logo"]["small"] = (
-            current_app.config["SETTINGS"]["logo"]["small"]
+            superadmin_settings["logo"]["small"]
             if os.path.exists(
                 os.path.join(
                     os.getcwd(
-                    ), current_app.config["SETTINGS"]["logo"]["small"][1:]
+                    ), superadmin_settings["logo"]["small"][1:]
                 )
             )
             else ""
@@ -1519,10 +1369,6 @@ def settings():
                     current_admin.admin_id}: {str(e)}"
             )
 
-    if current_admin.role == 'superadmin':
-
-        current_app.db.config.update_one({"id":"settings"},{"$set":current_app.config['SETTINGS']})
-
     return render_template(
         "admin/settings.html",
         settings=settings_data,
@@ -1565,9 +1411,8 @@ def upload_logo(file_name):
         filename = secure_filename(file_name)
         file_path = os.path.join(current_app.config["LOGOS_FOLDER"], filename)
         file.save(file_path)
-        current_app.config["SETTINGS"]["logo"][f_type] = os.path.join(
-            "/static", "img", filename
-        )
+        current_app.settings_service.update(
+            {f"logo.{f_type}": os.path.join("/static", "img", filename)})
         # # # # printcurrent_app.config)
         return f"File saved at {file_path}", 200
 
@@ -1605,11 +1450,11 @@ def upload_sound():
 @admin_required
 def set_timezone():
     tz = request.form.get("timezone")
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if current_admin.role == "superadmin":
-        current_app.config["SETTINGS"]["timezone"] = tz
+        current_app.settings_service.update({"timezone": tz})
     else:
         current_admin.settings["timezone"] = tz
         admin_service.admins_collection.update_one(
@@ -1627,11 +1472,11 @@ def add_timing():
     end_time = request.form.get("endTime")
     # timezone = request.form.get("timezone")
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if current_admin.role == "superadmin":
-        timings = current_app.config["SETTINGS"].get("timings", [])
+        timings = thaw(current_app.settings_service.current().get("timings", []))
     else:
         timings = current_admin.settings.get("timings", [])
 
@@ -1654,8 +1499,7 @@ def add_timing():
     timings.sort(key=lambda t: day_order[t["day"]])
 
     if current_admin.role == "superadmin":
-        current_app.config["SETTINGS"]["timings"] = timings
-        # current_app.config['SETTINGS']['timezone'] = timezone
+        current_app.settings_service.update({"timings": timings})
     else:
         current_admin.settings["timings"] = timings
         # current_admin.settings['timezone'] = timezone
@@ -1676,18 +1520,13 @@ def add_timing():
 @admin_required
 def set_2fa_duration():
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
-    # printcurrent_app.config['SETTINGS'])
     if current_admin.role == "superadmin":
-        if not current_app.config['SETTINGS'].get('2fa', None):
-
-            current_app.config['SETTINGS']['2fa'] = {
-                "duration": None, "unit": None}
-        current_app.config['SETTINGS']['2fa']['duration'] = request.form.get(
-            'duration_value')
-        current_app.config['SETTINGS']['2fa']['unit'] = request.form.get(
-            'duration_unit')
+        current_app.settings_service.update({
+            "2fa.duration": request.form.get('duration_value'),
+            "2fa.unit": request.form.get('duration_unit'),
+        })
         return "", 200
     else:
         return "", 403
@@ -1696,7 +1535,7 @@ def set_2fa_duration():
 @admin_bp.route('/settings/2fa/', methods=['POST'])
 @admin_required
 def set_2fa():
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin_service.toggle_two_fa(session.get('admin_id'))
     return '', 200
 
@@ -1704,11 +1543,11 @@ def set_2fa():
 @admin_bp.route("/settings/timing/<int:id>", methods=["DELETE"])
 @admin_required
 def delete_timing(id):
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if current_admin.role == "superadmin":
-        timings = current_app.config["SETTINGS"].get("timings", [])
+        timings = thaw(current_app.settings_service.current().get("timings", []))
     else:
         timings = current_admin.settings.get("timings", [])
 
@@ -1727,7 +1566,7 @@ def delete_timing(id):
         timings.pop(id)
 
     if current_admin.role == "superadmin":
-        current_app.config["SETTINGS"]["timings"] = timings
+        current_app.settings_service.update({"timings": timings})
     else:
         current_admin.settings["timings"] = timings
         admin_service.admins_collection.update_one(
@@ -1742,11 +1581,11 @@ def delete_timing(id):
 @admin_required
 def update_model():
     model = request.form.get("model")
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if current_admin.role == "superadmin":
-        current_app.config["SETTINGS"]["model"] = model
+        current_app.settings_service.update({"model": model})
     else:
         current_admin.settings["model"] = model
         admin_service.admins_collection.update_one(
@@ -1762,11 +1601,11 @@ def update_model():
 @admin_required(roles=["superadmin"])  # Only superadmin can modify API keys
 def api_key(api_type):
     if request.method == "DELETE":
-        current_app.config["SETTINGS"]["apiKeys"][api_type] = ""
+        current_app.settings_service.update({f"apiKeys.{api_type}": ""})
         return "", 200
     elif request.method == "POST":
-        current_app.config["SETTINGS"]["apiKeys"][api_type] = request.form.get(
-            "key")
+        current_app.settings_service.update(
+            {f"apiKeys.{api_type}": request.form.get("key")})
         return "", 200
     return "", 500
 
@@ -1774,11 +1613,11 @@ def api_key(api_type):
 @admin_bp.route("/settings/theme/<theme_type>", methods=["POST"])
 @admin_required
 def set_theme(theme_type):
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if current_admin.role == "superadmin":
-        current_app.config["SETTINGS"]["theme"] = theme_type
+        current_app.settings_service.update({"theme": theme_type})
     else:
         current_admin.settings["theme"] = theme_type
         admin_service.admins_collection.update_one(
@@ -1792,11 +1631,11 @@ def set_theme(theme_type):
 @admin_required
 def set_prompt():
     prpt = request.form.get("prompt")
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if current_admin.role == "superadmin":
-        current_app.config["SETTINGS"]["prompt"] = prpt
+        current_app.settings_service.update({"prompt": prpt})
     else:
         current_admin.settings["prompt"] = prpt
         admin_service.admins_collection.update_one(
@@ -1810,16 +1649,13 @@ def set_prompt():
 @admin_bp.route("/settings/subject/<string:subject>", methods=["DELETE"])
 @admin_required
 def subjects(subject):
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if request.method == "POST":
         subject = request.form.get("subject")
         if current_admin.role == "superadmin":
-            current_app.config["SETTINGS"]["subjects"] = set(
-                current_app.config["SETTINGS"].get("subjects", [])
-            )
-            current_app.config["SETTINGS"]["subjects"].add(subject)
+            current_app.settings_service.add_to_set("subjects", subject)
         else:
             current_admin.settings["subjects"] = set(
                 current_admin.settings.get("subjects", [])
@@ -1833,7 +1669,7 @@ def subjects(subject):
     else:
         try:
             if current_admin.role == "superadmin":
-                current_app.config["SETTINGS"]["subjects"].remove(subject)
+                current_app.settings_service.pull("subjects", subject)
             else:
                 current_admin.settings["subjects"].remove(subject)
                 admin_service.admins_collection.update_one(
@@ -1852,17 +1688,17 @@ def add_language():
     if not language:
         return jsonify({"error": "Language is required"}), 400
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     try:
         if current_admin.role == "superadmin":
             # Update global settings
             languages = set(
-                current_app.config["SETTINGS"].get("languages", ["English"])
+                current_app.settings_service.current().get("languages", ["English"])
             )
             languages.add(language)
-            current_app.config["SETTINGS"]["languages"] = list(languages)
+            current_app.settings_service.update({"languages": sorted(languages)})
         else:
             # Update admin-specific settings
             languages = set(current_admin.settings.get(
@@ -1888,17 +1724,17 @@ def remove_language(language):
     if not language:
         return jsonify({"error": "Language is required"}), 400
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     try:
         if current_admin.role == "superadmin":
             # Update global settings
             languages = set(
-                current_app.config["SETTINGS"].get("languages", ["English"])
+                current_app.settings_service.current().get("languages", ["English"])
             )
             languages.discard(language)
-            current_app.config["SETTINGS"]["languages"] = list(languages)
+            current_app.settings_service.update({"languages": sorted(languages)})
         else:
             # Update admin-specific settings
             languages = set(current_admin.settings.get(
@@ -2056,7 +1892,7 @@ def extract_urls_from_sitemap(sitemap_content, base_url):
 @admin_required
 def get_chat_counts():
     """API endpoint to get chat counts for dynamic updating."""
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
     counts = chat_service.get_chat_counts_by_filter(session.get("admin_id"))
     return jsonify(counts)
 
@@ -2065,8 +1901,8 @@ def get_chat_counts():
 @admin_required
 def get_all_chats():
     """Main chats page with initial data."""
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
+    chat_service = current_app.services.chat_service
+    user_service = current_app.services.user_service
     
     # Get initial chats
     chats = chat_service.get_chats_with_limited_messages(
@@ -2091,7 +1927,7 @@ def get_all_chats():
 
 @admin_bp.route("/chat/<string:room_id>/delete", methods=["POST"])
 def delete_chat(room_id):
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
     # chats_all = chat_service.get_all_chats(session.get('admin_id'),limit=100)
     # chats_all.sort(key=lambda x: x.updated_at, reverse=True)
     # current_index = next((i for i, chat in enumerate(chats_all) if chat.room_id == room_id), None)
@@ -2114,7 +1950,7 @@ def delete_chats():
     chats = data["chat_ids"]
     # printchats)
     try:
-        chat_service = ChatService(current_app.db)
+        chat_service = current_app.services.chat_service
         chats_all = chat_service.get_all_chats(session.get('admin_id'))
 
         chats_all.sort(key=lambda x: x.updated_at, reverse=True)
@@ -2152,7 +1988,7 @@ def google_connect():
 @admin_required
 def load_folders():
     selected_folders = request.form.getlist("selected_folders")
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     # Update admin settings with selected folders
@@ -2170,7 +2006,7 @@ def load_folders():
 @admin_bp.route("/google-files/")
 @admin_required
 def google_files():
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if not current_admin.settings.get("google_token"):
@@ -2234,7 +2070,7 @@ def google_files():
 @admin_bp.route("/google-files/view/<file_id>")
 @admin_required
 def view_google_file(file_id):
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
     creds = Credentials.from_authorized_user_info(
         json.loads(current_admin.settings["google_token"]), SCOPES
@@ -2247,7 +2083,7 @@ def view_google_file(file_id):
 @admin_bp.route("/google-files/download", methods=["POST"])
 @admin_required
 def download_google_files():
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if not current_admin.settings.get("google_token"):
@@ -2329,7 +2165,7 @@ def google_logout():
     flow = InstalledAppFlow.from_client_secrets_file(
         CREDENTIALS_FILE, scopes=SCOPES)
     
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin_service.admins_collection.update_one(
 
         {"admin_id": session.get('admin_id')},
@@ -2341,7 +2177,7 @@ def google_logout():
 @admin_bp.route("/google-thumbnail/<file_id>")
 def google_thumbnail(file_id):
     creds = Credentials.from_authorized_user_info(
-        json.loads(current_app.config["SETTINGS"].get("google-token")), SCOPES
+        json.loads(current_app.settings_service.current().get("google-token")), SCOPES
     )
     service = build("drive", "v3", credentials=creds)
     request = service.files().get_media(fileId=file_id)
@@ -2372,7 +2208,7 @@ def oauth2callback():
     flow.fetch_token(authorization_response=request.url)
 
     # Store credentials in the admin's settings
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     # Update admin settings with the new token
@@ -2395,7 +2231,7 @@ def create_admin():
         try:
             form_data = request.form.to_dict()
             # # # printform_data)
-            admin_service = AdminService(current_app.db)
+            admin_service = current_app.services.admin_service
             admin = admin_service.create_admin(
                 username=form_data["username"],
                 password=form_data["password"],
@@ -2418,11 +2254,51 @@ def create_admin():
             return f"Error: {e}", 500
 
 
+def _usage_range():
+    """(start, end) days from ?start=&end= (YYYY-MM-DD), defaulting to the last 30 days"""
+    today = datetime.utcnow().date()
+    end = datetime.strptime(request.args["end"], "%Y-%m-%d").date() if request.args.get("end") else today
+    start = (datetime.strptime(request.args["start"], "%Y-%m-%d").date()
+             if request.args.get("start") else end - timedelta(days=29))
+    return start, end
+
+
+@admin_bp.route("/usage")
+@admin_required
+def usage_series():
+    """Usage chart series for the current admin; a superadmin may pass admin_id or all=1"""
+    admin_id = session.get("admin_id")
+    if session.get("role") == "superadmin":
+        admin_id = None if request.args.get("all") else request.args.get("admin_id", admin_id)
+    try:
+        start, end = _usage_range()
+        series = current_app.services.usage_service.get_usage_series(
+            start, end, request.args.get("granularity", "day"), admin_id=admin_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(series)
+
+
+@admin_bp.route("/usage/admins")
+@admin_required(roles=["superadmin"])
+def usage_by_admin():
+    """Usage totals per admin over a date range"""
+    try:
+        start, end = _usage_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "admins": current_app.services.usage_service.get_usage_totals(start, end),
+    })
+
+
 @admin_bp.route("/settings/domain", methods=["POST"])
 @admin_required
 def add_domain():
     domain = request.form.get("domain")
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if current_admin.role != "superadmin":
@@ -2440,7 +2316,7 @@ def add_domain():
 @admin_bp.route("/settings/domain/<domain>", methods=["DELETE"])
 @admin_required
 def remove_domain(domain):
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if current_admin.role != "superadmin":
@@ -2458,11 +2334,11 @@ def remove_domain(domain):
 @admin_bp.route("/notifications/")
 @admin_required
 def get_notifications():
-    noti_service = NotificationService(current_app.db)
+    noti_service = current_app.services.notification_service
     notis = noti_service.get_notifications(
         session.get("admin_id"), unread_only=True
     )
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
     notificaitons = []
 
     for noti in notis:
@@ -2478,7 +2354,7 @@ def get_notifications():
 @admin_bp.route("/notification/<notification_id>/", methods=['POST'])
 @admin_required
 def viewed_notifications(notification_id):
-    noti_service = NotificationService(current_app.db)
+    noti_service = current_app.services.notification_service
 
     if noti_service.mark_notification_read(notification_id, session.get('admin_id')):
 
@@ -2490,7 +2366,7 @@ def viewed_notifications(notification_id):
 @admin_bp.route('/contact/',methods=['GET','POST'])
 @admin_required
 def contact():
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin = admin_service.get_admin_by_id(session.get('admin_id'))
     if request.method == 'GET':
         return render_template('/admin/contact.html', admin=admin)
@@ -3029,7 +2905,7 @@ from  pprint import pprint
 @admin_required
 def get_all_calls():
     """Main calls page with initial data."""
-    call_service = CallService(current_app.db)
+    call_service = current_app.services.call_service
     
     # Get initial calls with limited data
     calls = call_service.get_calls_with_limited_data(
@@ -3048,13 +2924,14 @@ def get_all_calls():
         call_counts=call_counts,
         has_more=len(calls) == 20,
         next_page=1,
+        next_cursor=next_cursor(calls, 20, "started_at", "call_id"),
         current_filter='all'
     )
 
 @admin_bp.route("/call/<call_id>")
 @admin_required
 def get_call(call_id):
-    call_service = CallService(current_app.db)
+    call_service = current_app.services.call_service
     call = call_service.get_full_call(call_id)
 
     if request.headers.get("HX-Request"):
@@ -3079,6 +2956,7 @@ def get_call(call_id):
         call_counts=call_counts,
         has_more=len(calls) == 20,
         next_page=1,
+        next_cursor=next_cursor(calls, 20, "started_at", "call_id"),
         current_filter='all'
     )
 
@@ -3087,13 +2965,50 @@ def get_call(call_id):
 @admin_required
 def delete_call(call_id):
     print("delete call")
-    call_service = CallService(current_app.db)
+    call_service = current_app.services.call_service
     if call_service.delete_call(call_id):
         return "",200
     return "",500
     
 
 
+@admin_bp.route("/call/<call_id>/transcript")
+@admin_required
+def get_call_transcript(call_id):
+    """
+    A page of a call's transcription (?offset=&limit=), or with ?format=ndjson
+    the whole transcription streamed one entry per line.
+    """
+    call_service = current_app.services.call_service
+
+    if request.args.get("format") == "ndjson":
+        if call_service.get_transcript_page(call_id, 0, 1) is None:
+            return jsonify({"error": "Call not found"}), 404
+
+        def generate():
+            for entry in call_service.iter_transcript(call_id):
+                yield json.dumps(entry, default=str) + "\n"
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename=call_{call_id}_transcript.ndjson"}
+        )
+
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", TRANSCRIPT_PAGE_SIZE, type=int), 1), TRANSCRIPT_PAGE_SIZE)
+    page = call_service.get_transcript_page(call_id, offset, limit)
+    if page is None:
+        return jsonify({"error": "Call not found"}), 404
+    entries, total = page
+    next_offset = offset + len(entries)
+    return jsonify({
+        "entries": entries,
+        "total": total,
+        "next_offset": next_offset if next_offset < total else None
+    })
+
+
 @admin_bp.route("/call/<call_id>/audio")
 @admin_required
 def send_audio_file(call_id):
@@ -3104,7 +3019,7 @@ def send_audio_file(call_id):
 @admin_required
 def filter_calls(filter):
     """Filter calls by status with pagination."""
-    call_service = CallService(current_app.db)
+    call_service = current_app.services.call_service
     
     page = int(request.args.get('page', 0))
     limit = 20
@@ -3126,11 +3041,13 @@ def filter_calls(filter):
         admin_id=session.get("admin_id"),
         limit=limit,
         skip=skip,
-        filter_type=filter_type
+        filter_type=filter_type,
+        cursor=request.args.get('cursor')
     )
     
     # Check if there are more calls
     has_more = len(calls) == limit
+    cursor = next_cursor(calls, limit, "started_at", "call_id")
     
     if is_pagination:
         # Return only the call items for infinite scroll
@@ -3139,6 +3056,7 @@ def filter_calls(filter):
             calls=calls,
             has_more=has_more,
             next_page=page + 1,
+            next_cursor=cursor,
             current_filter=filter
         )
     else:
@@ -3148,6 +3066,7 @@ def filter_calls(filter):
             calls=calls,
             has_more=has_more,
             next_page=page + 1,
+            next_cursor=cursor,
             current_filter=filter
         )
 
@@ -3156,7 +3075,7 @@ def filter_calls(filter):
 @admin_required
 def get_calls_list():
     """Get calls list (used for real-time updates via Socket.IO)."""
-    call_service = CallService(current_app.db)
+    call_service = current_app.services.call_service
     
     calls = call_service.get_calls_with_limited_data(
         admin_id=session.get("admin_id"),
@@ -3169,6 +3088,7 @@ def get_calls_list():
         calls=calls,
         has_more=len(calls) == 20,
         next_page=1,
+        next_cursor=next_cursor(calls, 20, "started_at", "call_id"),
         current_filter='all'
     )
 
@@ -3177,7 +3097,7 @@ def get_calls_list():
 @admin_required
 def get_call_counts():
     """API endpoint to get call counts for all filters."""
-    call_service = CallService(current_app.db)
+    call_service = current_app.services.call_service
     counts = call_service.get_call_counts_by_filter(session.get('admin_id'))
     return jsonify(counts)
 
@@ -3193,33 +3113,61 @@ print(WHATSAPP_TOKEN)
 @admin_bp.route("/whatsapp/")
 @admin_required
 def dashboard():
-    wa_service = WhatsappService(current_app.db)
-    chats = wa_service.get_all_chats()
-    return render_template("admin/whatsapp.html",chats=chats)
+    wa_service = current_app.services.whatsapp_service
+    chats, next_cursor = wa_service.list_chats()
+    return render_template("admin/whatsapp.html",chats=chats, next_cursor=next_cursor)
 
 @admin_bp.route("/whatsapp/<phone_no>")
 @admin_required
 def get_wa_chat(phone_no):
      
-    wa_service = WhatsappService(current_app.db)
+    wa_service = current_app.services.whatsapp_service
     chat = wa_service.get_by_phone_no(phone_no)
     if request.headers.get("HX-Request"):
         return render_template("components/whatsapp-chat-area.html",chat=chat)
 
-    chats = wa_service.get_all_chats()
-    return render_template("admin/whatsapp.html",chat=chat,chats=chats)
+    chats, next_cursor = wa_service.list_chats()
+    return render_template("admin/whatsapp.html",chat=chat,chats=chats, next_cursor=next_cursor)
+
+
+@admin_bp.route("/whatsapp/<phone_no>/messages", methods=["GET"])
+@admin_required
+def wa_chat_messages(phone_no):
+    """Older messages of a WhatsApp chat, for paging backwards in the chat view"""
+    before = request.args.get("before")
+    limit = min(max(request.args.get("limit", RECENT_MESSAGES, type=int), 1), 200)
+    try:
+        before = datetime.fromisoformat(before) if before else None
+    except ValueError:
+        return "Invalid before", 400
+
+    wa_service = current_app.services.whatsapp_service
+    chat = wa_service.get_by_phone_no(phone_no, message_limit=0)
+    if not chat:
+        return "Chat not found", 404
+    chat["messages"] = wa_service.get_messages(phone_no, limit=limit, before=before)
+
+    if request.headers.get("HX-Request"):
+        return render_template("components/wa-message-page.html", chat=chat, page_size=limit)
+    return jsonify({
+        "messages": chat["messages"],
+        "has_more": len(chat["messages"]) >= limit,
+    })
 
 
 @admin_bp.route("/whatsapp/get-all-chats")
+@admin_required
 def whatsapp_chats():
-    wa_service = WhatsappService(current_app.db)
-    chats = wa_service.get_all_chats()
-    pass 
+    """Next page of the chat list, for infinite scroll"""
+    wa_service = current_app.services.whatsapp_service
+    chats, next_cursor = wa_service.list_chats(cursor=request.args.get("cursor"))
+    return render_template("components/whatsapp-chat-list-items-only.html",
+                           chats=chats, next_cursor=next_cursor)
 
 @admin_bp.route("/whatsapp/<phone_no>/toggle_admin_enable")
 @admin_required
 def toggle_admin(phone_no):
-    wa_service = WhatsappService(current_app.db)
+    wa_service = current_app.services.whatsapp_service
     if wa_service.toggle_enabled_admin(phone_no):
         return "",200
     return "",500
@@ -3237,7 +3185,7 @@ def wa_audio_file(phone_no, message_id):
 
 @admin_bp.route("/whatsapp/<phone_no>/intervene",methods=["POST"])
 def wa_intervene(phone_no):
-    whatsapp_service = WhatsappService(current_app.db)
+    whatsapp_service = current_app.services.whatsapp_service
     print("INTERVENE")
     if whatsapp_service.toggle_enabled_admin(phone_no):
         return "",200
@@ -3284,8 +3232,7 @@ def wa_send_message(phone_no):
         
         # Save to DB using WhatsApp service
         try:
-            from services.whatsapp_service import WhatsappService
-            wa_service = WhatsappService(current_app.db)
+            wa_service = current_app.services.whatsapp_service
             wa_service.add_message(message, phone_no, "admin", type="text")
             print(f"Message logged to DB for {phone_no}")
         except Exception as e:
@@ -3364,8 +3311,7 @@ def wa_send_audio(phone_no):
         
         # Save to DB using WhatsApp service
         try:
-            from services.whatsapp_service import WhatsappService
-            wa_service = WhatsappService(current_app.db)
+            wa_service = current_app.services.whatsapp_service
             
             # Save audio message with reference
             msg_id = wa_service.add_message("[Audio Message]", phone_no, "admin", type="audio")
@@ -3404,7 +3350,6 @@ import os
 import requests
 from io import BytesIO
 from flask import current_app, render_template, request, jsonify, send_from_directory, abort
-from services.facebook_service import FacebookService
 
 FACEBOOK_PAGE_ACCESS_TOKEN = os.getenv("FACEBOOK_PAGE_ACCESS_TOKEN")
 VERSION = "v24.0"
@@ -3415,36 +3360,63 @@ print(FACEBOOK_PAGE_ACCESS_TOKEN)
 @admin_bp.route("/facebook/")
 @admin_required
 def facebook_dashboard():
-    fb_service = FacebookService(current_app.db)
-    chats = fb_service.get_all_chats()
-    return render_template("admin/facebook.html", chats=chats)
+    fb_service = current_app.services.facebook_service
+    chats, next_cursor = fb_service.list_chats()
+    return render_template("admin/facebook.html", chats=chats, next_cursor=next_cursor)
 
 
 @admin_bp.route("/facebook/<sender_id>")
 @admin_required
 def get_fb_chat(sender_id):
-    fb_service = FacebookService(current_app.db)
+    fb_service = current_app.services.facebook_service
     chat = fb_service.get_by_sender_id(sender_id)
     
     if request.headers.get("HX-Request"):
         return render_template("components/facebook-chat-area.html", chat=chat)
     
-    chats = fb_service.get_all_chats()
-    return render_template("admin/facebook.html", chat=chat, chats=chats)
+    chats, next_cursor = fb_service.list_chats()
+    return render_template("admin/facebook.html", chat=chat, chats=chats, next_cursor=next_cursor)
+
+
+@admin_bp.route("/facebook/<sender_id>/messages", methods=["GET"])
+@admin_required
+def fb_chat_messages(sender_id):
+    """Older messages of a Facebook chat, for paging backwards in the chat view"""
+    before = request.args.get("before")
+    limit = min(max(request.args.get("limit", RECENT_MESSAGES, type=int), 1), 200)
+    try:
+        before = datetime.fromisoformat(before) if before else None
+    except ValueError:
+        return "Invalid before", 400
+
+    fb_service = current_app.services.facebook_service
+    chat = fb_service.get_by_sender_id(sender_id, message_limit=0)
+    if not chat:
+        return "Chat not found", 404
+    chat["messages"] = fb_service.get_messages(sender_id, limit=limit, before=before)
+
+    if request.headers.get("HX-Request"):
+        return render_template("components/fb-message-page.html", chat=chat, page_size=limit)
+    return jsonify({
+        "messages": chat["messages"],
+        "has_more": len(chat["messages"]) >= limit,
+    })
 
 
 @admin_bp.route("/facebook/get-all-chats")
 @admin_required
 def facebook_chats():
-    fb_service = FacebookService(current_app.db)
-    chats = fb_service.get_all_chats()
-    return jsonify(chats), 200
+    """Next page of the chat list, for infinite scroll"""
+    fb_service = current_app.services.facebook_service
+    chats, next_cursor = fb_service.list_chats(cursor=request.args.get("cursor"))
+    return render_template("components/facebook-chat-list-items-only.html",
+                           chats=chats, next_cursor=next_cursor)
 
 
 @admin_bp.route("/facebook/<sender_id>/toggle_admin_enable")
 @admin_required
 def toggle_fb_admin(sender_id):
-    fb_service = FacebookService(current_app.db)
+    fb_service = current_app.services.facebook_service
     if fb_service.toggle_enabled_admin(sender_id):
         return "", 200
     return "", 500
@@ -3466,7 +3438,7 @@ def fb_audio_file(sender_id, message_id):
 @admin_bp.route("/facebook/<sender_id>/intervene", methods=["POST"])
 @admin_required
 def fb_intervene(sender_id):
-    fb_service = FacebookService(current_app.db)
+    fb_service = current_app.services.facebook_service
     print("FACEBOOK INTERVENE")
     if fb_service.toggle_enabled_admin(sender_id):
         return "", 200
@@ -3512,7 +3484,7 @@ def fb_send_message(sender_id):
         
         # Save to DB using Facebook service
         try:
-            fb_service = FacebookService(current_app.db)
+            fb_service = current_app.services.facebook_service
             fb_service.add_message(message, sender_id, "admin", type="text")
             print(f"Message logged to DB for {sender_id}")
         except Exception as e:
@@ -3575,7 +3547,7 @@ def fb_send_audio(sender_id):
         
         # Save to DB using Facebook service
         try:
-            fb_service = FacebookService(current_app.db)
+            fb_service = current_app.services.facebook_service
             
             # Save audio message with reference
             msg_id = fb_service.add_message("[Audio Message]", sender_id, "admin", type="audio")
@@ -3627,7 +3599,7 @@ def get_fb_user_info(sender_id):
         user_info = response.json()
         
         # Update user info in database
-        fb_service = FacebookService(current_app.db)
+        fb_service = current_app.services.facebook_service
         fb_service.update_user_info(sender_id, user_info)
         
         return jsonify({
@@ -3646,23 +3618,23 @@ def get_fb_chat_statistics(sender_id):
     """
     Get statistics for a specific Facebook chat
     """
-    fb_service = FacebookService(current_app.db)
-    chat = fb_service.get_by_sender_id(sender_id)
+    fb_service = current_app.services.facebook_service
+    chat = fb_service.get_by_sender_id(sender_id, message_limit=0)
     
     if not chat:
         return jsonify({"error": "Chat not found"}), 404
     
-    messages = chat.get('messages', [])
+    counts = fb_service.get_thread_statistics(sender_id)
     
     stats = {
-        "total_messages": len(messages),
-        "user_messages": len([m for m in messages if m['sender'] == sender_id]),
-        "bot_messages": len([m for m in messages if m['sender'] == 'bot']),
-        "admin_messages": len([m for m in messages if m['sender'] == 'admin']),
-        "text_messages": len([m for m in messages if m['type'] == 'text']),
-        "audio_messages": len([m for m in messages if m['type'] == 'audio']),
-        "first_message": messages[0]['time'] if messages else None,
-        "last_message": messages[-1]['time'] if messages else None,
+        "total_messages": counts["total"],
+        "user_messages": counts["by_sender"].get(sender_id, 0),
+        "bot_messages": counts["by_sender"].get('bot', 0),
+        "admin_messages": counts["by_sender"].get('admin', 0),
+        "text_messages": counts["by_type"].get('text', 0),
+        "audio_messages": counts["by_type"].get('audio', 0),
+        "first_message": counts["first_message"],
+        "last_message": counts["last_message"],
         "created_at": chat.get('created_at'),
         "updated_at": chat.get('updated_at')
     }
@@ -3677,7 +3649,7 @@ def delete_fb_chat(sender_id):
     Delete a Facebook chat and all its messages
     """
     try:
-        fb_service = FacebookService(current_app.db)
+        fb_service = current_app.services.facebook_service
         
         if fb_service.delete_chat(sender_id):
             if request.headers.get('HX-Request'):
@@ -3701,7 +3673,7 @@ def get_all_fb_statistics():
     """
     Get overall statistics for all Facebook chats
     """
-    fb_service = FacebookService(current_app.db)
+    fb_service = current_app.services.facebook_service
     stats = fb_service.get_chat_statistics()
     
     return jsonify({
@@ -3718,7 +3690,7 @@ def register_admin_socketio_events(socketio):
         if session.get("role") != "admin":
             return
 
-        chat_service = ChatService(current_app.db)
+        chat_service = current_app.services.chat_service
         chats = chat_service.get_all_chats(session.get('admin_id'))
 
         room = data.get("room")
@@ -3731,7 +3703,7 @@ def register_admin_socketio_events(socketio):
         # emit("status", {"msg": "Admin has joined the room."}, room=room)
     @socketio.on("joinAll")
     def joinAll():
-        chat_service = ChatService(current_app.db)
+        chat_service = current_app.services.chat_service
         chats = chat_service.get_all_chats(session.get('admin_id'))
         for chat in chats:
             print(f"joined {chat.room_id}")
@@ -2,7 +2,6 @@ import pdfplumber
 from flask import send_from_directory
 import uuid
 from pprint import pprint
-from services.notification_service import NotificationService
 import requests
 import os
 import json
@@ -10,10 +9,9 @@ from config import Config
 from flask import request, make_response, session, jsonify, url_for, current_app, abort, redirect
 from functools import wraps
 from . import api_bp
-from services.admin_service import AdminService
-from services.chat_service import ChatService
-from services.user_service import UserService
-from services.usage_service import UsageService
+from services.settings_service import thaw
+from services.chat_service import MESSAGE_PAGE_SIZE
+from services.pagination import next_cursor
 from datetime import datetime
 from services.timezone import UTCZoneManager
 from google.auth.transport.requests import Request
@@ -58,7 +56,7 @@ def admin_required(_func=None, *, roles=None):
                 session["next"] = request.path
                 return error_json_response("Not Authorized", 401)
 
-            admin_service = AdminService(current_app.db)
+            admin_service = current_app.services.admin_service
             current_admin = admin_service.get_admin_by_id(session["admin_id"])
 
             if not current_admin or not current_admin.has_permission(roles):
@@ -172,7 +170,7 @@ def login():
     if not username or not password:
         return error_json_response('Username and Password are required', 400)
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin = admin_service.authenticate_admin(username, password)
 
     if not admin:
@@ -182,13 +180,13 @@ def login():
         # No 2FA required, complete login
         return complete_admin_login(admin)
     # Check if IP is trusted (completed 2FA within last 30 mins)
-    if admin_service.is_ip_trusted(admin.admin_id, ip_address, current_app.config['SETTINGS'].get('2fa')):
+    if admin_service.is_ip_trusted(admin.admin_id, ip_address, current_app.settings_service.current().get('2fa')):
         # IP is trusted, proceed with login
         return complete_admin_login(admin)
 
     # IP not trusted, require 2FA
     token_info = admin_service.create_2fa_token(
-        admin.admin_id, ip_address, current_app.config['SETTINGS'].get('2fa'))
+        admin.admin_id, ip_address, current_app.settings_service.current().get('2fa'))
     if not token_info:
         return error_json_response('Failed to create 2FA token', 500)
 
@@ -202,7 +200,7 @@ def me():
     expo_token = request.args.get("expo-token")
     print(expo_token)
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     admin = admin_service.get_admin_by_id(session.get("admin_id")).to_dict()
     print(admin_service.add_expo_token(session.get("admin_id"), expo_token))
     del admin['password_hash']
@@ -217,32 +215,34 @@ def get_chat_list():
     page = request.args.get('page', 0, type=int)
     limit = request.args.get('limit', 10, type=int)
     filter_type = request.args.get('filter', 'all')
+    cursor = request.args.get('cursor')
 
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
+    chat_service = current_app.services.chat_service
+    user_service = current_app.services.user_service
 
-    # Get chats based on filter with pagination
+    # Get chats based on filter; `cursor` continues after the previous page
     chats = chat_service.get_filtered_chats_paginated(
         admin_id=session.get("admin_id"),
         filter_type=filter_type,
         limit=limit,
-        skip=page * limit
+        skip=page * limit,
+        cursor=cursor
     )
 
-    chats_data = []
-    for c in chats:
-        data = c.to_dict()
-        data["username"] = user_service.get_user_by_id(c.user_id).name
-        chats_data.append(data)
-    chats_data.sort(key=lambda x: x["updated_at"], reverse=True)
+    user_service.attach_usernames(chats)
+    chats_data = [c.to_dict() for c in chats]
     # print(len(chats_data))
-    return success_json_response({"chats": chats_data, "has_more": len(chats_data) == limit})
+    return success_json_response({
+        "chats": chats_data,
+        "has_more": len(chats_data) == limit,
+        "next_cursor": next_cursor(chats, limit, "updated_at", "room_id")
+    })
 
 
 @api_bp.route("/client/<user_id>", methods=["GET"])
 @admin_required
 def user(user_id):
-    user_service = UserService(current_app.db)
+    user_service = current_app.services.user_service
     user = user_service.get_user_by_id(user_id)
     return success_json_response(
         user.to_dict()
@@ -252,20 +252,37 @@ def user(user_id):
 @api_bp.route("/chat/<room_id>", methods=["GET"])
 @admin_required
 def chat(room_id):
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
-    chat = chat_service.get_chat_by_room_id(room_id)
+    chat_service = current_app.services.chat_service
+    user_service = current_app.services.user_service
+    chat = chat_service.get_chat_by_room_id(room_id, message_limit=MESSAGE_PAGE_SIZE)
     # print(chat)
     if not chat:
         return error_json_response("Chat not found"), 500
     # Get initial chats with pagination
     user = user_service.get_user_by_id(chat.user_id)
-    chat_service.set_chat_viewed(chat.room_id)
+    if not chat.viewed:
+        chat_service.set_chat_viewed(chat.room_id)
     return success_json_response(
-        {"user": user.to_dict(), "chat": chat.to_dict(), "username": "Ana"}
+        {"user": user.to_dict(), "chat": chat.to_dict(), "username": "Ana",
+         "has_more": len(chat.messages) < chat.message_count}
     )
 
 
+@api_bp.route("/chat/<room_id>/messages", methods=["GET"])
+@admin_required
+def chat_messages(room_id):
+    """Page backwards through a chat: ?before=<seq of the oldest loaded message>"""
+    before = request.args.get("before", type=int)
+    limit = min(max(request.args.get("limit", MESSAGE_PAGE_SIZE, type=int), 1), 200)
+
+    chat_service = current_app.services.chat_service
+    messages = chat_service.get_messages(room_id, limit=limit, before=before)
+    return success_json_response({
+        "messages": [m.to_dict() for m in messages],
+        "has_more": bool(messages and (messages[0].seq or 0) > 1),
+    })
+
+
 def get_country_id(file_path, target_country):
     with open(file_path, 'r') as f:
         data = json.load(f)
@@ -283,8 +300,8 @@ def send_message(room_id):
         message = request.json.get("message")
         if not message:
             return success_json_response("", 302)
-        chat_service = ChatService(current_app.db)
-        user_service = UserService(current_app.db)
+        chat_service = current_app.services.chat_service
+        user_service = current_app.services.user_service
 
         chat = chat_service.get_chat_by_room_id(room_id)
         if not chat:
@@ -315,11 +332,11 @@ def send_message(room_id):
 @api_bp.route('/chat/<string:room_id>/export', methods=['POST'])
 @admin_required
 def export_chat(room_id):
-    chat_service = ChatService(current_app.db)
-    chat = chat_service.get_chat_by_room_id(room_id)
+    chat_service = current_app.services.chat_service
+    chat = chat_service.get_chat_by_room_id(room_id, message_limit=None)
 
     if chat:
-        user_service = UserService(current_app.db)
+        user_service = current_app.services.user_service
         user = user_service.get_user_by_id(chat.user_id)
         # try:
         erp_url = os.environ.get("ERP_URL")
@@ -373,13 +390,10 @@ def export_chat(room_id):
 @api_bp.route("/chat/<room_id>/archive", methods=["POST"])
 @admin_required
 def archive_chat(room_id):
-    chat_service = ChatService(current_app.db)
-    chat = chat_service.get_chat_by_room_id(room_id)
-
-    if chat:
-        if not chat_service.archive_chat(room_id):
-            return error_json_response("Error in exporting: Chat not found", 500)
+    chat_service = current_app.services.chat_service
 
+    # archive_chat reports whether the chat exists, no lookup needed
+    if chat_service.archive_chat(room_id):
         return success_json_response(None, 200)
 
     return error_json_response("Chat not found", 500)
@@ -388,7 +402,7 @@ def archive_chat(room_id):
 @api_bp.route("/chat/<string:room_id>/delete", methods=["POST"])
 @admin_required
 def delete_chat(room_id):
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
     print(f"Deleted: {chat_service.delete([room_id])}")
     return success_json_response(None, 200)
 
@@ -396,8 +410,8 @@ def delete_chat(room_id):
 @api_bp.route("/chats/latest")
 @admin_required
 def latest_chats():
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
+    chat_service = current_app.services.chat_service
+    user_service = current_app.services.user_service
     chats = chat_service.get_all_chats(admin_id=session.get("admin_id"))
 
     if not chats:
@@ -412,12 +426,11 @@ def latest_chats():
     chats_data = []
     today_count = this_month_count = 0
 
+    user_service.attach_usernames(chats[:5])
     for i, chat in enumerate(chats):
         # Get latest 5 chats data
         if i < 5:
-            data = chat.to_dict()
-            data["username"] = user_service.get_user_by_id(chat.user_id).name
-            chats_data.append(data)
+            chats_data.append(chat.to_dict())
 
         # Calculate stats for all chats
         if chat.created_at >= today_start:
@@ -476,7 +489,7 @@ def load_folders():
         data = request.get_json()
         selected_folders = data.get("selected_folders", [])
 
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
         # Update admin settings with selected folders
@@ -498,7 +511,7 @@ def load_folders():
 @admin_required
 def google_files():
     try:
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
         if not current_admin.settings.get("google_token"):
@@ -562,7 +575,7 @@ def google_files():
 @admin_required
 def view_google_file(file_id):
     try:
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
         if not current_admin.settings.get("google_token"):
@@ -587,7 +600,7 @@ def view_google_file(file_id):
 @admin_required
 def download_google_files():
     try:
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
         if not current_admin.settings.get("google_token"):
@@ -670,7 +683,7 @@ def download_google_files():
 @admin_required
 def google_logout():
     try:
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         admin_service.admins_collection.update_one(
             {"admin_id": session.get('admin_id')},
             {"$unset": {"settings.google_token": "", "settings.selected_folders": ""}},
@@ -686,7 +699,7 @@ def google_logout():
 @admin_required
 def google_thumbnail(file_id):
     try:
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
         if not current_admin.settings.get("google_token"):
@@ -749,7 +762,7 @@ def oauth2callback():
         flow.fetch_token(authorization_response=request.url)
 
         # Store credentials in the admin's settings
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
         # Update admin settings with the new token
@@ -790,7 +803,7 @@ def save_google_tokens():
         credentials = flow.credentials
 
         # Save to admin settings
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
         current_admin.settings["google_token"] = credentials.to_json()
@@ -823,34 +836,36 @@ def save_google_tokens():
 @admin_required
 def settings():
     try:
-        admin_service = AdminService(current_app.db)
+        admin_service = current_app.services.admin_service
         current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
+        superadmin_settings = thaw(current_app.settings_service.current())
+
         # Initialize settings data based on role
         if current_admin.role == "superadmin":
             settings_data = {
-                **current_app.config["SETTINGS"], **current_admin.settings}
+                **superadmin_settings, **current_admin.settings}
         else:
             settings_data = current_admin.settings
 
         # Validate logo paths for superadmin
         if current_admin.role == "superadmin":
             settings_data["logo"]["large"] = (
-                current_app.config["SETTINGS"]["logo"]["large"]
+                superadmin_settings["logo"]["large"]
                 if os.path.exists(
                     os.path.join(
                         os.getcwd(),
-                        current_app.config["SETTINGS"]["logo"]["large"][1:]
+                        superadmin_settings["logo"]["large"][1:]
                     )
                 )
                 else ""
             )
             settings_data["logo"]["small"] = (
-                current_app.config["SETTINGS"]["logo"]["small"]
+                superadmin_settings["logo"]["small"]
                 if os.path.exists(
                     os.path.join(
                         os.getcwd(),
-                        current_app.config["SETTINGS"]["logo"]["small"][1:]
+                        superadmin_settings["logo"]["small"][1:]
                     )
                 )
                 else ""
@@ -894,13 +909,6 @@ def settings():
                         current_admin.admin_id}: {str(e)}"
                 )
 
-        # Update config for superadmin
-        if current_admin.role == 'superadmin':
-            current_app.db.config.update_one(
-                {"id": "settings"},
-                {"$set": current_app.config['SETTINGS']}
-            )
-
         # Prepare response data
         response_data = {
             "settings": settings_data,
@@ -921,7 +929,7 @@ def settings():
 @api_bp.route("/settings/subject/<string:subject>", methods=["DELETE"])
 @admin_required
 def subjects(subject):
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     if request.method == "POST":
@@ -931,10 +939,7 @@ def subjects(subject):
 
         try:
             if current_admin.role == "superadmin":
-                current_app.config["SETTINGS"]["subjects"] = set(
-                    current_app.config["SETTINGS"].get("subjects", [])
-                )
-                current_app.config["SETTINGS"]["subjects"].add(subject)
+                current_app.settings_service.add_to_set("subjects", subject)
                 return success_json_response({"subject": subject}, 201)
             else:
                 current_admin.settings["subjects"] = set(
@@ -953,8 +958,7 @@ def subjects(subject):
     else:  # DELETE method
         try:
             if current_admin.role == "superadmin":
-                if subject in current_app.config["SETTINGS"].get("subjects", []):
-                    current_app.config["SETTINGS"]["subjects"].remove(subject)
+                if current_app.settings_service.pull("subjects", subject):
                     return success_json_response({"message": f"Subject '{subject}' deleted successfully"})
                 else:
                     return error_json_response("Subject not found", 404)
@@ -982,17 +986,17 @@ def add_language():
     if not language:
         return error_json_response("Language is required", 400)
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     try:
         if current_admin.role == "superadmin":
             # Update global settings
             languages = set(
-                current_app.config["SETTINGS"].get("languages", ["English"])
+                current_app.settings_service.current().get("languages", ["English"])
             )
             languages.add(language)
-            current_app.config["SETTINGS"]["languages"] = list(languages)
+            current_app.settings_service.update({"languages": sorted(languages)})
             return success_json_response({"language": language}, 201)
         else:
             # Update admin-specific settings
@@ -1019,19 +1023,19 @@ def remove_language(language):
     if not language:
         return error_json_response("Language is required", 400)
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     try:
         if current_admin.role == "superadmin":
             # Update global settings
             languages = set(
-                current_app.config["SETTINGS"].get("languages", ["English"])
+                current_app.settings_service.current().get("languages", ["English"])
             )
             if language not in languages:
                 return error_json_response("Language not found", 404)
             languages.discard(language)
-            current_app.config["SETTINGS"]["languages"] = list(languages)
+            current_app.settings_service.update({"languages": sorted(languages)})
             return success_json_response({"message": f"Language '{language}' removed successfully"})
         else:
             # Update admin-specific settings
@@ -1062,12 +1066,12 @@ def set_timezone():
         return error_json_response("Timezone is required", 400)
 
     tz = data.get("timezone")
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     try:
         if current_admin.role == "superadmin":
-            current_app.config["SETTINGS"]["timezone"] = tz
+            current_app.settings_service.update({"timezone": tz})
             return success_json_response({"timezone": tz}, 200)
         else:
             current_admin.settings["timezone"] = tz
@@ -1096,12 +1100,12 @@ def add_timing():
     if not all([day, start_time, end_time]):
         return error_json_response("Day, start time, and end time are required", 400)
 
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     try:
         if current_admin.role == "superadmin":
-            timings = current_app.config["SETTINGS"].get("timings", [])
+            timings = thaw(current_app.settings_service.current().get("timings", []))
         else:
             timings = current_admin.settings.get("timings", [])
 
@@ -1125,7 +1129,7 @@ def add_timing():
         timings.sort(key=lambda t: day_order[t["day"]])
 
         if current_admin.role == "superadmin":
-            current_app.config["SETTINGS"]["timings"] = timings
+            current_app.settings_service.update({"timings": timings})
         else:
             current_admin.settings["timings"] = timings
             admin_service.admins_collection.update_one(
@@ -1148,12 +1152,12 @@ def set_prompt():
         return error_json_response("Prompt is required", 400)
 
     prpt = data.get("prompt")
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get("admin_id"))
 
     try:
         if current_admin.role == "superadmin":
-            current_app.config["SETTINGS"]["prompt"] = prpt
+            current_app.settings_service.update({"prompt": prpt})
             return success_json_response({"prompt": prpt}, 200)
         else:
             current_admin.settings["prompt"] = prpt
@@ -1181,56 +1185,48 @@ def search():
     if not query:
         return success_json_response({"results": []}, 200)
 
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
-    chats = chat_service.get_all_chats(session.get("admin_id"))
+    page = data.get("page", 0, type=int)
+    limit = min(max(data.get("limit", 20, type=int), 1), 100)
+    search_service = current_app.services.search_service
+    user_service = current_app.services.user_service
+    chats = search_service.search_chats(
+        query, session.get("admin_id"), limit=limit, skip=page * limit)
+    users = user_service.get_users_by_ids(
+        {chat.user_id for chat in chats}, fields=("name", "country", "city"))
 
     search_results = []
     for chat in chats:
-        user = user_service.get_user_by_id(chat.user_id)
-        if not user:
-            continue
-
-        # Match against user fields
-        user_matched = (
-            query in user.name.lower() or
-            (user.country and query in user.country.lower()) or
-            (user.city and query in user.city.lower())
+        user = users.get(chat.user_id, {})
+        chat_data = chat.to_dict()
+        chat_data.update(
+            {
+                "username": chat.username or user.get("name"),
+                "user_country": user.get("country"),
+                "user_city": user.get("city"),
+            }
         )
+        search_results.append(chat_data)
 
-        # Match against messages
-        message_matched = any(query in message.content.lower()
-                              for message in chat.messages)
-
-        if user_matched or message_matched:
-            # Prepare chat data for JSON response
-            # chat_data = {
-            #     "chat_id": chat.chat_id,
-            #     "user_id": chat.user_id,
-            #     "created_at": chat.created_at.isoformat() if chat.created_at else None,
-            #     "matched_by": "user" if user_matched else "message"
-            # }
-            chat_data = chat.to_dict()
-            chat_data.update(
-                {
-
-                    "username": user.name,
-                    "user_country": user.country,
-                    "user_city": user.city,
-                }
-            )
+    return success_json_response({"results": search_results, "count": len(search_results),
+                                  "has_more": len(search_results) == limit}, 200)
 
-            search_results.append(chat_data)
-    pprint(search_results)
 
-    return success_json_response({"results": search_results, "count": len(search_results)}, 200)
+@api_bp.route("/search/suggest", methods=["GET"])
+@admin_required
+def search_suggest():
+    """Typeahead completions for the word being typed"""
+    query = request.args.get("q", "")
+    search_service = current_app.services.search_service
+    return success_json_response(
+        {"suggestions": search_service.suggest(query, session.get("admin_id"))}, 200)
+
 
 
 @api_bp.route("/chat/<room_id>/intervene",methods=["POST"])
 @admin_required
 def intervene(room_id):
-    admin_service = AdminService(current_app.db)
-    chat_service = ChatService(current_app.db)
+    admin_service = current_app.services.admin_service
+    chat_service = current_app.services.chat_service
     chat_service.set_admin_required(room_id,True)
     return success_json_response(None, 200)
 
@@ -1238,14 +1234,16 @@ def intervene(room_id):
 @api_bp.route("/notifications")
 @admin_required
 def get_notifications():
-    noti_service = NotificationService(current_app.db)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 100)
+    noti_service = current_app.services.notification_service
     notis = noti_service.get_notifications(
-        session.get("admin_id"), unread_only=True
+        session.get("admin_id"), limit=limit, unread_only=True,
+        cursor=request.args.get("cursor")
     )
-    chat_service = ChatService(current_app.db)
+    chat_service = current_app.services.chat_service
     notificaitons = []
 
-    user_service = UserService(current_app.db)
+    user_service = current_app.services.user_service
     print(notis)
     for noti in notis:
 
@@ -1257,13 +1255,18 @@ def get_notifications():
             notificaitons.append(
                 {**noti, **chat.to_dict(), **{"username": user.name}})
     pprint(notificaitons)
-    return success_json_response(notificaitons, 200)
+    response, code = success_json_response(notificaitons, 200)
+    # The body stays a plain list for existing clients, the next page cursor rides in a header
+    cursor = next_cursor(notis, limit, "created_at", "notification_id")
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return response, code
 
 
 @api_bp.route("/notification/<notification_id>/", methods=['POST'])
 @admin_required
 def viewed_notifications(notification_id):
-    noti_service = NotificationService(current_app.db)
+    noti_service = current_app.services.notification_service
 
     if noti_service.mark_notification_read(notification_id, session.get('admin_id')):
 
@@ -1,5 +1,5 @@
-from services.call_service import CallService
 from . import call_bp
+from services.call_service import CALL_PAGE_SIZE
 import os
 from dotenv import load_dotenv
 import os
@@ -164,7 +164,7 @@ def initialize_call(call_uuid):
     print("=" * 60)
     
     try:
-        call_service = CallService(current_app.db)
+        call_service = current_app.services.call_service
         call_service.create_call(call_uuid, data)
         
         return jsonify({
@@ -185,7 +185,7 @@ def initialize_call(call_uuid):
 @call_bp.route('/<call_uuid>/send_chunk', methods=['POST'])
 def end_call(call_uuid):
 
-    call_service = CallService(current_app.db)
+    call_service = current_app.services.call_service
     call_service.end_call(call_uuid)
 
 @call_bp.route('/log/<call_uuid>/send_chunk', methods=['POST'])
@@ -234,7 +234,7 @@ def receive_chunk(call_uuid):
     print("=" * 60)
     
     try:
-        call_service = CallService(current_app.db)
+        call_service = current_app.services.call_service
         call_service.add_chunk(call_uuid, merged_transcription)
         
         # If this is the final chunk, mark call as ended
@@ -265,7 +265,8 @@ def get_call_summary(call_uuid):
     Get complete summary of a call
     """
     try:
-        call_service = CallService(current_app.db)
+        call_service = current_app.services.call_service
+        # First page of the transcription, the admin transcript export has the rest
         call = call_service.get_call(call_uuid)
         
         if not call:
@@ -274,9 +275,6 @@ def get_call_summary(call_uuid):
                 "message": "Call not found"
             }), 404
         
-        # Convert ObjectId to string for JSON serialization
-        call['_id'] = str(call['_id'])
-        
         return jsonify({
             "status": "success",
             "call": call
@@ -293,20 +291,24 @@ def get_call_summary(call_uuid):
 @call_bp.route('/log/active-calls', methods=['GET'])
 def get_active_calls():
     """
-    Get list of all calls
+    Get a page of calls, newest first, without transcriptions.
+    ?status=ongoing|ended|in_progress narrows it, ?cursor= is the previous page's next_cursor
     """
     try:
-        call_service = CallService(current_app.db)
-        calls = list(call_service.call_collection.find({}))
-        
-        # Convert ObjectId to string for JSON serialization
-        for call in calls:
-            call['_id'] = str(call['_id'])
+        call_service = current_app.services.call_service
+        status = request.args.get('status')
+        calls, cursor = call_service.list_calls(
+            status=status,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', CALL_PAGE_SIZE, type=int)
+        )
+        counts = call_service.get_call_counts_by_filter()
         
         return jsonify({
             "status": "success",
-            "total_calls": len(calls),
-            "calls": calls
+            "total_calls": counts.get(status or 'all', 0),
+            "calls": calls,
+            "next_cursor": cursor
         }), 200
     
     except Exception as e:
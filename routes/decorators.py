@@ -1,7 +1,6 @@
 # decorators.py
 from functools import wraps
 from flask import session, request, redirect, url_for, current_app
-from services.admin_service import AdminService
 
 def admin_required(roles=None):
     """Decorator to check admin permissions with role-based access"""
@@ -19,7 +18,7 @@ def admin_required(roles=None):
                 return redirect(url_for('admin.login'))
 
             # Get current admin from database
-            admin_service = AdminService(current_app.db)
+            admin_service = current_app.services.admin_service
             current_admin = admin_service.get_admin_by_id(session['admin_id'])
 
             if not current_admin or not current_admin.has_permission(roles):
@@ -5,8 +5,6 @@ from io import BytesIO
 from pydub import AudioSegment
 from datetime import datetime, timedelta
 
-from services.admin_service import AdminService
-from services.facebook_service import FacebookService
 from . import fb_bp
 
 FACEBOOK_PAGE_ACCESS_TOKEN = os.getenv('FACEBOOK_PAGE_ACCESS_TOKEN')
@@ -137,7 +135,7 @@ def webhook():
     try:
         data = request.get_json()
         print("Received Facebook webhook data:", data)
-        fb_service = FacebookService(current_app.db)
+        fb_service = current_app.services.facebook_service
         
         if data.get('object') == 'page':
             entries = data.get('entry', [])
@@ -160,8 +158,8 @@ def webhook():
                             continue
                         
                         # Get or create chat
-                        chat = fb_service.get_by_sender_id(sender_id)
-                        admin = AdminService(current_app.db).get_admin_by_id(DEFAULT_ADMIN_ID)
+                        chat = fb_service.exists(sender_id)
+                        admin = current_app.services.admin_service.get_admin_by_id(DEFAULT_ADMIN_ID)
                         
                         if not chat:
                             fb_service.create(sender_id)
@@ -1,22 +1,22 @@
 from pprint import pprint
 import threading
+import time
 from services.expo_noti import send_push_noti
 import markdown
 from flask import make_response
-from services.notification_service import NotificationService
 from flask_mail import Mail
-from services.admin_service import AdminService
 from datetime import datetime
-import requests
 from services.timezone import UTCZoneManager
 from flask import render_template_string
-from services.usage_service import UsageService
 import random
-from flask import render_template, session, request, jsonify, redirect, url_for, current_app
+from flask import render_template, session, request, jsonify, redirect, url_for, current_app, g
 from flask_socketio import join_room, leave_room, emit
 from . import min_bp
-from services.user_service import UserService
-from services.chat_service import ChatService
+from services.session_service import user_claims
+from services.geoip_service import geoip
+from services.search_service import user_terms
+from services.circuit_breaker import generation_breaker, generation_retry_budget, generation_retry_policy, is_provider_error
+from services.latency_service import elapsed_ms
 from functools import wraps
 from services.email_service import send_email
 import os
@@ -24,56 +24,104 @@ import pytz
 from flask import copy_current_request_context
 
 
-def handle_bot_response(room_id, message, chat, admin, max_retries=3, retry_delay=1,init_delay=False):
+BOT_ERROR_MESSAGE = "We Apologize, there was an unexpected error, please try again after some time"
+BOT_HANDOFF_MESSAGE = "Our assistant is temporarily unavailable. Ana has been notified and will join soon"
+
+
+def _post_system_message(chat_service, chat, content):
+    system_message = chat_service.add_message(chat.room_id, "SYSTEM", content)
+    current_app.socketio.emit('new_message', {
+        'room_id': chat.room_id,
+        'sender': "SYSTEM",
+        'content': content,
+        'timestamp': system_message.timestamp.isoformat()
+    }, room=chat.room_id)
+
+
+def _bot_unavailable(chat_service, chat):
+    """Fast-fail path: apologise, or hand the chat to an admin if configured"""
+    if not current_app.config.get('BOT_OUTAGE_HANDOFF'):
+        _post_system_message(chat_service, chat, BOT_ERROR_MESSAGE)
+        return
+
+    chat_service.set_admin_required(chat.room_id, True)
+    current_app.socketio.emit('admin_required', {
+        'room_id': chat.room_id,
+        'chat_id': chat.chat_id,
+        'subject': chat.subject
+    }, room='admin')
+    current_app.services.notification_service.create_admin_required_notification(
+        chat.admin_id, chat.room_id)
+    _post_system_message(chat_service, chat, BOT_HANDOFF_MESSAGE)
+
+
+def handle_bot_response(room_id, message, chat, admin, max_retries=None, init_delay=False):
     """Handle bot response with retry logic - can be called from multiple endpoints"""
+    max_retries = max_retries or generation_retry_policy.max_attempts
+    enqueued_at = time.perf_counter()
+
     @copy_current_request_context
     def _bot_response_worker():
-        chat_service = ChatService(current_app.db)
-        admin_service = AdminService(current_app.db)
+        chat_service = current_app.services.chat_service
         if init_delay:
             time.sleep(5)
+        timings = {"queue_wait_ms": elapsed_ms(enqueued_at)}
 
-        
+        generation_retry_budget.record_request()
         for attempt in range(max_retries):
+            # Provider is down: don't queue behind timeouts we know will fail
+            if not generation_breaker.allow_request():
+                print(f"Bot circuit open, skipping generation for {chat.room_id}")
+                break
+
             try:
                 msg, usage = current_app.bot.respond(
-                    f"Subject of chat: {chat.subject}\n{message}", chat.room_id)
-                
-                admin_service.update_tokens(admin.admin_id, usage['cost'])
-
-                bot_message = chat_service.add_message(chat.room_id, chat.bot_name, msg)
-                print({
-                    'room_id': chat.room_id,
-                    'sender': chat.bot_name,
-                    'content': msg,
-                    'timestamp': bot_message.timestamp.isoformat()
-                })
-
-                current_app.socketio.emit('new_message', {
-                    'room_id': chat.room_id,
-                    'sender': chat.bot_name,
-                    'content': msg,
-                    'timestamp': bot_message.timestamp.isoformat()
-                }, room=chat.room_id)
-
-                return  # Success, exit retry loop
-                
+                    f"Subject of chat: {chat.subject}\n{message}", chat.room_id,
+                    timings=timings)
             except Exception as e:
                 print(f"Bot response error (attempt {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    # All retries failed, send error message
-                    error_message = chat_service.add_message(chat.room_id, "SYSTEM", 
-                                                            "We Apologize, there was an unexpected error, please try again after some time")
-                    
-                    current_app.socketio.emit('new_message', {
-                        'room_id': chat.room_id,
-                        'sender': "SYSTEM",
-                        'content': "We Apologize, there was an unexpected error, please try again after some time",
-                        'timestamp': error_message.timestamp.isoformat()
-                    }, room=chat.room_id)
-    
+                if not is_provider_error(e):
+                    # Our own failure: retrying won't help and the provider is fine
+                    generation_breaker.release()
+                    break
+                generation_breaker.record_failure(e)
+                if attempt < max_retries - 1 and generation_retry_budget.try_acquire():
+                    time.sleep(generation_retry_policy.backoff(attempt))
+                    continue
+                break
+
+            generation_breaker.record_success()
+            # Buffered: usage history and token balance are written by the meter's flush
+            current_app.usage_meter.record(
+                admin.admin_id, usage['input'], usage['output'], usage['cost'])
+
+            timings["attempts"] = attempt + 1
+            timings["total_ms"] = elapsed_ms(enqueued_at)
+            bot_message = chat_service.add_message(
+                chat.room_id, chat.bot_name, msg, timings=timings)
+            print({
+                'room_id': chat.room_id,
+                'sender': chat.bot_name,
+                'content': msg,
+                'timestamp': bot_message.timestamp.isoformat()
+            })
+
+            started = time.perf_counter()
+            current_app.socketio.emit('new_message', {
+                'room_id': chat.room_id,
+                'sender': chat.bot_name,
+                'content': msg,
+                'timestamp': bot_message.timestamp.isoformat()
+            }, room=chat.room_id)
+            chat_service.set_message_timings(chat.room_id, str(bot_message.id), {
+                "emit_ms": elapsed_ms(started),
+                "total_ms": elapsed_ms(enqueued_at),
+            })
+
+            return  # Success, exit retry loop
+
+        _bot_unavailable(chat_service, chat)
+
     # Start the bot response in a separate thread
     thread = threading.Thread(target=_bot_response_worker)
     thread.daemon = True
@@ -84,11 +132,10 @@ def handle_bot_response(room_id, message, chat, admin, max_retries=3, retry_dela
 @min_bp.before_request
 def before_req():
     path = str(request.path)
-    print(session.items())
-    print(f"Path: {path}")
-    print(f"LastVisit: {session.get('last_visit')}")
     if path.startswith("/min") and (path.split("/")[-1] not in ['auth', 'send_message', 'ping_admin',"send_audio"] and path not in ['/min/', '/min/get-headers'] and "audio_file" not in path):
-        session["last_visit"] = path
+        # Assigning marks the session modified even when the value is the same
+        if session.get("last_visit") != path:
+            session["last_visit"] = path
 
 def login_required(f):
     @wraps(f)
@@ -96,15 +143,24 @@ def login_required(f):
         if 'user_id' not in session:
             return redirect(url_for("min.index"))
 
-        user_service = UserService(current_app.db)
-        user = user_service.get_user_by_id(session['user_id'])
-
-        if not user:
-            return redirect(url_for("min.index"))
+        g.user_claims = user_claims.verify(session)
+        if g.user_claims is None:
+            user = current_user()
+            if not user:
+                user_claims.revoke(session)
+                return redirect(url_for("min.index"))
+            g.user_claims = user_claims.issue(session, user)
         return f(*args, **kwargs)
     return decorated_function
 
 
+def current_user():
+    """The signed-in user's full document, looked up at most once per request"""
+    if "min_user" not in g:
+        g.min_user = current_app.services.user_service.get_user_by_id(session['user_id'])
+    return g.min_user
+
+
 @min_bp.route('/get-headers')
 def headers():
     return render_template('user/min-headers.html')
@@ -125,16 +181,8 @@ def index():
 @min_bp.route('login/<string:subject>', methods=['GET'])
 def login(subject):
     if request.method == "GET":
-        try:
-            ip = request.headers.get("X-Real-IP", request.remote_addr)
-            ip = ip.split(",")[0]
-
-            geo = requests.get(f"http://ipleak.net/json/{ip}", timeout=3)
-            geo = geo.json()
-            country = geo.get("country_name", None)
-        except Exception as e:
-            print(f"Geo lookup error: {e}")
-            country = None
+        ip = request.headers.get("X-Real-IP", request.remote_addr).split(",")[0]
+        _, country = geoip.lookup(ip) or (None, None)
         return render_template('user/min-login.html', default_subject=subject, user_country=country)
 
 
@@ -144,8 +192,6 @@ def onboard():
     session.clear()
     session["admin_id"]= admin_id
     session["last_visit"] ="/min/onboarding"
-    pprint(session.items())
-    print("clearing session")
     return render_template('user/min-onboard.html')
 
 
@@ -170,7 +216,7 @@ def auth_user():
     is_anon = data.get('anonymous')
     
     user_ip = request.headers.get("X-Real-IP", request.remote_addr).split(",")[0]
-    user_service = UserService(current_app.db)
+    user_service = current_app.services.user_service
 
     if is_anon:
         name = generate_random_username()
@@ -187,7 +233,7 @@ def auth_user():
 
     session['user_id'] = user.user_id
     session['role'] = "user"
-    session.modified = True
+    user_claims.issue(session, user)
 
     return redirect(url_for('min.new_chat', subject=subject))
 
@@ -196,15 +242,16 @@ def auth_user():
 @min_bp.route('/newchat/<string:subject>', methods=['GET'])
 @login_required
 def new_chat(subject):
-    user_service = UserService(current_app.db)
-    user = user_service.get_user_by_id(session['user_id'])
-    chat_service = ChatService(current_app.db)
+    user_service = current_app.services.user_service
+    user = current_user()
+    chat_service = current_app.services.chat_service
     
     chat = chat_service.create_chat(
-        user.user_id, subject=subject, admin_id=session.get('admin_id'))
+        user.user_id, subject=subject, admin_id=session.get('admin_id'), username=user.name,
+        user_terms=user_terms(user))
     user_service.add_chat_to_user(user.user_id, chat.chat_id)
 
-    admin = AdminService(current_app.db).get_admin_by_id(session.get('admin_id'))
+    admin = current_app.services.admin_service.get_admin_by_id(session.get('admin_id'))
     current_app.bot.create_chat(chat.room_id, admin)
 
 
@@ -217,11 +264,10 @@ def new_chat(subject):
 @min_bp.route('/chat/<string:room_id>', methods=['GET'])
 @login_required
 def chat(room_id):
-    user_service = UserService(current_app.db)
-    user = user_service.get_user_by_id(session['user_id'])
+    user = g.user_claims
 
-    chat_service = ChatService(current_app.db)
-    chat = chat_service.get_chat_by_room_id(room_id)
+    chat_service = current_app.services.chat_service
+    chat = chat_service.get_chat_by_room_id(room_id, message_limit=None)
     
     if not chat:
         print(f"Chat not found for room_id: {room_id}")
@@ -240,7 +286,7 @@ def chat(room_id):
 @min_bp.route('/chat/<room_id>/ping_admin', methods=['POST'])
 @login_required
 def ping_admin(room_id):
-    admin_service = AdminService(current_app.db)
+    admin_service = current_app.services.admin_service
     current_admin = admin_service.get_admin_by_id(session.get('admin_id'))
 
     if current_admin:
@@ -248,7 +294,7 @@ def ping_admin(room_id):
         timings = settings.get('timings', [])
         timezone = settings.get('timezone', "UTC")
     else:
-        settings = current_app.config.get('SETTINGS', {})
+        settings = current_app.settings_service.current()
         timings = settings.get('timings', [])
         timezone = settings.get('timezone', "UTC")
 
@@ -261,11 +307,11 @@ def ping_admin(room_id):
         for t in timings
     )
 
-    chat_service = ChatService(current_app.db)
-    user_service = UserService(current_app.db)
-    user = user_service.get_user_by_id(session['user_id'])
+    chat_service = current_app.services.chat_service
+    user = current_user()
     
-    chat = chat_service.get_chat_by_room_id(room_id)
+    # The ping email shows the last few messages
+    chat = chat_service.get_chat_by_room_id(room_id, message_limit=5)
 
     if not chat:
         return jsonify({"error": "Chat not found"}), 404
@@ -278,7 +324,7 @@ def ping_admin(room_id):
         'subject': chat.subject
     }, room='admin')
 
-    noti_service = NotificationService(current_app.db)
+    noti_service = current_app.services.notification_service
     noti_service.create_admin_required_notification(
         chat.admin_id, chat.room_id, user.name)
 
@@ -297,7 +343,7 @@ def ping_admin(room_id):
 
 {user.name} has just requested to have a live chat.
 
-{current_app.config['SETTINGS']['backend_url']}/admin/chat/{chat.room_id}
+{current_app.settings_service.current()['backend_url']}/admin/chat/{chat.room_id}
 
 User Information:
     Name: {user.name}
@@ -347,6 +393,7 @@ def receive_audio_blob(room_id):
     print(f"Received audio: {len(audio_bytes)} bytes")
     
     audio_file.seek(0)
+    turn_started = time.perf_counter()
     
     try:
         resp = current_app.bot.transcribe(audio_bytes)
@@ -354,10 +401,9 @@ def receive_audio_blob(room_id):
         print(f"Transcription error: {e}")
         return jsonify({'error': 'Transcription failed'}), 500
 
-    user_service = UserService(current_app.db)
-    user = user_service.get_user_by_id(session['user_id'])
-    chat_service = ChatService(current_app.db)
-    admin_service = AdminService(current_app.db)
+    user = g.user_claims
+    chat_service = current_app.services.chat_service
+    admin_service = current_app.services.admin_service
     admin = admin_service.get_admin_by_id(session.get('admin_id'))
 
     chat = chat_service.get_chat_by_room_id(room_id)
@@ -384,13 +430,19 @@ def receive_audio_blob(room_id):
     
     if not chat.admin_required:
         try:
+            timings = {"queue_wait_ms": 0}
             msg, usage = current_app.bot.respond(
-                f"Subject of chat: {chat.subject}\n{resp}", chat.room_id)
+                f"Subject of chat: {chat.subject}\n{resp}", chat.room_id,
+                timings=timings)
             
+            started = time.perf_counter()
             audio = current_app.bot.generate_audio(msg)
+            timings["tts_ms"] = elapsed_ms(started)
+            timings["total_ms"] = elapsed_ms(turn_started)
 
-            bot_message = chat_service.add_message(chat.room_id, "bot", msg, type="audio")
+            bot_message = chat_service.add_message(chat.room_id, "bot", msg, type="audio", timings=timings)
 
+            started = time.perf_counter()
             current_app.socketio.emit('new_message', {
                 'sender': "bot",
                 'content': msg,
@@ -399,6 +451,10 @@ def receive_audio_blob(room_id):
                 'type': "audio",
                 "id": str(bot_message.id)
             }, room=chat.room_id)
+            chat_service.set_message_timings(chat.room_id, str(bot_message.id), {
+                "emit_ms": elapsed_ms(started),
+                "total_ms": elapsed_ms(turn_started),
+            })
 
             save_path = os.path.join('files', f"{chat.room_id}", f"{bot_message.id}.wav")
             wave_file(save_path, audio)
@@ -431,14 +487,12 @@ def send_message(room_id):
     if not message or not len(message.strip()):
         return "", 204
 
-    user_service = UserService(current_app.db)
-    user = user_service.get_user_by_id(session['user_id'])
-    chat_service = ChatService(current_app.db)
-    admin_service = AdminService(current_app.db)
+    user = g.user_claims
+    chat_service = current_app.services.chat_service
+    admin_service = current_app.services.admin_service
     admin = admin_service.get_admin_by_id(session.get('admin_id'))
 
     chat = chat_service.get_chat_by_room_id(room_id)
-    pprint(user.to_dict())
     
     if not chat:
         return jsonify({"error": "Chat not found"}), 404
@@ -476,7 +530,7 @@ def send_message(room_id):
             # 
             # admin_service.update_tokens(admin.admin_id, usage['cost'])
 
-            # usage_service = UsageService(current_app.db)
+            # usage_service = current_app.services.usage_service
             # usage_service.add_cost(
             #     session.get("admin_id"),
             #     usage['input'], usage['output'], usage['cost']
@@ -503,7 +557,7 @@ def send_message(room_id):
             'timestamp': new_message.timestamp.isoformat(),
         }, room=chat.room_id)
         
-        noti_service = NotificationService(current_app.db)
+        noti_service = current_app.services.notification_service
         noti_service.create_notification(
             chat.admin_id, 
             f'{user.name} sent a message', 
@@ -536,8 +590,7 @@ def register_min_socketio_events(socketio):
         if not room or not user_id:
             return
 
-        user_service = UserService(current_app.db)
-        user = user_service.get_user_by_id(user_id)
+        user = user_claims.verify(session) or current_app.services.user_service.get_user_by_id(user_id)
         if not user:
             return
 
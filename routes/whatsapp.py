@@ -5,9 +5,6 @@ from io import BytesIO
 from pydub import AudioSegment
 from datetime import datetime, timedelta
 
-from services.admin_service import AdminService
-from services.chat_service import ChatService
-from services.whatsapp_service import WhatsappService
 from . import wa_bp
 
 WHATSAPP_TOKEN = os.getenv('WHATSAPP_TOKEN')
@@ -158,7 +155,7 @@ def webhook():
     try:
         data = request.get_json()
         print("Received webhook data:", data)
-        wa_service = WhatsappService(current_app.db)
+        wa_service = current_app.services.whatsapp_service
         
         # Check if this is a message event
         if data.get('object') == 'whatsapp_business_account':
@@ -184,8 +181,8 @@ def webhook():
                             
                             # Get message details
                             from_number = message.get('from')
-                            chat = wa_service.get_by_phone_no(from_number)
-                            admin = AdminService(current_app.db).get_admin_by_id(DEFAULT_ADMIN_ID)
+                            chat = wa_service.exists(from_number)
+                            admin = current_app.services.admin_service.get_admin_by_id(DEFAULT_ADMIN_ID)
                             if not chat:
                                 current_app.bot.create_chat(from_number, admin)
                             
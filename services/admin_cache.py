@@ -0,0 +1,153 @@
+import os
+import copy
+import time
+import uuid
+import threading
+from typing import Any, Dict, Optional
+
+from flask import g, has_app_context
+from pymongo import CursorType
+
+# Seconds a cached admin is trusted without hearing about a change
+ADMIN_CACHE_TTL = float(os.environ.get("ADMIN_CACHE_TTL", 30))
+EVENTS_COLLECTION = "admin_cache_events"
+
+
+class AdminCache:
+    """
+    Process-level cache of admin documents by admin_id and secret key.
+
+    Entries live for `ttl` seconds. Writes through AdminService drop the
+    admin here and publish an event to a small capped collection; every
+    process tails it and drops the same admin, so other workers see the
+    change within about a second instead of after the TTL. Lookups are
+    additionally memoized on flask.g for the rest of the request.
+    """
+
+    def __init__(self, ttl: float = ADMIN_CACHE_TTL):
+        self.ttl = ttl
+        self.origin = str(uuid.uuid4())
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, tuple] = {}
+        self._id_by_key: Dict[str, str] = {}
+        self._listener = None
+        self._evict_listeners = []
+
+    # ---- request memo ----
+
+    @staticmethod
+    def _memo() -> Optional[dict]:
+        if not has_app_context():
+            return None
+        if "_admin_memo" not in g:
+            g._admin_memo = {}
+        return g._admin_memo
+
+    def memo_get(self, field: str, value: Any):
+        memo = self._memo()
+        return memo.get((field, value)) if memo is not None else None
+
+    def memo_put(self, field: str, value: Any, admin):
+        memo = self._memo()
+        if memo is not None:
+            memo[(field, value)] = admin
+
+    # ---- process cache ----
+
+    def get(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        """Copy of the cached admin document, None on a miss or expired entry"""
+        with self._lock:
+            admin_id = value if field == "admin_id" else self._id_by_key.get(value)
+            entry = self._by_id.get(admin_id)
+            if not entry:
+                return None
+            doc, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._drop(admin_id)
+                return None
+        # Callers mutate admin.settings in place, never hand out the cached dict
+        return copy.deepcopy(doc)
+
+    def put(self, doc: Dict[str, Any]):
+        admin_id = doc.get("admin_id")
+        if not admin_id or self.ttl <= 0:
+            return
+        with self._lock:
+            self._drop(admin_id)
+            self._by_id[admin_id] = (copy.deepcopy(doc), time.monotonic())
+            if doc.get("secret_key"):
+                self._id_by_key[doc["secret_key"]] = admin_id
+
+    def _drop(self, admin_id: str):
+        entry = self._by_id.pop(admin_id, None)
+        if entry and entry[0].get("secret_key"):
+            self._id_by_key.pop(entry[0]["secret_key"], None)
+
+    def add_evict_listener(self, callback):
+        """Call `callback(admin_id)` whenever an admin (None: every admin) is evicted"""
+        self._evict_listeners.append(callback)
+
+    def evict(self, admin_id: Optional[str] = None):
+        """Drop one admin, or everything when admin_id is None, from this process"""
+        with self._lock:
+            if admin_id is None:
+                self._by_id.clear()
+                self._id_by_key.clear()
+            else:
+                self._drop(admin_id)
+        if has_app_context():
+            g.pop("_admin_memo", None)
+        for callback in self._evict_listeners:
+            callback(admin_id)
+
+    # ---- cross-process invalidation ----
+
+    def invalidate(self, db, *admin_ids: str):
+        """Evict the given admins (all when none are given) here and in the other processes"""
+        for admin_id in admin_ids or (None,):
+            self.evict(admin_id)
+        try:
+            db[EVENTS_COLLECTION].insert_one({"admin_ids": list(admin_ids) or None, "origin": self.origin})
+        except Exception as e:
+            print(f"Admin cache invalidation broadcast failed: {e}")
+
+    def listen(self, db):
+        """Start tailing invalidation events from other processes (once per process)"""
+        if self._listener or self.ttl <= 0:
+            return
+        try:
+            db.create_collection(EVENTS_COLLECTION, capped=True, size=1024 * 1024, max=10000)
+        except Exception:
+            pass  # Already exists
+        self._listener = threading.Thread(
+            target=self._listen, args=(db[EVENTS_COLLECTION],), name="admin-cache-events", daemon=True)
+        self._listener.start()
+
+    def _listen(self, events):
+        last_id = None
+        try:
+            # Only events from now on, older ones are covered by the TTL
+            last = events.find_one(sort=[("$natural", -1)])
+            last_id = last["_id"] if last else None
+        except Exception:
+            pass
+        while True:
+            try:
+                query = {"_id": {"$gt": last_id}} if last_id else {}
+                cursor = events.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    for event in cursor:
+                        last_id = event["_id"]
+                        if event.get("origin") != self.origin:
+                            for admin_id in event.get("admin_ids") or (None,):
+                                self.evict(admin_id)
+                    time.sleep(0.1)
+            except Exception as e:
+                print(f"Admin cache event stream failed, resubscribing: {e}")
+                # Events may have been missed while disconnected
+                self.evict()
+                time.sleep(5)
+            time.sleep(1)
+
+
+admin_cache = AdminCache()
@@ -4,12 +4,47 @@ import random
 import string
 from models.admin import Admin
 from datetime import datetime, timedelta
+from services.admin_cache import admin_cache
+
+
+class _InvalidatingCollection:
+    """
+    The admins collection, dropping cached admins on every write.
+
+    Routes write through `admin_service.admins_collection` directly, so the
+    cache is invalidated here rather than in each AdminService method.
+    """
+
+    WRITES = {"update_one", "update_many", "replace_one", "delete_one", "delete_many",
+              "find_one_and_update", "find_one_and_replace", "find_one_and_delete"}
+
+    def __init__(self, collection, db):
+        self._collection = collection
+        self._db = db
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in self.WRITES:
+            return attr
+
+        def write(filter, *args, **kwargs):
+            try:
+                return attr(filter, *args, **kwargs)
+            finally:
+                admin_id = filter.get("admin_id") if isinstance(filter, dict) else None
+                if isinstance(admin_id, str):
+                    admin_cache.invalidate(self._db, admin_id)
+                else:
+                    # Not addressed by a plain admin_id, so it may have touched any admin
+                    admin_cache.invalidate(self._db)
+
+        return write
 
 
 class AdminService:
     def __init__(self, db):
         self.db = db
-        self.admins_collection = db.admins
+        self.admins_collection = _InvalidatingCollection(db.admins, db)
         self.two_fa_collection = db.two_fa_tokens
         self.trusted_ips_collection = db.trusted_ips
 
@@ -60,11 +95,32 @@ class AdminService:
             return admin["expo_token"]
         return []
 
+    def _get_cached(self, field, value):
+        """
+        Admin whose `field` equals `value`: memoized for the request, then from
+        the process cache, then one find_one.
+        """
+        admin = admin_cache.memo_get(field, value)
+        if admin:
+            return admin
+        admin_data = admin_cache.get(field, value)
+        if admin_data is None:
+            admin_data = self.admins_collection.find_one({field: value})
+            if admin_data:
+                admin_cache.put(admin_data)
+        admin = Admin.from_dict(admin_data) if admin_data else None
+        if admin:
+            admin_cache.memo_put(field, value, admin)
+        return admin
+
+    def invalidate_cache(self, *admin_ids):
+        """Drop cached copies of the given admins (all when none are given) in every process"""
+        admin_cache.invalidate(self.db, *admin_ids)
+
     def get_admin_by_key(self, key):
-        admin_data = self.admins_collection.find_one({"secret_key": key})
-        if admin_data:
-            return Admin.from_dict(admin_data)
-        return None
+        if not key:
+            return None
+        return self._get_cached("secret_key", key)
 
     def update_tokens(self, admin_id, cost):
         self.admins_collection.update_one(
@@ -81,10 +137,9 @@ class AdminService:
 
     def get_admin_by_id(self, admin_id):
         """Get admin by ID"""
-        admin_data = self.admins_collection.find_one({"admin_id": admin_id})
-        if admin_data:
-            return Admin.from_dict(admin_data)
-        return None
+        if not admin_id:
+            return None
+        return self._get_cached("admin_id", admin_id)
 
     def authenticate_admin(self, username, password):
         """Authenticate admin credentials"""
@@ -97,7 +152,7 @@ class AdminService:
         return None
 
     def get_admin_from_sec(self, secrect_key):
-        return Admin.from_dict(self.admins_collection.find_one({'secret_key': secrect_key}))
+        return self.get_admin_by_key(secrect_key)
 
     def get_all_admins(self):
         """Get all admins"""
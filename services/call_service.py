@@ -1,9 +1,31 @@
 import uuid
 import os
+import time
+import threading
 from datetime import datetime
 from typing import TypedDict, Literal, Optional
 from pymongo.collection import Collection
 from bson import ObjectId
+from services.pagination import after_cursor, next_cursor
+
+CALL_PAGE_SIZE = 20
+MAX_CALL_PAGE_SIZE = 100
+TRANSCRIPT_PAGE_SIZE = 200
+CALL_STATUSES = ("ongoing", "ended", "in_progress")
+# Seconds the per-status call counts are reused
+CALL_COUNTS_TTL = float(os.environ.get("CALL_COUNTS_TTL", 10))
+
+# Everything the call list shows; the transcription is replaced by its length
+LIST_PROJECTION = {
+    "_id": 0,
+    "call_id": 1,
+    "status": 1,
+    "started_at": 1,
+    "ended_at": 1,
+    "audio": 1,
+    "userdata": 1,
+    "transcription_count": {"$size": {"$ifNull": ["$transcription", []]}},
+}
 
 class CallTranscription(TypedDict):
     speaker: str
@@ -22,7 +44,17 @@ class CallService:
     def __init__(self, db):
         self.db = db
         self.call_collection: Collection[Call] = db.calls
-    
+
+    # Counts are shared by every request in the process
+    _counts_lock = threading.Lock()
+    _counts = None
+    _counts_at = 0.0
+
+    @classmethod
+    def _drop_counts(cls):
+        with cls._counts_lock:
+            cls._counts = None
+
     def create_call(self, call_id, data):
         """Create a new call record."""
         # Ensure datetime objects are used
@@ -43,6 +75,7 @@ class CallService:
         }
         
         self.call_collection.insert_one(call_doc)
+        self._drop_counts()
     
     def add_chunk(self, call_id, data):
         """Add transcription chunks to a call."""
@@ -70,14 +103,29 @@ class CallService:
                 }
             }
         )
+        self._drop_counts()
 
         return result.modified_count > 0
 
+    @staticmethod
+    def _parse_dates(call):
+        if isinstance(call.get('started_at'), str):
+            call['started_at'] = datetime.fromisoformat(call['started_at'].replace('Z', '+00:00'))
+        if call.get('ended_at') and isinstance(call['ended_at'], str):
+            call['ended_at'] = datetime.fromisoformat(call['ended_at'].replace('Z', '+00:00'))
+        return call
+
+    def list_calls(self, status=None, cursor=None, limit=CALL_PAGE_SIZE):
+        """(calls, next_cursor): a page of calls, newest first, without transcriptions"""
+        limit = max(1, min(limit, MAX_CALL_PAGE_SIZE))
+        calls = self.get_calls_with_limited_data(limit=limit, filter_type=status or 'all', cursor=cursor)
+        return calls, next_cursor(calls, limit, "started_at", "call_id")
     
-    def get_calls_with_limited_data(self, admin_id=None, limit=20, skip=0, filter_type='all'):
+    def get_calls_with_limited_data(self, admin_id=None, limit=20, skip=0, filter_type='all', cursor=None):
         """
         Get calls with only the data needed for list display.
         Excludes heavy transcription field.
+        Pass the previous page's next_cursor(calls, limit, "started_at", "call_id") as `cursor`.
         """
         query = {}
         
@@ -89,68 +137,78 @@ class CallService:
         elif filter_type == 'in_progress':
             query['status'] = 'in_progress'
         
-        # Projection - only fetch fields needed for list view
-        projection = {
-            # 'call_id': 1,
-            # 'status': 1,
-            # 'started_at': 1,
-            # 'ended_at': 1,
-            # 'audio': 1,
-            # 'userdata': 1,
-            # Exclude heavy transcription field
-            'transcription': 0,
-            '_id': 0  # Exclude MongoDB's _id field
-        }
-        
+        # Only the fields the list shows, the transcription can be huge
         calls = list(
-            self.call_collection.find(query, projection)
-            .sort("started_at", -1)
-            .skip(skip)
+            self.call_collection.find(after_cursor(query, "started_at", "call_id", cursor), LIST_PROJECTION)
+            .sort([("started_at", -1), ("call_id", -1)])
+            .skip(0 if cursor else skip)
             .limit(limit)
         )
         
-        # MongoDB returns datetime objects by default - no conversion needed!
-        # Just verify they are datetime objects
-        for call in calls:
-            # Convert started_at to datetime if it's a string
-            if isinstance(call['started_at'], str):
-                call['started_at'] = datetime.fromisoformat(call['started_at'].replace('Z', '+00:00'))
-            
-            # Convert ended_at to datetime if it exists and is a string
-            if call.get('ended_at') and isinstance(call['ended_at'], str):
-                call['ended_at'] = datetime.fromisoformat(call['ended_at'].replace('Z', '+00:00'))
-        
-        
-        return calls
+        return [self._parse_dates(call) for call in calls]
     
     def get_call_counts_by_filter(self, admin_id=None):
-        """Get counts for all call filters."""
-        base_query = {}
-        
-        return {
-            'all': self.call_collection.count_documents(base_query),
-            'ongoing': self.call_collection.count_documents({**base_query, 'status': 'ongoing'}),
-            'ended': self.call_collection.count_documents({**base_query, 'status': 'ended'}),
-            'in_progress': self.call_collection.count_documents({**base_query, 'status': 'in_progress'}),
-        }
+        """Get counts for all call filters, one $group reused for CALL_COUNTS_TTL seconds."""
+        with self._counts_lock:
+            if self._counts is not None and time.monotonic() - self._counts_at < CALL_COUNTS_TTL:
+                return dict(self._counts)
+
+        counts = {status: 0 for status in CALL_STATUSES}
+        counts['all'] = 0
+        for group in self.call_collection.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]):
+            if group["_id"] in counts:
+                counts[group["_id"]] = group["count"]
+            counts['all'] += group["count"]
+
+        with self._counts_lock:
+            CallService._counts, CallService._counts_at = counts, time.monotonic()
+        return dict(counts)
     
+    def get_call(self, call_id, transcript_limit=TRANSCRIPT_PAGE_SIZE):
+        """Call details with its transcription_count and only the first `transcript_limit` entries."""
+        calls = list(self.call_collection.aggregate([
+            {"$match": {"call_id": call_id}},
+            {"$limit": 1},
+            {"$project": {**LIST_PROJECTION, "transcription": {
+                "$slice": [{"$ifNull": ["$transcription", []]}, transcript_limit]}}},
+        ]))
+        return self._parse_dates(calls[0]) if calls else None
+
     def get_full_call(self, call_id):
-        """Get complete call data including transcription for detail view."""
-        call = self.call_collection.find_one({"call_id": call_id}, {"_id": 0})
-        
-        # MongoDB returns datetime objects natively - no conversion needed
-        # Verify they are datetime objects
-        if call:
-            if isinstance(call['started_at'], str):
-                call['started_at'] = datetime.fromisoformat(call['started_at'].replace('Z', '+00:00'))
-            
-            # Convert ended_at to datetime if it exists and is a string
-            if call.get('ended_at') and isinstance(call['ended_at'], str):
-                call['ended_at'] = datetime.fromisoformat(call['ended_at'].replace('Z', '+00:00'))
-        
-        return call
+        """Get call data for the detail view; long transcriptions are paged, see get_transcript_page."""
+        return self.get_call(call_id)
+
+    def get_transcript_page(self, call_id, offset=0, limit=TRANSCRIPT_PAGE_SIZE):
+        """(entries, total) for transcription entries [offset, offset + limit), None for an unknown call"""
+        pages = list(self.call_collection.aggregate([
+            {"$match": {"call_id": call_id}},
+            {"$limit": 1},
+            {"$project": {
+                "_id": 0,
+                "total": {"$size": {"$ifNull": ["$transcription", []]}},
+                "entries": {"$slice": [{"$ifNull": ["$transcription", []]}, offset, limit]},
+            }},
+        ]))
+        if not pages:
+            return None
+        return pages[0]["entries"], pages[0]["total"]
+
+    def iter_transcript(self, call_id, chunk_size=TRANSCRIPT_PAGE_SIZE):
+        """Every transcription entry in order, fetched a chunk at a time"""
+        offset = 0
+        while True:
+            page = self.get_transcript_page(call_id, offset, chunk_size)
+            if not page or not page[0]:
+                return
+            yield from page[0]
+            offset += len(page[0])
+            if offset >= page[1]:
+                return
     
     def delete_call(self, call_id):
         """Delete a call record."""
         result = self.call_collection.delete_one({"call_id": call_id})
+        self._drop_counts()
         return result.deleted_count > 0
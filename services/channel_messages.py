@@ -0,0 +1,153 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.pagination import after_cursor, next_cursor
+
+# Messages kept embedded on each thread document for the chat area and list preview
+RECENT_MESSAGES = 50
+CHANNEL_PAGE_SIZE = 30
+
+
+class ChannelMessages:
+    """
+    Message storage shared by the WhatsApp and Messenger services.
+
+    Every message is a document in its own collection, keyed by thread
+    (phone number or sender id) and time. The thread document keeps a
+    running `message_count` and only the last RECENT_MESSAGES in its
+    `messages` array, read with $slice/$elemMatch projections, so neither
+    the webhooks nor the dashboards scale with a thread's lifetime length.
+
+    Threads created before the message collection have no `message_count`
+    and keep their full array until migrate_channel_messages.py moves it.
+    """
+
+    def __init__(self, threads, messages, thread_field: str):
+        self.threads = threads
+        self.messages = messages
+        self.thread_field = thread_field
+
+    def exists(self, thread_id: str) -> bool:
+        return self.threads.find_one({self.thread_field: thread_id}, {"_id": 1}) is not None
+
+    def add(self, thread_id: str, message_doc: Dict[str, Any]) -> bool:
+        """Store a message and push it onto the thread's window; False when the thread does not exist"""
+        push = {"$push": {"messages": {"$each": [message_doc], "$slice": -RECENT_MESSAGES}},
+                "$inc": {"message_count": 1},
+                "$set": {"updated_at": message_doc["time"]}}
+        result = self.threads.update_one(
+            {self.thread_field: thread_id, "message_count": {"$exists": True}}, push)
+        if not result.matched_count:
+            # Unmigrated thread: never trim history that only lives in the array
+            result = self.threads.update_one(
+                {self.thread_field: thread_id},
+                {"$push": {"messages": message_doc}, "$set": {"updated_at": message_doc["time"]}})
+            if not result.matched_count:
+                return False
+        self.messages.insert_one({**message_doc, "thread": thread_id})
+        return True
+
+    def thread(self, thread_id: str, message_limit: int = RECENT_MESSAGES) -> Optional[Dict[str, Any]]:
+        """The thread with only its last `message_limit` messages"""
+        projection = {"_id": 0, "messages": {"$slice": -message_limit} if message_limit > 0 else 0}
+        return self.threads.find_one({self.thread_field: thread_id}, projection)
+
+    def window(self, thread_id: str, limit: int = RECENT_MESSAGES,
+               before: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Up to `limit` messages, oldest first, ending with the newest one (or the last one before `before`)"""
+        if before is None and limit <= RECENT_MESSAGES:
+            thread = self.thread(thread_id, limit)
+            return thread.get("messages", []) if thread else []
+        if not self.migrated(thread_id):
+            return self._embedded_window(thread_id, limit, before)
+        query = {"thread": thread_id}
+        if before is not None:
+            query["time"] = {"$lt": before}
+        messages = list(self.messages.find(query, {"_id": 0, "thread": 0})
+                        .sort("time", -1).limit(limit))
+        messages.reverse()
+        return messages
+
+    def migrated(self, thread_id: str) -> bool:
+        """False for threads whose history still lives only in their embedded array"""
+        return self.threads.find_one(
+            {self.thread_field: thread_id, "message_count": {"$exists": True}}, {"_id": 1}) is not None
+
+    def _embedded_window(self, thread_id: str, limit: int,
+                         before: Optional[datetime]) -> List[Dict[str, Any]]:
+        messages = {"$ifNull": ["$messages", []]}
+        if before is not None:
+            messages = {"$filter": {"input": messages, "cond": {"$lt": ["$$this.time", before]}}}
+        thread = next(self.threads.aggregate([
+            {"$match": {self.thread_field: thread_id}},
+            {"$project": {"_id": 0, "messages": {"$slice": [messages, -limit]}}},
+        ]), None)
+        return thread["messages"] if thread else []
+
+    def find(self, thread_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+        message = self.messages.find_one({"thread": thread_id, "id": message_id}, {"_id": 0, "thread": 0})
+        if message:
+            return message
+        thread = self.threads.find_one(
+            {self.thread_field: thread_id},
+            {"_id": 0, "messages": {"$elemMatch": {"id": message_id}}})
+        return (thread or {}).get("messages", [None])[0]
+
+    def list_threads(self, cursor: Optional[str] = None,
+                     page_size: int = CHANNEL_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of threads, most recently active first, each with only its last message"""
+        query = after_cursor({}, "updated_at", self.thread_field, cursor)
+        threads = list(
+            self.threads.find(query, {"_id": 0, "messages": {"$slice": -1}})
+            .sort([("updated_at", -1), (self.thread_field, -1)])
+            .limit(page_size)
+        )
+        return threads, next_cursor(threads, page_size, "updated_at", self.thread_field)
+
+    def delete(self, thread_id: str) -> bool:
+        result = self.threads.delete_one({self.thread_field: thread_id})
+        self.messages.delete_many({"thread": thread_id})
+        return result.deleted_count > 0
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Message count and timestamps of every thread, without any messages"""
+        return list(self.threads.aggregate([
+            {"$project": {
+                "_id": 0,
+                self.thread_field: 1,
+                "message_count": {"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]},
+                "created_at": 1,
+                "updated_at": 1,
+                "admin_enabled": 1,
+            }}
+        ]))
+
+    def statistics(self, thread_id: str) -> Dict[str, Any]:
+        """Message counts by sender and type, and the first and last message times"""
+        group = {"$group": {
+            "_id": {"sender": "$sender", "type": "$type"},
+            "count": {"$sum": 1},
+            "first": {"$min": "$time"},
+            "last": {"$max": "$time"},
+        }}
+        if self.migrated(thread_id):
+            facets = list(self.messages.aggregate([{"$match": {"thread": thread_id}}, group]))
+        else:
+            # Unmigrated: the full history is the embedded array
+            facets = list(self.threads.aggregate([
+                {"$match": {self.thread_field: thread_id}},
+                {"$unwind": "$messages"},
+                {"$replaceRoot": {"newRoot": "$messages"}},
+                group,
+            ]))
+        stats = {"total": 0, "by_sender": {}, "by_type": {}, "first_message": None, "last_message": None}
+        for facet in facets:
+            sender, kind, count = facet["_id"].get("sender"), facet["_id"].get("type"), facet["count"]
+            stats["total"] += count
+            stats["by_sender"][sender] = stats["by_sender"].get(sender, 0) + count
+            stats["by_type"][kind] = stats["by_type"].get(kind, 0) + count
+            if stats["first_message"] is None or facet["first"] < stats["first_message"]:
+                stats["first_message"] = facet["first"]
+            if stats["last_message"] is None or facet["last"] > stats["last_message"]:
+                stats["last_message"] = facet["last"]
+        return stats
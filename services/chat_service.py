@@ -1,7 +1,13 @@
 import logging
 import uuid
-from models.chat import Chat, Message
+from models.chat import Chat, ChatSummary, Message
+from services.search_service import tokenize
+from services.rollup_service import ChatRollupService
+from services.pagination import after_cursor
 import os
+import time
+import threading
+from pymongo import ReturnDocument, ReplaceOne
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from concurrent.futures import ThreadPoolExecutor
@@ -9,84 +15,198 @@ from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# Messages per chat_messages document. A message with seq n lives in bucket (n - 1) // BUCKET_SIZE.
+BUCKET_SIZE = 100
+
+# Messages shown when a chat is opened, older ones are paged in on demand
+MESSAGE_PAGE_SIZE = 50
+
+# Chats with at least a user message besides the bot greeting. Chats not yet
+# moved to chat_messages have no message_count but still hold their array.
+# Wrapped in $and so it can be spread into filters that have their own $or.
+HAS_REPLIES = {"$and": [{"$or": [{"message_count": {"$gte": 2}}, {"messages.1": {"$exists": True}}]}]}
+
+# Header filter counts: served from memory this long, rebuilt by aggregation this often
+COUNTS_CACHE_TTL = 5
+COUNTS_RECONCILE_INTERVAL = 3600
+
+# Fields needed to tell which filter counts a chat contributes to. Two
+# embedded messages are enough to tell whether an unmigrated chat has replies.
+COUNTED_FIELDS = {"_id": 0, "admin_id": 1, "subject": 1, "message_count": 1,
+                  "messages": {"$slice": 2}, "archived": 1, "exported": 1, "admin_required": 1}
+
+_counts_cache = {}
+_counts_cache_lock = threading.Lock()
+
+
+def _has_replies(chat: Dict[str, Any]) -> bool:
+    """HAS_REPLIES for a loaded chat"""
+    return (chat.get("message_count") or 0) >= 2 or len(chat.get("messages") or []) >= 2
+
+
+def count_contribution(chat: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """What a chat adds to each get_chat_counts_by_filter count"""
+    if not chat or chat.get("subject") == "Job" or not _has_replies(chat):
+        return {"all": 0, "active": 0, "exported": 0, "archived": 0}
+    archived = bool(chat.get("archived"))
+    return {
+        "all": int(not archived),
+        "active": int(not archived and bool(chat.get("admin_required"))),
+        "exported": int(bool(chat.get("exported"))),
+        "archived": int(archived),
+    }
+
 
 class ChatService:
     def __init__(self, db):
         self.db = db
         self.chats_collection = db.chats
-        self._ensure_indexes()
-
-    def _ensure_indexes(self):
-        """Ensure proper database indexes for performance."""
-        try:
-            # Create compound indexes for common queries
-            self.chats_collection.create_index([
-                ("admin_id", 1),
-                ("updated_at", -1)
-            ])
-
-            # Index for filtering
-            self.chats_collection.create_index([
-                ("admin_id", 1),
-                ("admin_required", 1),
-                ("updated_at", -1)
-            ])
-
-            self.chats_collection.create_index([
-                ("admin_id", 1),
-                ("exported", 1),
-                ("updated_at", -1)
-            ])
-
-            # Index for message existence check
-            self.chats_collection.create_index([
-                ("admin_id", 1),
-                ("subject", 1),
-                ("messages.1", 1),
-                ("updated_at", -1)
-            ])
-
-            # Basic indexes
-            self.chats_collection.create_index("chat_id")
-            self.chats_collection.create_index("room_id")
-            self.chats_collection.create_index("user_id")
-
-        except Exception as e:
-            logger.warning(f"Index creation failed: {e}")
+        self.messages_collection = db.chat_messages
+        self.counters_collection = db.chat_counters
+        self.rollups = ChatRollupService(db)
 
-    def create_chat(self, user_id: str, subject: str, admin_id: str) -> Chat:
+    def create_chat(self, user_id: str, subject: str, admin_id: str, username: Optional[str] = None,
+                    user_terms: Optional[List[str]] = None) -> Chat:
         """Create a new chat with optimized initial message."""
         chat_id = str(uuid.uuid4())
 
         # Create initial messages using the Message model
-        initial_messages = [Message("bot", "How may I help you")]
+        greeting = Message("bot", "How may I help you", seq=1)
 
         # Create the chat object using the Chat model
         chat = Chat(
             chat_id=chat_id,
             user_id=user_id,
             admin_id=admin_id,
-            messages=initial_messages,
+            messages=[greeting],
             subject=subject,
+            username=username,
         )
 
-        # Insert the chat document
-        self.chats_collection.insert_one(chat.to_dict())
+        # Metadata and the first bucket are stored separately
+        chat_doc = chat.to_dict()
+        del chat_doc["messages"]
+        # Search index, see SearchService
+        chat_doc["user_terms"] = user_terms or []
+        chat_doc["search_terms"] = tokenize(greeting.content, *chat_doc["user_terms"])
+        self.chats_collection.insert_one(chat_doc)
+        self.messages_collection.insert_one(
+            self._bucket_doc(chat.room_id, admin_id, 0, [greeting.to_dict()]))
+        self.rollups.record_chat_created(admin_id, chat.created_at)
+        return chat
+
+    @staticmethod
+    def _bucket_doc(room_id: str, admin_id: Optional[str], bucket: int, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        timestamps = [m["timestamp"] for m in messages if m.get("timestamp")]
+        return {
+            "room_id": room_id,
+            "admin_id": admin_id,
+            "bucket": bucket,
+            "count": len(messages),
+            "start": min(timestamps) if timestamps else None,
+            "end": max(timestamps) if timestamps else None,
+            "messages": messages,
+        }
+
+    def _load_chat(self, chat_data: Optional[Dict[str, Any]], message_limit: Optional[int]) -> Optional[Chat]:
+        """Build a Chat, attaching the last `message_limit` messages (None for all)."""
+        if not chat_data:
+            return None
+        legacy = "messages" in chat_data
+        chat = Chat.from_dict(chat_data)
+        if message_limit and not legacy:
+            chat.messages = self.get_messages(chat.room_id, limit=message_limit)
+        elif message_limit is None and not legacy:
+            chat.messages = self.get_messages(chat.room_id, limit=None)
         return chat
 
+    @staticmethod
+    def _chat_projection(message_limit: Optional[int]) -> Dict[str, Any]:
+        # Only unmigrated chats still embed messages; never pull more of them than needed
+        if message_limit is None:
+            return {"_id": 0, "search_terms": 0, "user_terms": 0}
+        return {"_id": 0, "search_terms": 0, "user_terms": 0, "messages": {"$slice": -max(message_limit, 1)}}
+
+    def get_messages(self, room_id: str, limit: Optional[int] = MESSAGE_PAGE_SIZE, before: Optional[int] = None) -> List[Message]:
+        """
+        Messages of a chat in order, newest `limit` of those with seq < `before`.
+
+        Reads only the buckets needed for the page, newest first.
+        """
+        query = {"room_id": room_id}
+        if before is not None:
+            query["bucket"] = {"$lte": (before - 2) // BUCKET_SIZE}
+        cursor = self.messages_collection.find(
+            query, {"_id": 0, "messages": 1}).sort("bucket", -1)
+        if limit:
+            cursor = cursor.limit(limit // BUCKET_SIZE + 2)
+
+        page = []
+        for bucket in cursor:
+            messages = bucket.get("messages", [])
+            if before is not None:
+                messages = [m for m in messages if m.get("seq", 0) < before]
+            page.extend(messages)
+            if limit and len(page) >= limit:
+                break
+
+        page.sort(key=lambda m: m.get("seq", 0))
+        if limit:
+            page = page[-limit:]
+        return [Message.from_dict(m) for m in page]
+
+    def migrate_chat(self, chat_data: Dict[str, Any]) -> bool:
+        """
+        Move a chat's embedded `messages` array into chat_messages buckets.
+
+        Safe to re-run: buckets are replaced by (room_id, bucket) and the chat is
+        only updated if its array has not changed since it was read.
+        """
+        room_id = chat_data["room_id"]
+        messages = []
+        for seq, message in enumerate(chat_data.get("messages") or [], start=1):
+            message = dict(message)
+            message["seq"] = seq
+            message.setdefault("id", str(uuid.uuid4()))
+            messages.append(message)
+
+        operations = [
+            ReplaceOne(
+                {"room_id": room_id, "bucket": bucket},
+                self._bucket_doc(room_id, chat_data.get("admin_id"), bucket,
+                                 messages[bucket * BUCKET_SIZE:(bucket + 1) * BUCKET_SIZE]),
+                upsert=True
+            )
+            for bucket in range((len(messages) + BUCKET_SIZE - 1) // BUCKET_SIZE)
+        ]
+        if operations:
+            self.messages_collection.bulk_write(operations, ordered=False)
+
+        result = self.chats_collection.update_one(
+            {"room_id": room_id, "messages": {"$size": len(messages)}},
+            {
+                "$set": {
+                    "message_count": len(messages),
+                    "last_message": messages[-1] if messages else None
+                },
+                "$unset": {"messages": ""}
+            }
+        )
+        return result.modified_count > 0
+
     def count_chats(self, room_id: Optional[str] = None) -> int:
         """Count chats with optional room_id filter."""
         filter_query = {"room_id": room_id} if room_id else {}
         return self.chats_collection.count_documents(filter_query)
 
     # @lru_cache(maxsize=128)
-    def get_chat_by_id(self, chat_id: str,user_id:str) -> Optional[Chat]:
-        """Get chat by ID with caching."""
+    def get_chat_by_id(self, chat_id: str,user_id:str, message_limit: Optional[int] = 0) -> Optional[Chat]:
+        """Get chat by ID, with the last `message_limit` messages (None for all)."""
         chat_data = self.chats_collection.find_one(
                 {"chat_id": chat_id,"user_id":user_id},
-            {"_id": 0}  # Exclude MongoDB's _id field
+            self._chat_projection(message_limit)
         )
-        return Chat.from_dict(chat_data) if chat_data else None
+        return self._load_chat(chat_data, message_limit)
 
     def delete_chats_batch(self, room_ids: List[str]) -> int:
         """Optimized batch deletion with parallel file removal."""
@@ -94,9 +214,17 @@ class ChatService:
             return 0
 
         # Delete from database first
+        deleted = list(self.chats_collection.find(
+            {"room_id": {"$in": room_ids}},
+            {**COUNTED_FIELDS, "created_at": 1}
+        ))
         result = self.chats_collection.delete_many(
             {"room_id": {"$in": room_ids}})
         deleted_count = result.deleted_count
+        self.rollups.record_chats_deleted(deleted)
+        for chat in deleted:
+            self._update_counts(chat, None)
+        self.messages_collection.delete_many({"room_id": {"$in": room_ids}})
 
         # Remove files in parallel
         self._remove_chat_files_parallel(room_ids)
@@ -123,32 +251,46 @@ class ChatService:
         return self.delete_chats_batch(room_ids)
 
     # @lru_cache(maxsize=128)
-    def get_chat_by_room_id(self, room_id: str) -> Optional[Chat]:
-        """Get chat by room ID with caching."""
+    def get_chat_by_room_id(self, room_id: str, message_limit: Optional[int] = 0) -> Optional[Chat]:
+        """
+        Get chat by room ID.
+
+        By default only metadata is read and `chat.messages` holds just the last
+        message. Pass `message_limit` to load that many recent messages, or None
+        for the whole history.
+        """
         chat_data = self.chats_collection.find_one(
             {"room_id": room_id},
-            {"_id": 0}
+            self._chat_projection(message_limit)
         )
-        return Chat.from_dict(chat_data) if chat_data else None
+        return self._load_chat(chat_data, message_limit)
 
     def archive_chat(self, room_id: str) -> bool:
-        """Export chat with optimized existence check."""
-        result = self.chats_collection.update_one(
+        """Archive chat; True if the chat exists, so callers need no lookup first."""
+        before = self.chats_collection.find_one_and_update(
             {"room_id": room_id},
-            {"$set": {"archived": True}}
+            {"$set": {"archived": True}},
+            projection=COUNTED_FIELDS
         )
-        return result.modified_count > 0
+        if before is None:
+            return False
+        self._update_counts(before, {**before, "archived": True})
+        return True
 
     def export_chat(self, room_id: str, lead_id: str) -> bool:
-        """Export chat with optimized existence check."""
-        result = self.chats_collection.update_one(
+        """Mark chat exported; True if the chat exists (re-exports included)."""
+        before = self.chats_collection.find_one_and_update(
             {"room_id": room_id},
-            {"$set": {"exported": True, "lead_id": lead_id}}
+            {"$set": {"exported": True, "lead_id": lead_id}},
+            projection=COUNTED_FIELDS
         )
-        return result.modified_count > 0
+        if before is None:
+            return False
+        self._update_counts(before, {**before, "exported": True})
+        return True
 
-    def get_chats_with_full_messages(self, admin_id: Optional[str] = None, limit: int = 100, skip: int = 0) -> List[Chat]:
-        """Get chats with all messages - use only when needed."""
+    def get_chats_with_full_messages(self, admin_id: Optional[str] = None, limit: int = 100, skip: int = 0) -> List[ChatSummary]:
+        """Get chat metadata for stats; messages are read separately via get_messages."""
         match_stage = {"$match": {"admin_id": admin_id}
                        } if admin_id else {"$match": {}}
 
@@ -162,32 +304,70 @@ class ChatService:
             {"$sort": {"sort_date": -1}},
             {"$skip": skip},
             {"$limit": limit},
-            # Remove _id and temporary sort_date field
-            {"$project": {"_id": 0, "sort_date": 0}}
+            {"$project": ChatSummary.projection(aggregate=True)}
         ]
 
         cursor = self.chats_collection.aggregate(pipeline)
-        return [Chat.from_dict(chat_data) for chat_data in cursor]
+        return [ChatSummary.from_dict(chat_data) for chat_data in cursor]
 
-    def add_message(self, room_id: str, sender: str, content: str,type:str="text") -> Optional[Message]:
-        """Add message with optimized update operation."""
-        chat = self.get_chat_by_room_id(room_id)
-        if not chat:
-            return None
+    def add_message(self, room_id: str, sender: str, content: str,type:str="text", timings: Optional[Dict[str, Any]] = None) -> Optional[Message]:
+        """
+        Append a message to its chat_messages bucket.
 
-        message = Message(sender, content,type)
+        Bumping the chat's message_count both checks the chat exists and
+        assigns the message's seq, so no read is needed first.
+        """
+        message = Message(sender, content,type, timings=timings)
 
-        result = self.chats_collection.update_one(
-            {"room_id": room_id},
+        chat_data = self.chats_collection.find_one_and_update(
+            {"room_id": room_id, "messages": {"$exists": False}},
+            {
+                "$inc": {"message_count": 1},
+                "$set": {
+                    "updated_at": message.timestamp,
+                    "viewed": False,
+                    "last_message": message.to_dict()
+                },
+                "$addToSet": {"search_terms": {"$each": tokenize(content) if isinstance(content, str) else []}}
+            },
+            projection=COUNTED_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+
+        if not chat_data:
+            # Chats created before chat_messages are migrated on their first new message
+            legacy = self.chats_collection.find_one(
+                {"room_id": room_id, "messages": {"$exists": True}},
+                {"_id": 0, "room_id": 1, "admin_id": 1, "messages": 1}
+            )
+            if not legacy or not self.migrate_chat(legacy):
+                return None
+            return self.add_message(room_id, sender, content, type, timings)
+
+        message.seq = chat_data["message_count"]
+        if message.seq == 2:
+            # First reply: the chat starts showing up in the list filters
+            self._update_counts({**chat_data, "message_count": 1}, chat_data)
+        self.messages_collection.update_one(
+            {"room_id": room_id, "bucket": (message.seq - 1) // BUCKET_SIZE},
             {
                 "$push": {"messages": message.to_dict()},
-                "$set": {"updated_at": message.timestamp, "viewed": False}
-            }
+                "$inc": {"count": 1},
+                "$min": {"start": message.timestamp},
+                "$max": {"end": message.timestamp},
+                "$setOnInsert": {"admin_id": chat_data.get("admin_id")}
+            },
+            upsert=True
         )
+        return message
 
-        if result.modified_count > 0:
-            return message
-        return None
+    def set_message_timings(self, room_id: str, message_id: str, timings: Dict[str, Any]) -> bool:
+        """Merge late timings (e.g. emit time) into an already stored message."""
+        result = self.messages_collection.update_one(
+            {"room_id": room_id, "messages.id": message_id},
+            {"$set": {f"messages.$.timings.{k}": v for k, v in timings.items()}}
+        )
+        return result.modified_count > 0
 
     def bulk_update_chats(self, updates: List[Dict[str, Any]]) -> int:
         """Perform bulk updates for better performance."""
@@ -210,49 +390,65 @@ class ChatService:
             return result.modified_count
         return 0
 
-    def set_admin_required(self, room_id: str, required: bool = True):
+    # Status setters filter on the current value so repeated calls match
+    # nothing and never become writes. They return True if anything changed.
+
+    def set_admin_required(self, room_id: str, required: bool = True) -> bool:
         """Set admin required status."""
-        self.chats_collection.update_one(
-            {"room_id": room_id},
-            {"$set": {"admin_required": required, "viewed": False}}
+        before = self.chats_collection.find_one_and_update(
+            {
+                "room_id": room_id,
+                "$or": [{"admin_required": {"$ne": required}}, {"viewed": {"$ne": False}}]
+            },
+            {"$set": {"admin_required": required, "viewed": False}},
+            projection={**COUNTED_FIELDS, "created_at": 1}
         )
-
-    def set_chat_viewed(self, room_id: str):
+        if before is None:
+            return False
+        if bool(before.get("admin_required")) != required:
+            self.rollups.record_admin_required(before.get("admin_id"), before.get("created_at"), required)
+            self._update_counts(before, {**before, "admin_required": required})
+        return True
+
+    def set_chat_viewed(self, room_id: str) -> bool:
         """Set chat as viewed."""
-        self.chats_collection.update_one(
-            {"room_id": room_id},
+        result = self.chats_collection.update_one(
+            {"room_id": room_id, "viewed": {"$ne": True}},
             {"$set": {"viewed": True}}
         )
+        return result.modified_count > 0
 
-    def set_admin_present(self, room_id: str, present: bool = True):
+    def set_admin_present(self, room_id: str, present: bool = True) -> bool:
         """Set admin presence status."""
-        self.chats_collection.update_one(
-            {"room_id": room_id},
+        result = self.chats_collection.update_one(
+            {"room_id": room_id, "admin_present": {"$ne": present}},
             {"$set": {"admin_present": present}}
         )
+        return result.modified_count > 0
 
-    def close_chat(self, room_id: str):
+    def close_chat(self, room_id: str) -> bool:
         """Close chat."""
-        self.chats_collection.update_one(
-            {"room_id": room_id},
+        result = self.chats_collection.update_one(
+            {"room_id": room_id, "open": {"$ne": False}},
             {"$set": {"open": False}}
         )
+        return result.modified_count > 0
 
-    def get_all_chats(self, admin_id: Optional[str] = None, limit: int = 100, skip: int = 0) -> List[Chat]:
+    def get_all_chats(self, admin_id: Optional[str] = None, limit: int = 100, skip: int = 0) -> List[ChatSummary]:
         """Get all chats with optimized query and projection."""
         match_stage = {
             "$match": {
                 "admin_id": admin_id,
                 "subject": {"$nin": ["Job"]},
                 "$or": [{"archived": False}, {"archived": {"$exists": False}}],
-                "messages.1": {"$exists": True}
+                **HAS_REPLIES
             }
         } if admin_id else {
             "$match": {
                 "subject": {"$nin": ["Job"]},
 
                 "$or": [{"archived": False}, {"archived": {"$exists": False}}],
-                "messages.1": {"$exists": True}
+                **HAS_REPLIES
             }
         }
 
@@ -266,14 +462,13 @@ class ChatService:
             {"$sort": {"sort_date": -1}},
             {"$skip": skip},
             {"$limit": limit},
-            # Remove _id and temporary sort_date field
-            {"$project": {"_id": 0, "sort_date": 0}}
+            {"$project": ChatSummary.projection(aggregate=True)}
         ]
 
         cursor = self.chats_collection.aggregate(pipeline)
-        return [Chat.from_dict(chat_data) for chat_data in cursor]
+        return [ChatSummary.from_dict(chat_data) for chat_data in cursor]
 
-    def get_chats_with_limited_messages(self, admin_id: Optional[str] = None, limit: int = 100, skip: int = 0, message_limit: int = 1) -> List[Chat]:
+    def get_chats_with_limited_messages(self, admin_id: Optional[str] = None, limit: int = 100, skip: int = 0, message_limit: int = 1) -> List[ChatSummary]:
         """Get chats with limited number of messages per chat for list views."""
         match_stage = {
             "$match": {
@@ -281,14 +476,14 @@ class ChatService:
 
                 "$or": [{"archived": False}, {"archived": {"$exists": False}}],
                 "subject": {"$nin": ["Job"]},
-                "messages.1": {"$exists": True}
+                **HAS_REPLIES
             }
         } if admin_id else {
             "$match": {
 
                 "$or": [{"archived": False}, {"archived": {"$exists": False}}],
                 "subject": {"$nin": ["Job"]},
-                "messages.1": {"$exists": True}
+                **HAS_REPLIES
             }
         }
 
@@ -302,18 +497,14 @@ class ChatService:
             {"$sort": {"sort_date": -1}},
             {"$skip": skip},
             {"$limit": limit},
-            {
-                "$addFields": {
-                    # Get last N messages
-                    "messages": {"$slice": ["$messages", -message_limit]}
-                }
-            },
-            # Remove _id and temporary sort_date field
-            {"$project": {"_id": 0, "sort_date": 0}}
+            {"$project": ChatSummary.projection(aggregate=True)}
         ]
 
-        cursor = self.chats_collection.aggregate(pipeline)
-        return [Chat.from_dict(chat_data) for chat_data in cursor]
+        chats = [ChatSummary.from_dict(chat_data) for chat_data in self.chats_collection.aggregate(pipeline)]
+        if message_limit > 1:
+            for chat in chats:
+                chat.messages = [m.to_dict() for m in self.get_messages(chat.room_id, limit=message_limit)]
+        return chats
 
     def get_chat_stats(self, admin_id: Optional[str] = None) -> Dict[str, Any]:
         """Get chat statistics using aggregation pipeline."""
@@ -357,14 +548,20 @@ class ChatService:
         admin_id: Optional[str] = None,
         filter_type: str = 'all',
         limit: int = 20,
-        skip: int = 0
-    ) -> List[Chat]:
-        """Get filtered chats with pagination support using find()."""
+        skip: int = 0,
+        cursor: Optional[str] = None
+    ) -> List[ChatSummary]:
+        """
+        Get filtered chats, newest first.
+
+        Pass the `cursor` from pagination.next_cursor(chats, limit, "updated_at", "room_id")
+        to continue after the previous page; `skip` is kept for old clients.
+        """
 
         # Common subject and message constraints
         base_filter = {
             "subject": {"$nin": ["Job"]},
-            "messages.1": {"$exists": True}
+            **HAS_REPLIES
         }
 
         if admin_id:
@@ -383,29 +580,74 @@ class ChatService:
         elif filter_type == "exported":
             base_filter["exported"] = True
 
-        # Query with pagination
-        cursor = (self.chats_collection
-                  .find(base_filter, {"_id": 0})
-                  .sort("updated_at", -1)
-                  .skip(skip)
-                  .limit(limit)
-                  )
-
-        return [Chat.from_dict(chat_data) for chat_data in cursor if chat_data]
+        # Keyset pagination: the cursor's position replaces a growing skip
+        query = after_cursor(base_filter, "updated_at", "room_id", cursor)
+        results = (self.chats_collection
+                   .find(query, ChatSummary.projection())
+                   .sort([("updated_at", -1), ("room_id", -1)])
+                   .skip(0 if cursor else skip)
+                   .limit(limit)
+                   )
+
+        return [ChatSummary.from_dict(chat_data) for chat_data in results if chat_data]
+
+    def _update_counts(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]):
+        """Apply a chat's change to its admin's filter counters and drop the cached copy."""
+        old, new = count_contribution(before), count_contribution(after)
+        deltas = {name: new[name] - old[name] for name in new if new[name] != old[name]}
+        admin_id = (after or before or {}).get("admin_id")
+        with _counts_cache_lock:
+            _counts_cache.pop(admin_id, None)
+            _counts_cache.pop(None, None)
+        if not deltas or not admin_id:
+            return
+        try:
+            # Only adjust counters that exist; a missing one is built by the next read
+            self.counters_collection.update_one({"admin_id": admin_id}, {"$inc": deltas})
+        except Exception as e:
+            logger.warning(f"Chat counter update failed: {e}")
 
     def get_chat_counts_by_filter(self, admin_id: Optional[str] = None) -> Dict[str, int]:
-        """Get chat counts for all filter types using aggregation, including a separate archived count."""
+        """
+        Chat counts for every list filter.
+
+        Served from a short-lived in-process cache, then from the admin's
+        chat_counters document, which ChatService keeps current and which is
+        rebuilt from the aggregation when missing or older than
+        COUNTS_RECONCILE_INTERVAL.
+        """
+        now = time.monotonic()
+        with _counts_cache_lock:
+            cached = _counts_cache.get(admin_id)
+        if cached and cached[0] > now:
+            return dict(cached[1])
+
+        counts = None
+        if admin_id:
+            doc = self.counters_collection.find_one({"admin_id": admin_id}, {"_id": 0})
+            reconciled_at = doc.get("reconciled_at") if doc else None
+            if reconciled_at and (datetime.utcnow() - reconciled_at).total_seconds() < COUNTS_RECONCILE_INTERVAL:
+                counts = {name: max(doc.get(name, 0), 0) for name in ("all", "active", "exported", "archived")}
+        if counts is None:
+            counts = self.reconcile_chat_counts(admin_id)
+
+        with _counts_cache_lock:
+            _counts_cache[admin_id] = (now + COUNTS_CACHE_TTL, counts)
+        return dict(counts)
+
+    def reconcile_chat_counts(self, admin_id: Optional[str] = None) -> Dict[str, int]:
+        """Count chats for all filter types using aggregation and store the result as the admin's counters."""
 
         # Base match for unarchived or missing archived field
         base_match = {
             "admin_id": admin_id,
             "subject": {"$nin": ["Job"]},
             "$or": [{"archived": False}, {"archived": {"$exists": False}}],
-            "messages.1": {"$exists": True}
+            **HAS_REPLIES
         } if admin_id else {
             "subject": {"$nin": ["Job"]},
             "$or": [{"archived": False}, {"archived": {"$exists": False}}],
-            "messages.1": {"$exists": True}
+            **HAS_REPLIES
         }
 
         # Base match for archived
@@ -413,11 +655,11 @@ class ChatService:
             "admin_id": admin_id,
             "subject": {"$nin": ["Job"]},
             "archived": True,
-            "messages.1": {"$exists": True}
+            **HAS_REPLIES
         } if admin_id else {
             "subject": {"$nin": ["Job"]},
             "archived": True,
-            "messages.1": {"$exists": True}
+            **HAS_REPLIES
         }
 
         # Main aggregation (unarchived chats)
@@ -463,12 +705,19 @@ class ChatService:
             archived = result_archived[0]["archived"] if result_archived else 0
             archived_exported = result_archived[0]["archived_exported"] if result_archived else 0
 
-            return {
+            counts = {
                 "all": total,
                 "active": active,
                 "exported": exported_main + archived_exported,
                 "archived": archived
             }
+            if admin_id:
+                self.counters_collection.update_one(
+                    {"admin_id": admin_id},
+                    {"$set": {**counts, "reconciled_at": datetime.utcnow()}},
+                    upsert=True
+                )
+            return counts
 
         except Exception as e:
             logger.error(f"Error getting chat counts: {e}")
@@ -476,10 +725,4 @@ class ChatService:
 
     def get_chat_counts_for_header(self, admin_id: Optional[str] = None) -> Dict[str, int]:
         """Get chat counts for header display with caching."""
-
-        # Use a simple cache key based on admin_id
-        cache_key = f"chat_counts_{admin_id}"
-
-        # You can implement simple in-memory caching here if needed
-        # For now, we'll call the database each time but it's optimized
         return self.get_chat_counts_by_filter(admin_id)
@@ -0,0 +1,226 @@
+"""
+Circuit breaker and retry policy for bot generation.
+
+While the model provider is failing, the breaker opens and callers fail fast
+instead of waiting through every retry. After `recovery_timeout` seconds a
+single trial call is let through (half open). It closes the breaker on
+success and reopens it on failure.
+
+Retries use exponential backoff with full jitter. They also draw from a
+process-wide RetryBudget, so an outage cannot turn every message into several
+model calls.
+"""
+import os
+import time
+import random
+import threading
+from collections import deque
+from datetime import datetime
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30, window=60):
+        """
+        Args:
+            name: identifier shown to admins
+            failure_threshold: failures within `window` seconds that open the circuit
+            recovery_timeout: seconds to stay open before allowing a trial call
+            window: sliding window in seconds for counting failures
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.window = window
+
+        self.state = CircuitState.CLOSED
+        self.opened_at = None
+        self.last_error = None
+        self.changed_at = datetime.utcnow()
+        self._failures = deque()
+        self._trial_in_flight = False
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Register `listener(breaker, old_state, new_state)` for state changes"""
+        self._listeners.append(listener)
+
+    def allow_request(self):
+        """Return True if a call may be attempted now"""
+        with self._lock:
+            if self.state == CircuitState.CLOSED:
+                return True
+
+            if self.state == CircuitState.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    return False
+                transition = self._set_state(CircuitState.HALF_OPEN)
+            else:
+                transition = None
+
+            # Half open: only one trial call at a time
+            allowed = not self._trial_in_flight
+            if allowed:
+                self._trial_in_flight = True
+
+        self._notify(transition)
+        return allowed
+
+    def record_success(self):
+        with self._lock:
+            self._failures.clear()
+            self._trial_in_flight = False
+            transition = None
+            if self.state != CircuitState.CLOSED:
+                self.last_error = None
+                transition = self._set_state(CircuitState.CLOSED)
+        self._notify(transition)
+
+    def record_failure(self, error=None):
+        now = time.monotonic()
+        with self._lock:
+            self.last_error = str(error) if error else None
+            self._trial_in_flight = False
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+
+            transition = None
+            if self.state == CircuitState.HALF_OPEN or (
+                    self.state == CircuitState.CLOSED and len(self._failures) >= self.failure_threshold):
+                self.opened_at = now
+                transition = self._set_state(CircuitState.OPEN)
+            elif self.state == CircuitState.OPEN:
+                self.opened_at = now
+        self._notify(transition)
+
+    def release(self):
+        """Free a half-open trial slot without counting the call either way"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def status(self):
+        """Snapshot of the breaker for admin views"""
+        with self._lock:
+            retry_in = None
+            if self.state == CircuitState.OPEN:
+                retry_in = max(0, round(self.recovery_timeout -
+                                        (time.monotonic() - self.opened_at), 1))
+            return {
+                "name": self.name,
+                "state": self.state,
+                "recent_failures": len(self._failures),
+                "failure_threshold": self.failure_threshold,
+                "last_error": self.last_error,
+                "changed_at": self.changed_at.isoformat(),
+                "retry_in": retry_in,
+            }
+
+    def _set_state(self, new_state):
+        # Caller holds the lock; listeners are notified after it is released
+        old_state = self.state
+        if old_state == new_state:
+            return None
+        self.state = new_state
+        self.changed_at = datetime.utcnow()
+        return old_state, new_state
+
+    def _notify(self, transition):
+        if not transition:
+            return
+        for listener in self._listeners:
+            try:
+                listener(self, *transition)
+            except Exception as e:
+                print(f"Circuit breaker listener error: {e}")
+
+
+# HTTP statuses that mean the provider, not the request, is failing
+PROVIDER_ERROR_CODES = {408, 429}
+
+
+def is_provider_error(error):
+    """
+    True for failures of the model provider or the connection to it: API
+    server errors, rate limits, timeouts and transport errors. Anything else
+    (a missing chat session, a tool bug, a database error) is ours and must
+    not open the breaker.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        from google.genai import errors as genai_errors
+    except ImportError:
+        genai_errors = None
+    if genai_errors is not None and isinstance(error, genai_errors.APIError):
+        return isinstance(error, genai_errors.ServerError) or error.code in PROVIDER_ERROR_CODES
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of recent first attempts, shared by every
+    worker in the process.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=1, window=10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, events, now):
+        while events and now - events[0] > self.window:
+            events.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        with self._lock:
+            self._requests.append(now)
+            self._trim(self._requests, now)
+
+    def try_acquire(self):
+        """Return True and spend one retry if the budget allows it"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(self._requests, now)
+            self._trim(self._retries, now)
+            allowed = self.min_per_second * self.window + \
+                self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """Delay before retry number `attempt` (0-based), with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+# Shared by every bot reply in this process
+generation_breaker = CircuitBreaker(
+    "bot_generation",
+    failure_threshold=int(os.environ.get("BOT_BREAKER_FAILURES", 5)),
+    recovery_timeout=int(os.environ.get("BOT_BREAKER_RECOVERY", 30)),
+)
+generation_retry_budget = RetryBudget()
+generation_retry_policy = RetryPolicy()
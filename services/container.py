@@ -0,0 +1,33 @@
+from services.admin_service import AdminService
+from services.call_service import CallService
+from services.chat_service import ChatService
+from services.facebook_service import FacebookService
+from services.latency_service import LatencyService
+from services.logs_service import LogsService
+from services.notification_service import NotificationService
+from services.search_service import SearchService
+from services.usage_service import UsageService
+from services.user_service import UserService
+from services.whatsapp_service import WhatsappService
+
+
+class ServiceContainer:
+    """
+    The database services, built once per process and shared by every
+    request as `current_app.services`. Services only hold collection
+    handles, which pymongo makes safe to share between threads.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.admin_service = AdminService(db)
+        self.call_service = CallService(db)
+        self.chat_service = ChatService(db)
+        self.facebook_service = FacebookService(db)
+        self.latency_service = LatencyService(db)
+        self.logs_service = LogsService(db)
+        self.notification_service = NotificationService(db)
+        self.search_service = SearchService(db)
+        self.usage_service = UsageService(db)
+        self.user_service = UserService(db)
+        self.whatsapp_service = WhatsappService(db)
@@ -0,0 +1,36 @@
+import threading
+from pymongo import monitoring
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """
+    Counts MongoDB commands issued by the current thread between start() and
+    stop(). Registered on the app's MongoClient so every request can report
+    how many round trips it made.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def start(self):
+        self._local.counts = {}
+
+    def stop(self):
+        """Stop counting and return {"total": n, "commands": {name: n}}"""
+        counts = getattr(self._local, "counts", None) or {}
+        self._local.counts = None
+        return {"total": sum(counts.values()), "commands": counts}
+
+    def started(self, event):
+        counts = getattr(self._local, "counts", None)
+        if counts is not None:
+            counts[event.command_name] = counts.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+round_trip_counter = RoundTripCounter()
@@ -3,10 +3,12 @@ import os
 from datetime import datetime, timezone
 from typing import TypedDict, Literal, Optional
 from pymongo.collection import Collection
+from services.channel_messages import ChannelMessages, RECENT_MESSAGES, CHANNEL_PAGE_SIZE
 
 class FacebookUser(TypedDict):
     sender_id: str
-    messages: list
+    messages: list  # Only the most recent, every message is in facebook_messages
+    message_count: int
     updated_at: datetime
     created_at: datetime
     admin_enabled: bool
@@ -16,12 +18,14 @@ class FacebookService:
     def __init__(self, db):
         self.db = db
         self.facebook_collection: Collection[FacebookUser] = db.facebook
+        self.store = ChannelMessages(self.facebook_collection, db.facebook_messages, "sender_id")
     
     def create(self, sender_id, user_info=None):
         """Create a new Facebook user chat"""
         fb_doc = {
             "sender_id": sender_id,
             "messages": [],
+            "message_count": 0,
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc),
             "admin_enabled": False,
@@ -65,10 +69,6 @@ class FacebookService:
         Returns:
             Message ID if successful, None otherwise
         """
-        chat = self.get_by_sender_id(sender_id)
-        if not chat:
-            return None
-        
         # Generate unique message ID
         message_id = str(uuid.uuid4())
         
@@ -86,7 +86,13 @@ class FacebookService:
             # Use MP3 for both user and bot messages on Messenger
             file_extension = ".mp3"
             file_path = os.path.join('files', 'facebook', sender_id, f"{message_id}{file_extension}")
-            
+            message_doc["audio_path"] = file_path
+        
+        # One update, no read of the thread first
+        if not self.store.add(sender_id, message_doc):
+            return None
+
+        if "audio_path" in message_doc:
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
@@ -95,58 +101,31 @@ class FacebookService:
                 f.write(audio_bytes)
             
             print(f"Saved audio file: {file_path}")
-            message_doc["audio_path"] = file_path
-        
-        # Update database
-        result = self.facebook_collection.update_one(
-            {"sender_id": sender_id},
-            {
-                "$push": {"messages": message_doc},
-                "$set": {"updated_at": datetime.now(timezone.utc)}
-            }
-        )
         
         return message_id
     
-    def get_by_sender_id(self, sender_id):
-        """Get chat by Facebook sender ID"""
-        chat_data = self.facebook_collection.find_one(
-            {"sender_id": sender_id},
-            {"_id": 0}
-        )
-        return chat_data
+    def exists(self, sender_id):
+        return self.store.exists(sender_id)
+
+    def get_by_sender_id(self, sender_id, message_limit=RECENT_MESSAGES):
+        """Get chat by Facebook sender ID, with its last `message_limit` messages"""
+        return self.store.thread(sender_id, message_limit)
     
-    def get_messages(self, sender_id, limit=50):
-        """Get recent messages for a sender ID"""
-        chat = self.get_by_sender_id(sender_id)
-        if not chat:
-            return []
-        
-        messages = chat.get("messages", [])
-        return messages[-limit:] if len(messages) > limit else messages
+    def get_messages(self, sender_id, limit=50, before=None):
+        """Get recent messages for a sender ID, or the ones before `before`"""
+        return self.store.window(sender_id, limit, before)
     
     def get_message_by_id(self, sender_id, message_id):
         """Get a specific message by ID"""
-        chat = self.get_by_sender_id(sender_id)
-        if not chat:
-            return None
-        
-        for msg in chat.get("messages", []):
-            if msg.get("id") == message_id:
-                return msg
-        return None
+        return self.store.find(sender_id, message_id)
 
-    def get_all_chats(self):
-        """Get all Facebook chats"""
-        chat_data = self.facebook_collection.find(
-            {},
-            {"_id": 0}
-        )
-        return list(chat_data)
+    def list_chats(self, cursor=None, page_size=CHANNEL_PAGE_SIZE):
+        """(chats, next_cursor): a page of chats, newest activity first, with only the last message"""
+        return self.store.list_threads(cursor, page_size)
     
     def delete_chat(self, sender_id):
         """Delete a chat and its messages"""
-        result = self.facebook_collection.delete_one({"sender_id": sender_id})
+        deleted = self.store.delete(sender_id)
         
         # Optionally delete audio files
         chat_dir = os.path.join('files', 'facebook', sender_id)
@@ -154,19 +133,12 @@ class FacebookService:
             import shutil
             shutil.rmtree(chat_dir)
         
-        return result.deleted_count > 0
+        return deleted
     
     def get_chat_statistics(self):
         """Get statistics about Facebook chats"""
-        pipeline = [
-            {
-                "$project": {
-                    "sender_id": 1,
-                    "message_count": {"$size": "$messages"},
-                    "created_at": 1,
-                    "updated_at": 1,
-                    "admin_enabled": 1
-                }
-            }
-        ]
-        return list(self.facebook_collection.aggregate(pipeline))
+        return self.store.summaries()
+
+    def get_thread_statistics(self, sender_id):
+        """Message counts by sender and type for one chat"""
+        return self.store.statistics(sender_id)
@@ -0,0 +1,188 @@
+import os
+import csv
+import gzip
+import queue
+import ipaddress
+import threading
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import requests
+
+# CSV of IP ranges starting with start,end columns (dotted addresses or integers), optionally gzipped
+GEOIP_DB_PATH = os.environ.get("GEOIP_DB_PATH", "data/geoip.csv.gz")
+# Where country and city are in each row: "simple" is start,end,country,city;
+# "ip2location" reads the IP2Location LITE DB3 CSV as published.
+# Countries are stored by name, so databases with only country codes need converting first
+GEOIP_DB_FORMAT = os.environ.get("GEOIP_DB_FORMAT", "simple")
+GEOIP_COLUMNS = {"simple": (2, 3), "ip2location": (3, 5)}
+# Ask ip-api/ipwhois in the background for addresses the local database misses
+GEOIP_REMOTE_FALLBACK = os.environ.get("GEOIP_REMOTE_FALLBACK", "true").lower() == "true"
+
+Location = Tuple[Optional[str], Optional[str]]  # (city, country)
+
+
+def _is_public(ip: ipaddress._BaseAddress) -> bool:
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local
+                or ip.is_multicast or ip.is_reserved or ip.is_unspecified)
+
+
+def parse_ip(value: Optional[str]) -> Optional[ipaddress._BaseAddress]:
+    """First address of a (possibly X-Forwarded-For style) value, None if invalid"""
+    try:
+        return ipaddress.ip_address((value or "").split(",")[0].strip())
+    except ValueError:
+        return None
+
+
+class GeoIPResolver:
+    """
+    Offline IP -> (city, country) lookups.
+
+    Ranges are held as sorted start/end arrays per address family with an
+    index into a table of distinct locations, so a lookup is one bisect.
+    The database loads in a background thread; until it is ready lookups
+    return None.
+    """
+
+    def __init__(self, path: str = GEOIP_DB_PATH, db_format: str = GEOIP_DB_FORMAT):
+        self.path = path
+        self.country_column, self.city_column = GEOIP_COLUMNS[db_format]
+        self._tables = {}
+        self._locations = []
+
+    def load_async(self):
+        # Checked before the thread starts so the warning shows with the startup output
+        if self._database_missing():
+            return
+        threading.Thread(target=self.load, name="geoip-load", daemon=True).start()
+
+    def load(self):
+        if self._database_missing():
+            return
+        opener = gzip.open if self.path.endswith(".gz") else open
+        rows = {4: [], 6: []}
+        location_ids = {}
+        locations = []
+        with opener(self.path, "rt", encoding="utf-8", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) <= max(self.country_column, self.city_column):
+                    continue
+                try:
+                    start, end = self._address(row[0]), self._address(row[1])
+                except ValueError:
+                    continue  # Header or malformed line
+                location = (row[self.city_column] or None, row[self.country_column] or None)
+                if location not in location_ids:
+                    location_ids[location] = len(locations)
+                    locations.append(location)
+                rows[start.version].append((int(start), int(end), location_ids[location]))
+
+        tables = {}
+        for version, ranges in rows.items():
+            ranges.sort()
+            # IPv6 values do not fit a C array
+            starts = array("I", (r[0] for r in ranges)) if version == 4 else [r[0] for r in ranges]
+            ends = array("I", (r[1] for r in ranges)) if version == 4 else [r[1] for r in ranges]
+            tables[version] = (starts, ends, array("I", (r[2] for r in ranges)))
+        self._tables, self._locations = tables, locations
+        self.lookup.cache_clear()
+        print(f"GeoIP database loaded: {len(rows[4])} IPv4 and {len(rows[6])} IPv6 ranges")
+
+    def _database_missing(self):
+        if self.path and os.path.exists(self.path):
+            return False
+        print(f"⚠️  GeoIP database not found at {self.path}: every login location will come "
+              f"from the remote fallback. Set GEOIP_DB_PATH to a local database.")
+        return True
+
+    @staticmethod
+    def _address(value: str):
+        value = value.strip()
+        if value.isdigit():
+            number = int(value)
+            return ipaddress.ip_address(number) if number <= 0xFFFFFFFF else ipaddress.IPv6Address(number)
+        return ipaddress.ip_address(value)
+
+    @lru_cache(maxsize=4096)
+    def lookup(self, ip: str) -> Optional[Location]:
+        """(city, country) of a public address, None when unknown"""
+        address = parse_ip(ip)
+        if address is None or not _is_public(address) or address.version not in self._tables:
+            return None
+        starts, ends, location_index = self._tables[address.version]
+        number = int(address)
+        i = bisect_right(starts, number) - 1
+        if i < 0 or number > ends[i]:
+            return None
+        return self._locations[location_index[i]]
+
+
+def remote_lookup(ip: str) -> Optional[Location]:
+    """(city, country) from the public geo APIs; only ever called off the request path"""
+    for url in ("http://ip-api.com/json/{}", "https://ipwhois.app/json/{}"):
+        try:
+            geo = requests.get(url.format(ip), timeout=5).json()
+        except Exception:
+            continue
+        if geo.get("country"):
+            return geo.get("city"), geo["country"]
+    return None
+
+
+class GeoEnricher:
+    """
+    Fills in users' city/country in the background.
+
+    `enqueue` is cheap and never blocks; a worker thread resolves each
+    address (local database first, then the remote fallback) and sets the
+    fields only where they are still missing.
+    """
+
+    def __init__(self, resolver: GeoIPResolver, max_queue: int = 10000):
+        self.resolver = resolver
+        self.users_collection = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+
+    def start(self, db):
+        if self._thread:
+            return
+        self.users_collection = db.users
+        self._thread = threading.Thread(target=self._run, name="geo-enricher", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, user_id: str, ip: Optional[str]):
+        address = parse_ip(ip)
+        if not self._thread or not user_id or address is None or not _is_public(address):
+            return
+        try:
+            self._queue.put_nowait((user_id, str(address)))
+        except queue.Full:
+            pass  # The backfill job picks these up later
+
+    def resolve(self, ip: str) -> Optional[Location]:
+        location = self.resolver.lookup(ip)
+        if location is None and GEOIP_REMOTE_FALLBACK:
+            location = remote_lookup(ip)
+        return location
+
+    def _run(self):
+        while True:
+            user_id, ip = self._queue.get()
+            try:
+                location = self.resolve(ip)
+                if location:
+                    city, country = location
+                    self.users_collection.update_one(
+                        {"user_id": user_id, "country": None},
+                        {"$set": {"city": city, "country": country}}
+                    )
+            except Exception as e:
+                print(f"Geo enrichment failed for {user_id}: {e}")
+
+
+geoip = GeoIPResolver()
+geo_enricher = GeoEnricher(geoip)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo import ASCENDING as ASC, DESCENDING as DESC, IndexModel
+
+# Every index the app relies on, by collection. Services no longer create
+# indexes themselves; ensure_indexes() applies this once per deploy.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "chats": [
+        # room_id breaks updated_at ties for keyset pagination
+        IndexModel([("admin_id", ASC), ("updated_at", DESC), ("room_id", DESC)]),
+        IndexModel([("admin_id", ASC), ("admin_required", ASC), ("updated_at", DESC), ("room_id", DESC)]),
+        IndexModel([("admin_id", ASC), ("exported", ASC), ("updated_at", DESC), ("room_id", DESC)]),
+        # Message existence check
+        IndexModel([("admin_id", ASC), ("subject", ASC), ("message_count", ASC), ("updated_at", DESC)]),
+        # Search terms, with the chat list's subject and replies filters
+        IndexModel([("admin_id", ASC), ("search_terms", ASC), ("subject", ASC), ("message_count", ASC)]),
+        IndexModel("chat_id"),
+        IndexModel("room_id"),
+        IndexModel("user_id"),
+    ],
+    "chat_messages": [
+        # Message buckets, newest first per room
+        IndexModel([("room_id", ASC), ("bucket", ASC)], unique=True),
+        IndexModel([("admin_id", ASC), ("end", DESC)]),
+    ],
+    "chat_counters": [
+        IndexModel("admin_id", unique=True),
+    ],
+    "chat_rollups": [
+        IndexModel([("admin_id", ASC), ("granularity", ASC), ("bucket", ASC)], unique=True),
+    ],
+    "users": [
+        IndexModel("user_id"),
+    ],
+    "admins": [
+        IndexModel("admin_id"),
+        IndexModel("secret_key"),
+        IndexModel("username"),
+        IndexModel("role"),
+        IndexModel("password_reset_token", sparse=True),
+    ],
+    "two_fa_tokens": [
+        IndexModel([("admin_id", ASC), ("ip_address", ASC), ("status", ASC), ("created_at", DESC)]),
+        IndexModel("token_id"),
+        # Expired token cleanup
+        IndexModel("created_at"),
+    ],
+    "trusted_ips": [
+        IndexModel([("admin_id", ASC), ("ip_address", ASC)]),
+    ],
+    "notifications": [
+        # notification_id breaks created_at ties
+        IndexModel([("admin_id", ASC), ("created_at", DESC), ("notification_id", DESC)]),
+        IndexModel([("admin_id", ASC), ("read", ASC), ("created_at", DESC), ("notification_id", DESC)]),
+    ],
+    "calls": [
+        # call_id breaks started_at ties for the newest-first call list
+        IndexModel([("started_at", DESC), ("call_id", DESC)]),
+        IndexModel([("status", ASC), ("started_at", DESC), ("call_id", DESC)]),
+        IndexModel("call_id"),
+    ],
+    "whatsapp": [
+        IndexModel("phone_no"),
+        # Dashboard list, newest activity first
+        IndexModel([("updated_at", DESC), ("phone_no", DESC)]),
+    ],
+    "whatsapp_messages": [
+        IndexModel([("thread", ASC), ("time", DESC)]),
+        IndexModel([("thread", ASC), ("id", ASC)]),
+    ],
+    "facebook": [
+        IndexModel("sender_id"),
+        IndexModel([("updated_at", DESC), ("sender_id", DESC)]),
+    ],
+    "facebook_messages": [
+        IndexModel([("thread", ASC), ("time", DESC)]),
+        IndexModel([("thread", ASC), ("id", ASC)]),
+    ],
+    "usage": [
+        # Upserts rely on this to never create a second document for a period
+        IndexModel([("admin_id", ASC), ("period", ASC), ("date", ASC)], unique=True),
+    ],
+    "usage_journal": [
+        # A worker's own journals, and journals left behind by stopped workers
+        IndexModel("owner"),
+        IndexModel("opened_at"),
+    ],
+    "logs": [
+        # log_id breaks timestamp ties for cursor pagination
+        IndexModel([("timestamp", DESC), ("log_id", DESC)]),
+        IndexModel([("admin_id", ASC), ("timestamp", DESC), ("log_id", DESC)]),
+        IndexModel([("tag", ASC), ("timestamp", DESC), ("log_id", DESC)]),
+        IndexModel([("level", ASC), ("timestamp", DESC), ("log_id", DESC)]),
+        IndexModel("log_id"),
+        IndexModel([("message", "text")], default_language="none"),
+        # Retention: each log carries its own expiry, see LOG_RETENTION_DAYS
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ],
+    "config": [
+        IndexModel("id"),
+    ],
+}
+
+REGISTRY_ID = "indexes"
+
+
+def registry_fingerprint() -> str:
+    """Hash of the index definitions; changes whenever INDEXES does"""
+    spec = {name: [model.document for model in models] for name, models in sorted(INDEXES.items())}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def ensure_indexes(db, force: bool = False) -> bool:
+    """
+    Create every registered index unless this version of the registry was
+    already applied. Costs one read when nothing changed; returns True when
+    the indexes were (re)applied.
+    """
+    fingerprint = registry_fingerprint()
+    if not force:
+        try:
+            applied = db.config.find_one({"id": REGISTRY_ID}, {"_id": 0, "fingerprint": 1})
+        except Exception as e:
+            print(f"Index registry check failed: {e}")
+            return False
+        if applied and applied.get("fingerprint") == fingerprint:
+            return False
+
+    failed = []
+    for name, models in INDEXES.items():
+        try:
+            db[name].create_indexes(models)
+        except Exception as e:
+            # e.g. an existing index with other options, or duplicates under a unique index
+            print(f"Index creation failed for {name}: {e}")
+            failed.append(name)
+
+    if failed:
+        # Not recorded as applied, so the next start tries again
+        print(f"⚠️  Indexes not applied for: {', '.join(failed)}")
+        return True
+    db.config.update_one(
+        {"id": REGISTRY_ID},
+        {"$set": {"fingerprint": fingerprint, "applied_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    print(f"✅ Indexes applied for {len(INDEXES)} collections")
+    return True
@@ -0,0 +1,99 @@
+import math
+import time
+import calendar
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+
+def elapsed_ms(started: float) -> float:
+    """Milliseconds since a time.perf_counter() reading"""
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyService:
+    """Aggregates the per-turn `timings` stored on bot messages."""
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, db):
+        self.db = db
+        self.messages_collection = db.chat_messages
+
+    def _period_config(self, period: str, now: datetime):
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if period == "today":
+            return (today_start,
+                    lambda dt: dt.strftime("%H:00"),
+                    [f"{str(h).zfill(2)}:00" for h in range(24)])
+        if period == "this-week":
+            return (today_start - timedelta(days=today_start.weekday()),
+                    lambda dt: dt.strftime("%A"),
+                    ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"])
+        if period == "this-month":
+            days_in_month = calendar.monthrange(now.year, now.month)[1]
+            return (today_start.replace(day=1),
+                    lambda dt: dt.day,
+                    list(range(1, days_in_month + 1)))
+        raise ValueError(f"Unsupported period '{period}'")
+
+    def _samples(self, admin_id: Optional[str], since: datetime, metric: str):
+        """Yield (timestamp, value) for bot turns since `since`"""
+        match = {"end": {"$gte": since}}
+        if admin_id:
+            match["admin_id"] = admin_id
+
+        pipeline = [
+            {"$match": match},
+            {"$project": {"_id": 0, "messages.timestamp": 1, f"messages.timings.{metric}": 1}},
+            {"$unwind": "$messages"},
+            {"$match": {
+                "messages.timestamp": {"$gte": since},
+                f"messages.timings.{metric}": {"$exists": True}
+            }},
+            {"$project": {"ts": "$messages.timestamp", "value": f"$messages.timings.{metric}"}},
+        ]
+        for doc in self.messages_collection.aggregate(pipeline):
+            yield doc["ts"], doc["value"]
+
+    def get_latency_series(self, admin_id: Optional[str] = None, period: str = "today",
+                           metric: str = "total_ms") -> Dict[str, Any]:
+        """
+        p50/p95/p99 of a bot timing metric bucketed like the dashboard charts.
+
+        Returns:
+            {"labels": [...], "p50": [...], "p95": [...], "p99": [...],
+             "count": [...], "overall": {"p50": x, "p95": y, "p99": z, "count": n}}
+        """
+        now = datetime.utcnow()
+        since, bucket_of, labels = self._period_config(period, now)
+
+        buckets = {label: [] for label in labels}
+        everything = []
+        for ts, value in self._samples(admin_id, since, metric):
+            label = bucket_of(ts)
+            if label in buckets:
+                buckets[label].append(value)
+            everything.append(value)
+
+        series = {"labels": labels, "count": []}
+        for pct in self.PERCENTILES:
+            series[f"p{pct}"] = []
+        for label in labels:
+            values = sorted(buckets[label])
+            series["count"].append(len(values))
+            for pct in self.PERCENTILES:
+                series[f"p{pct}"].append(percentile(values, pct))
+
+        everything.sort()
+        series["overall"] = {f"p{pct}": percentile(everything, pct)
+                             for pct in self.PERCENTILES}
+        series["overall"]["count"] = len(everything)
+        return series
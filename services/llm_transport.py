@@ -0,0 +1,557 @@
+"""
+Pluggable transport for Gemini and Aldar tool calls.
+
+`Bot`, `GeminiTwilioBridge` and the tool registry get their clients from
+here, so the same code can run against live providers or a cassette:
+
+    LLM_TRANSPORT=live     real providers (default)
+    LLM_TRANSPORT=record   real providers, every interaction appended to LLM_CASSETTE
+    LLM_TRANSPORT=replay   no network, responses served from LLM_CASSETTE
+
+A cassette is a JSONL file with one interaction per line. Replayed calls
+sleep for the recorded latency times LLM_REPLAY_LATENCY_SCALE, or for
+LLM_REPLAY_LATENCY_MS if that is set. When no recording matches a request
+exactly, replay falls back to the next recorded response of the same kind
+and model. Set LLM_REPLAY_STRICT=true to raise CassetteMiss instead.
+
+Live audio sessions are recorded as scripts of server events. You can also
+hand-write a script and point LLM_LIVE_SCRIPT at it; FakeLiveSession then
+plays it back to the voice bridge.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import contextlib
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 16-bit mono PCM bytes per millisecond
+INPUT_BYTES_PER_MS = 32     # 16 kHz from Twilio
+OUTPUT_BYTES_PER_MS = 48    # 24 kHz from Gemini
+
+
+class CassetteMiss(Exception):
+    """No recorded interaction can answer a replayed request"""
+
+
+def _normalize(value):
+    """Reduce SDK objects to plain JSON so requests can be fingerprinted"""
+    if hasattr(value, "model_dump_json"):
+        return json.loads(value.model_dump_json(exclude_none=True))
+    if isinstance(value, bytes):
+        return {"sha1": hashlib.sha1(value).hexdigest()}
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def fingerprint(*parts):
+    payload = json.dumps(_normalize(list(parts)), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _dump_response(response):
+    # Bytes (TTS audio) are base64 in the JSON form, which round-trips
+    return json.loads(response.model_dump_json(exclude_none=True))
+
+
+def _load_response(payload):
+    from google.genai import types
+    return types.GenerateContentResponse.model_validate_json(json.dumps(payload))
+
+
+class Cassette:
+    def __init__(self, path):
+        self.path = path
+        self._by_key = defaultdict(list)
+        self._by_model = defaultdict(list)
+        self._positions = defaultdict(int)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    self._index(json.loads(line))
+
+    def _index(self, record):
+        self._by_key[(record["kind"], record.get("key"))].append(record)
+        self._by_model[(record["kind"], record.get("model"))].append(record)
+
+    def append(self, record):
+        with self._lock:
+            self._index(record)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def _next(self, bucket, records):
+        # Repeated identical requests get successive recordings, then the last one repeats
+        position = self._positions[bucket]
+        self._positions[bucket] += 1
+        return records[min(position, len(records) - 1)] if bucket[0] == "key" \
+            else records[position % len(records)]
+
+    def find(self, kind, key, model=None, strict=False):
+        """Return the recording for a request, falling back by kind and model"""
+        with self._lock:
+            records = self._by_key.get((kind, key))
+            if records:
+                return self._next(("key", kind, key), records)
+            if strict:
+                raise CassetteMiss(f"No recorded {kind} interaction for key {key}")
+            records = self._by_model.get((kind, model))
+            if records:
+                return self._next(("model", kind, model), records)
+        raise CassetteMiss(f"Cassette {self.path} has no {kind} interactions for {model}")
+
+    def count(self, kind=None):
+        with self._lock:
+            return sum(len(records) for (k, _), records in self._by_model.items()
+                       if kind is None or k == kind)
+
+
+class LiveTransport:
+    """Talks to the real providers"""
+
+    mode = "live"
+
+    def genai_client(self, api_key):
+        from google import genai
+        return genai.Client(api_key=api_key)
+
+    def call_tool(self, name, parameters, call):
+        return call()
+
+
+class RecordTransport(LiveTransport):
+    """Talks to the real providers and appends every interaction to a cassette"""
+
+    mode = "record"
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    def genai_client(self, api_key):
+        return _RecordingClient(super().genai_client(api_key), self.cassette)
+
+    def call_tool(self, name, parameters, call):
+        started = time.perf_counter()
+        result = call()
+        self.cassette.append({
+            "kind": "tool",
+            "key": fingerprint(name, parameters),
+            "model": name,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "response": result,
+        })
+        return result
+
+
+class ReplayTransport:
+    """Serves every interaction from a cassette without touching the network"""
+
+    mode = "replay"
+
+    def __init__(self, cassette, latency_scale=1.0, latency_ms=None, strict=False,
+                 live_script=None):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.latency_ms = latency_ms
+        self.strict = strict
+        self.live_script = live_script
+
+    def delay(self, record):
+        """Seconds a replayed call should take"""
+        if self.latency_ms is not None:
+            return self.latency_ms / 1000
+        return record.get("latency_ms", 0) * self.latency_scale / 1000
+
+    def genai_client(self, api_key=None):
+        return _ReplayClient(self)
+
+    def call_tool(self, name, parameters, call):
+        record = self.cassette.find("tool", fingerprint(name, parameters),
+                                    model=name, strict=self.strict)
+        time.sleep(self.delay(record))
+        return record["response"]
+
+    def replay(self, kind, key, model):
+        record = self.cassette.find(kind, key, model=model, strict=self.strict)
+        time.sleep(self.delay(record))
+        return _load_response(record["response"])
+
+    def live_events(self, model):
+        if self.live_script:
+            with open(self.live_script, "r", encoding="utf-8") as f:
+                script = json.load(f)
+            return script["events"] if isinstance(script, dict) else script
+        return self.cassette.find("live", None, model=model)["events"]
+
+
+# ---------------------------------------------------------------------------
+# Recording wrappers
+# ---------------------------------------------------------------------------
+
+class _ChatKey:
+    """Tracks a chat's turns the same way when recording and replaying"""
+
+    def __init__(self, model, config, history):
+        self.model = model
+        self.system_instruction = getattr(config, "system_instruction", None)
+        self.history = _normalize(list(history or []))
+
+    def key(self, message):
+        return fingerprint(self.model, self.system_instruction, self.history, message)
+
+    def advance(self, message, response):
+        self.history.append({"role": "user", "message": _normalize(message)})
+        if response.candidates and response.candidates[0].content:
+            self.history.append(_normalize(response.candidates[0].content))
+
+
+class _RecordingChat:
+    def __init__(self, chat, chat_key, cassette):
+        self._chat = chat
+        self._key = chat_key
+        self._cassette = cassette
+
+    def send_message(self, message, config=None):
+        started = time.perf_counter()
+        response = self._chat.send_message(message, config=config)
+        self._cassette.append({
+            "kind": "chat",
+            "key": self._key.key(message),
+            "model": self._key.model,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "response": _dump_response(response),
+        })
+        self._key.advance(message, response)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class _RecordingChats:
+    def __init__(self, chats, cassette):
+        self._chats = chats
+        self._cassette = cassette
+
+    def create(self, model, config=None, history=None):
+        chat = self._chats.create(model=model, config=config, history=history)
+        return _RecordingChat(chat, _ChatKey(model, config, history), self._cassette)
+
+
+class _RecordingModels:
+    def __init__(self, models, cassette):
+        self._models = models
+        self._cassette = cassette
+
+    def generate_content(self, model, contents, config=None):
+        started = time.perf_counter()
+        response = self._models.generate_content(model=model, contents=contents, config=config)
+        self._cassette.append({
+            "kind": "generate",
+            "key": fingerprint(model, contents, config),
+            "model": model,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "response": _dump_response(response),
+        })
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+class _RecordingLiveSession:
+    def __init__(self, session):
+        self._session = session
+        self._started = time.perf_counter()
+        self._audio_bytes = 0
+        self.events = []
+
+    async def _count_audio(self, stream):
+        async for chunk in stream:
+            self._audio_bytes += len(chunk)
+            yield chunk
+
+    async def start_stream(self, stream, mime_type):
+        async for response in self._session.start_stream(
+                stream=self._count_audio(stream), mime_type=mime_type):
+            event = _live_event(response)
+            if event:
+                event["at_ms"] = round((time.perf_counter() - self._started) * 1000, 1)
+                event["after_audio_ms"] = self._audio_bytes // INPUT_BYTES_PER_MS
+                self.events.append(event)
+            yield response
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class _RecordingLive:
+    def __init__(self, live, cassette):
+        self._live = live
+        self._cassette = cassette
+
+    @contextlib.asynccontextmanager
+    async def connect(self, model, config=None):
+        async with self._live.connect(model=model, config=config) as session:
+            recorder = _RecordingLiveSession(session)
+            try:
+                yield recorder
+            finally:
+                self._cassette.append({"kind": "live", "model": model,
+                                       "events": recorder.events})
+
+
+class _RecordingClient:
+    def __init__(self, client, cassette):
+        self._client = client
+        self.models = _RecordingModels(client.models, cassette)
+        self.chats = _RecordingChats(client.chats, cassette)
+        self.aio = _Namespace(live=_RecordingLive(client.aio.live, cassette))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# ---------------------------------------------------------------------------
+# Replay wrappers
+# ---------------------------------------------------------------------------
+
+class _Namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class _ReplayChat:
+    def __init__(self, transport, chat_key):
+        self._transport = transport
+        self._key = chat_key
+
+    def send_message(self, message, config=None):
+        response = self._transport.replay("chat", self._key.key(message), self._key.model)
+        self._key.advance(message, response)
+        return response
+
+
+class _ReplayChats:
+    def __init__(self, transport):
+        self._transport = transport
+
+    def create(self, model, config=None, history=None):
+        return _ReplayChat(self._transport, _ChatKey(model, config, history))
+
+
+class _ReplayModels:
+    def __init__(self, transport):
+        self._transport = transport
+
+    def generate_content(self, model, contents, config=None):
+        return self._transport.replay("generate", fingerprint(model, contents, config), model)
+
+
+class _ReplayLive:
+    def __init__(self, transport):
+        self._transport = transport
+
+    @contextlib.asynccontextmanager
+    async def connect(self, model, config=None):
+        session = FakeLiveSession(self._transport.live_events(model),
+                                  time_scale=self._transport.latency_scale)
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+class _ReplayClient:
+    def __init__(self, transport):
+        self.models = _ReplayModels(transport)
+        self.chats = _ReplayChats(transport)
+        self.aio = _Namespace(live=_ReplayLive(transport))
+
+
+# ---------------------------------------------------------------------------
+# Live audio sessions
+# ---------------------------------------------------------------------------
+
+def _live_event(response):
+    """Reduce a LiveServerMessage to a script event"""
+    event = {}
+    content = response.server_content
+    if content:
+        if content.input_transcription and content.input_transcription.text:
+            event["input_transcription"] = content.input_transcription.text
+        if content.output_transcription and content.output_transcription.text:
+            event["output_transcription"] = content.output_transcription.text
+        if content.interrupted:
+            event["interrupted"] = True
+        if content.turn_complete:
+            event["turn_complete"] = True
+    if response.data:
+        event["audio_ms"] = len(response.data) // OUTPUT_BYTES_PER_MS
+    if response.tool_call and response.tool_call.function_calls:
+        event["tool_calls"] = [{"name": fc.name, "args": dict(fc.args or {})}
+                               for fc in response.tool_call.function_calls]
+    return event
+
+
+def _live_message(event, index):
+    """Build a LiveServerMessage from a script event"""
+    from google.genai import types
+
+    content = {}
+    if event.get("input_transcription"):
+        content["input_transcription"] = {"text": event["input_transcription"]}
+    if event.get("output_transcription"):
+        content["output_transcription"] = {"text": event["output_transcription"]}
+    if event.get("audio_ms"):
+        content["model_turn"] = {"parts": [{"inline_data": {
+            "mime_type": "audio/pcm;rate=24000",
+            "data": b"\x00" * (int(event["audio_ms"]) * OUTPUT_BYTES_PER_MS),
+        }}]}
+    if event.get("interrupted"):
+        content["interrupted"] = True
+    if event.get("turn_complete"):
+        content["turn_complete"] = True
+
+    message = {}
+    if content:
+        message["server_content"] = types.LiveServerContent.model_validate(content)
+    if event.get("tool_calls"):
+        message["tool_call"] = types.LiveServerToolCall(function_calls=[
+            types.FunctionCall(id=f"call-{index}-{n}", name=call["name"], args=call.get("args", {}))
+            for n, call in enumerate(event["tool_calls"])
+        ])
+    return types.LiveServerMessage(**message)
+
+
+class FakeLiveSession:
+    """
+    Scripted stand-in for a Gemini Live session.
+
+    Each script event may carry `at_ms` (time since the session started) and
+    `after_audio_ms` (input audio the caller must have streamed first). An
+    event is emitted once both conditions are met, or once the input stream
+    ends. Events with `tool_calls` wait for send_tool_response(); responses
+    are kept in `tool_responses`.
+    """
+
+    def __init__(self, events, time_scale=1.0, tool_timeout=10):
+        self.events = list(events)
+        self.time_scale = time_scale
+        self.tool_timeout = tool_timeout
+        self.tool_responses = []
+        self.audio_received_ms = 0
+        self.closed = False
+        self._stream_done = False
+        self._tool_event = asyncio.Event()
+
+    async def _drain(self, stream):
+        try:
+            async for chunk in stream:
+                self.audio_received_ms += len(chunk) / INPUT_BYTES_PER_MS
+                if self.closed:
+                    break
+        finally:
+            self._stream_done = True
+
+    async def _wait_for(self, event, started):
+        loop = asyncio.get_running_loop()
+        due = started + event.get("at_ms", 0) * self.time_scale / 1000
+        while not self.closed:
+            audio_ready = self._stream_done or \
+                self.audio_received_ms >= event.get("after_audio_ms", 0)
+            remaining = due - loop.time()
+            if audio_ready and remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, 0.02) if remaining > 0 else 0.02)
+
+    async def start_stream(self, stream, mime_type):
+        drain = asyncio.ensure_future(self._drain(stream))
+        started = asyncio.get_running_loop().time()
+        try:
+            for index, event in enumerate(self.events):
+                await self._wait_for(event, started)
+                if self.closed:
+                    break
+                self._tool_event.clear()
+                yield _live_message(event, index)
+                if event.get("tool_calls") and not self.closed:
+                    try:
+                        await asyncio.wait_for(self._tool_event.wait(), self.tool_timeout)
+                    except asyncio.TimeoutError:
+                        print(f"FakeLiveSession: no tool response for event {index}")
+        finally:
+            drain.cancel()
+
+    async def send_tool_response(self, function_responses):
+        self.tool_responses.extend(function_responses)
+        self._tool_event.set()
+
+    async def close(self):
+        self.closed = True
+        self._tool_event.set()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def create_transport(mode=None, cassette_path=None):
+    """Build a transport from arguments, falling back to the LLM_* env vars"""
+    mode = (mode or os.getenv("LLM_TRANSPORT", "live")).lower()
+    if mode == "live":
+        return LiveTransport()
+
+    cassette_path = cassette_path or os.getenv("LLM_CASSETTE", "bin/cassettes/default.jsonl")
+    cassette = Cassette(cassette_path)
+    if mode == "record":
+        return RecordTransport(cassette)
+    if mode == "replay":
+        latency_ms = os.getenv("LLM_REPLAY_LATENCY_MS")
+        return ReplayTransport(
+            cassette,
+            latency_scale=float(os.getenv("LLM_REPLAY_LATENCY_SCALE", 1.0)),
+            latency_ms=float(latency_ms) if latency_ms else None,
+            strict=os.getenv("LLM_REPLAY_STRICT", "false").lower() == "true",
+            live_script=os.getenv("LLM_LIVE_SCRIPT") or None,
+        )
+    raise ValueError(f"Unknown LLM_TRANSPORT '{mode}'")
+
+
+def get_transport():
+    """Process-wide transport selected by LLM_TRANSPORT"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = create_transport()
+            if _transport.mode != "live":
+                print(f"LLM transport: {_transport.mode} ({_transport.cassette.path})")
+        return _transport
+
+
+def set_transport(transport):
+    """Swap the process-wide transport, e.g. from a benchmark harness"""
+    global _transport
+    with _transport_lock:
+        _transport = transport
@@ -1,8 +1,55 @@
-from datetime import datetime
-from typing import Optional, Dict, Any
+import os
+import atexit
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
 from pymongo import MongoClient
 from pymongo.collection import Collection
 from models.log import LogEntry, LogLevel, LogTag
+from services.pagination import after_cursor
+
+LOG_PAGE_SIZE = 100
+MAX_LOG_PAGE_SIZE = 500
+
+
+def _parse_pairs(spec: Optional[str]) -> Dict[str, float]:
+    """"api=0.1,ADMIN=1" -> {"api": 0.1, "ADMIN": 1.0}; malformed entries are ignored"""
+    pairs = {}
+    for part in (spec or "").split(","):
+        key, _, value = part.partition("=")
+        try:
+            pairs[key.strip()] = float(value)
+        except ValueError:
+            continue
+    return pairs
+
+
+# Days each level is kept before the TTL index removes it, 0 keeps it forever.
+# Override with e.g. LOG_RETENTION_DAYS="DEBUG=3,ERROR=365"
+LOG_RETENTION_DAYS = {
+    "DEBUG": 7,
+    "INFO": 30,
+    "WARNING": 90,
+    "ERROR": 180,
+    "CRITICAL": 365,
+    **_parse_pairs(os.environ.get("LOG_RETENTION_DAYS")),
+}
+
+
+def log_expiry(level: str, timestamp: datetime) -> Optional[datetime]:
+    """When a log of `level` written at `timestamp` expires, None if it is kept forever"""
+    days = LOG_RETENTION_DAYS.get(level, 0)
+    return timestamp + timedelta(days=days) if days > 0 else None
+
+
+def _with_expiry(doc: Dict[str, Any]) -> Dict[str, Any]:
+    expires_at = log_expiry(doc.get("level"), doc["timestamp"])
+    if expires_at:
+        doc["expires_at"] = expires_at
+    return doc
 
 
 class LogsService:
@@ -28,7 +75,7 @@ class LogsService:
             admin_id=admin_id,
             data=data
         )
-        self.logs_collection.insert_one(log_entry.to_dict())
+        self.logs_collection.insert_one(_with_expiry(log_entry.to_dict()))
         return log_entry
 
     def get_log_by_id(self, log_id: str) -> Optional[LogEntry]:
@@ -66,13 +113,16 @@ class LogsService:
             logs = logs.limit(int(limit))
         return [LogEntry.from_dict(log) for log in logs]
 
-    def get_recent_logs(self, admin_id: Optional[str] = None, limit: int = 100) -> list[LogEntry]:
-        """Get most recent logs with optional admin_id filter"""
+    def get_recent_logs(self, admin_id: Optional[str] = None, limit: int = 100,
+                        cursor: Optional[str] = None) -> list[LogEntry]:
+        """Get most recent logs with optional admin_id filter, after `cursor` if given"""
         query = {}
         if admin_id is not None:
             query['admin_id'] = admin_id
 
-        logs = self.logs_collection.find(query).sort("timestamp", -1)
+        logs = self.logs_collection.find(
+            after_cursor(query, "timestamp", "log_id", cursor)
+        ).sort([("timestamp", -1), ("log_id", -1)])
         if limit:
             logs = logs.limit(int(limit))
         return [LogEntry.from_dict(log) for log in logs]
@@ -114,9 +164,9 @@ class LogsService:
 
     def search_logs_advanced(self, levels=None, tags=None, user_id=None, admin_id=None,
                              message_search=None, start_date=None, end_date=None, limit=None,
-                             current_admin_id: Optional[str] = None):
+                             current_admin_id: Optional[str] = None, cursor: Optional[str] = None):
         """
-        Advanced search with admin restrictions
+        Advanced search with admin restrictions, newest first and after `cursor` if given
         """
         query = {}
 
@@ -142,10 +192,6 @@ class LogsService:
         if admin_id and current_admin_id is None:
             query['admin_id'] = admin_id
 
-        # Message content search
-        if message_search:
-            query['message'] = {'$regex': message_search, '$options': 'i'}
-
         # Date range filtering
         if start_date or end_date:
             date_query = {}
@@ -155,11 +201,16 @@ class LogsService:
                 date_query['$lte'] = end_date
             query['timestamp'] = date_query
 
-        cursor = self.logs_collection.find(query).sort('timestamp', -1)
+        query = after_cursor(query, "timestamp", "log_id", cursor)
+        # Message words go through the text index; $text has to stay at the top level
+        if message_search:
+            query['$text'] = {'$search': message_search}
+
+        results = self.logs_collection.find(query).sort([("timestamp", -1), ("log_id", -1)])
         if limit:
-            cursor = cursor.limit(int(limit))
+            results = results.limit(int(limit))
 
-        return [LogEntry.from_dict(log) for log in cursor]
+        return [LogEntry.from_dict(log) for log in results]
         # for doc in cursor:
         #     try:
         #         log = LogEntry(
@@ -177,3 +228,89 @@ class LogsService:
         #         continue
         #
         # return logs
+
+
+def parse_sample_rates(spec: Optional[str]) -> Dict[str, float]:
+    """Sampling rates keyed by a path's first segment or a log tag, clamped to 0..1"""
+    return {key: min(max(rate, 0.0), 1.0) for key, rate in _parse_pairs(spec).items()}
+
+
+class RequestLogWriter:
+    """
+    Writes request logs off the request path.
+
+    `submit` puts a finished request+response record on a bounded queue and
+    returns; a background thread drains it with insert_many every
+    `flush_interval` seconds or `batch_size` records. When the queue is full
+    records are dropped and counted rather than slowing requests down.
+    Records are sampled per path segment or tag (`sample_rates`, default 1);
+    failed requests are always kept.
+    """
+
+    def __init__(self, db, batch_size: int = 200, flush_interval: float = 2.0,
+                 max_queue: int = 10000, sample_rates: Optional[Dict[str, float]] = None):
+        self.logs_collection: Collection = db.logs
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rates = sample_rates or {}
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def should_log(self, path_segment: str, tag: LogTag, status_code: int) -> bool:
+        if status_code >= 400:
+            return True
+        rate = self.sample_rates.get(path_segment,
+                                     self.sample_rates.get(tag.value, self.sample_rates.get("default", 1.0)))
+        return rate >= 1.0 or random.random() < rate
+
+    def submit(self, record: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(_with_expiry(record))
+        except queue.Full:
+            self.dropped += 1
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        try:
+            self.logs_collection.insert_many(batch, ordered=False)
+        except Exception as e:
+            print(f"Request log write failed, {len(batch)} records lost: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._write(self._take_batch())
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
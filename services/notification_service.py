@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
+from services.pagination import after_cursor
 
 
 class NotificationService:
@@ -31,14 +32,16 @@ class NotificationService:
         return notification_id
 
     def get_notifications(self, admin_id: str, limit: int = 50,
-                          unread_only: bool = False) -> List[Dict]:
-        """Get notifications for an admin"""
+                          unread_only: bool = False, cursor: Optional[str] = None) -> List[Dict]:
+        """Get notifications for an admin, newest first and after `cursor` if given"""
         query = {"admin_id": admin_id}
         if unread_only:
             query["read"] = False
 
         notifications = self.notifications_collection.find(
-                query,{"_id":0}).sort("created_at", -1).limit(limit)
+                after_cursor(query, "created_at", "notification_id", cursor),
+                {"_id": 0}
+        ).sort([("created_at", -1), ("notification_id", -1)]).limit(limit)
         return list(notifications)
 
     def get_unread_count(self, admin_id: str) -> int:
@@ -0,0 +1,58 @@
+import json
+import base64
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+def encode_cursor(sort_value: Any, tie_value: Any) -> str:
+    """Opaque token for the position just after an item sorted by (sort_value, tie_value)"""
+    if isinstance(sort_value, datetime):
+        payload = {"d": sort_value.isoformat(), "id": tie_value}
+    else:
+        payload = {"v": sort_value, "id": tie_value}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[Any, Any]]:
+    """(sort_value, tie_value) of a cursor, or None for a missing or malformed one"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if "d" in payload:
+            return datetime.fromisoformat(payload["d"]), payload["id"]
+        return payload["v"], payload["id"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def keyset_filter(sort_field: str, tie_field: str, cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Mongo filter for items after `cursor` in (sort_field, tie_field) descending order"""
+    position = decode_cursor(cursor)
+    if position is None:
+        return None
+    sort_value, tie_value = position
+    return {"$or": [
+        {sort_field: {"$lt": sort_value}},
+        {sort_field: sort_value, tie_field: {"$lt": tie_value}},
+    ]}
+
+
+def after_cursor(query: Dict[str, Any], sort_field: str, tie_field: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """`query` narrowed to the page after `cursor`; $and keeps any $or already in it intact"""
+    keyset = keyset_filter(sort_field, tie_field, cursor)
+    if not keyset:
+        return query
+    return {"$and": [query, keyset]} if query else keyset
+
+
+def next_cursor(items: list, limit: int, sort_field: str, tie_field: str) -> Optional[str]:
+    """Cursor for the page after `items`, None when this was the last page"""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    if isinstance(last, dict):
+        return encode_cursor(last.get(sort_field), last.get(tie_field))
+    return encode_cursor(getattr(last, sort_field, None), getattr(last, tie_field, None))
@@ -0,0 +1,168 @@
+import calendar
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from pymongo import UpdateOne, ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day", "month", "year")
+
+
+def truncate(dt: datetime, granularity: str) -> datetime:
+    """Start of the hour/day/month/year `dt` falls in"""
+    if granularity == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "month":
+        return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "year":
+        return dt.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unsupported granularity '{granularity}'")
+
+
+class ChatRollupService:
+    """
+    Per-admin chat counters for the dashboard charts.
+
+    One `chat_rollups` document per (admin_id, granularity, bucket) holds
+    `total` chats created in that bucket and how many of them are
+    `admin_required`. ChatService keeps them current with $inc; `rebuild`
+    recomputes them from the chats collection.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.chats_collection = db.chats
+        self.rollups_collection = db.chat_rollups
+
+    def _increment(self, admin_id: Optional[str], created_at: Optional[datetime], counters: Dict[str, int]):
+        if not created_at:
+            return
+        operations = [
+            UpdateOne(
+                {"admin_id": admin_id, "granularity": granularity,
+                 "bucket": truncate(created_at, granularity)},
+                {"$inc": counters},
+                upsert=True
+            )
+            for granularity in GRANULARITIES
+        ]
+        try:
+            self.rollups_collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Stats drift is repaired by the next rebuild, never fail the chat write over it
+            logger.warning(f"Chat rollup update failed: {e}")
+
+    def record_chat_created(self, admin_id: Optional[str], created_at: datetime, admin_required: bool = False):
+        self._increment(admin_id, created_at,
+                        {"total": 1, "admin_required": 1 if admin_required else 0})
+
+    def record_admin_required(self, admin_id: Optional[str], created_at: datetime, required: bool):
+        """Count a chat's admin_required flag flipping, in the bucket it was created in"""
+        self._increment(admin_id, created_at, {"admin_required": 1 if required else -1})
+
+    def record_chats_deleted(self, chats: List[Dict[str, Any]]):
+        for chat in chats:
+            self._increment(chat.get("admin_id"), chat.get("created_at"),
+                            {"total": -1, "admin_required": -1 if chat.get("admin_required") else 0})
+
+    def _counts(self, admin_id: Optional[str], granularity: str, since: Optional[datetime]) -> Dict[datetime, Dict[str, int]]:
+        query = {"granularity": granularity}
+        if admin_id:
+            query["admin_id"] = admin_id
+        if since:
+            query["bucket"] = {"$gte": since}
+
+        counts = {}
+        for doc in self.rollups_collection.find(query, {"_id": 0, "bucket": 1, "total": 1, "admin_required": 1}):
+            entry = counts.setdefault(doc["bucket"], {"total": 0, "admin_required": 0})
+            entry["total"] += doc.get("total", 0)
+            entry["admin_required"] += doc.get("admin_required", 0)
+        return counts
+
+    def get_dashboard_stats(self, admin_id: Optional[str] = None) -> Dict[str, Any]:
+        """Chart series for today/this-week/this-month/this-year/all-time"""
+        now = datetime.utcnow()
+        today_start = truncate(now, "day")
+        week_start = today_start - timedelta(days=today_start.weekday())
+        month_start = truncate(now, "month")
+
+        hours = self._counts(admin_id, "hour", today_start)
+        days = self._counts(admin_id, "day", min(week_start, month_start))
+        months = self._counts(admin_id, "month", truncate(now, "year"))
+        years = self._counts(admin_id, "year", None)
+
+        days_in_month = calendar.monthrange(now.year, now.month)[1]
+        hour_keys = [today_start + timedelta(hours=h) for h in range(24)]
+        week_keys = [week_start + timedelta(days=d) for d in range(7)]
+        month_keys = [month_start + timedelta(days=d) for d in range(days_in_month)]
+        year_keys = [datetime(now.year, m, 1) for m in range(1, 13)]
+        year_labels = sorted(b for b, c in years.items() if c["total"] > 0)
+
+        def build(labels, keys, buckets):
+            return {
+                "labels": labels,
+                "totalChats": [buckets.get(k, {}).get("total", 0) for k in keys],
+                "adminRequired": [buckets.get(k, {}).get("admin_required", 0) for k in keys],
+            }
+
+        return {
+            "today": build([k.strftime("%H:00") for k in hour_keys], hour_keys, hours),
+            "this-week": build([k.strftime("%A") for k in week_keys], week_keys, days),
+            "this-month": build(list(range(1, days_in_month + 1)), month_keys, days),
+            "this-year": build([k.strftime("%b") for k in year_keys], year_keys, months),
+            "all-time": build([k.strftime("%Y") for k in year_labels], year_labels, years),
+        }
+
+    def rebuild(self, admin_id: Optional[str] = None) -> int:
+        """
+        Recompute rollups from the chats collection; returns the number of buckets written.
+
+        Existing rollups in scope are dropped first so deleted chats stop counting.
+        Chats created while this runs may be missed, so run it when traffic is low.
+        """
+        match = {"created_at": {"$type": "date"}}
+        if admin_id:
+            match["admin_id"] = admin_id
+        self.rollups_collection.delete_many({"admin_id": admin_id} if admin_id else {})
+
+        parts = {
+            "hour": ["year", "month", "day", "hour"],
+            "day": ["year", "month", "day"],
+            "month": ["year", "month"],
+            "year": ["year"],
+        }
+        operators = {"year": "$year", "month": "$month", "day": "$dayOfMonth", "hour": "$hour"}
+
+        written = 0
+        for granularity, fields in parts.items():
+            pipeline = [
+                {"$match": match},
+                {"$group": {
+                    "_id": {"admin_id": "$admin_id",
+                            **{f: {operators[f]: "$created_at"} for f in fields}},
+                    "total": {"$sum": 1},
+                    "admin_required": {"$sum": {"$cond": [{"$eq": ["$admin_required", True]}, 1, 0]}}
+                }}
+            ]
+            operations = []
+            for doc in self.chats_collection.aggregate(pipeline, allowDiskUse=True):
+                key = doc["_id"]
+                bucket = datetime(key["year"], key.get("month", 1), key.get("day", 1), key.get("hour", 0))
+                rollup = {"admin_id": key.get("admin_id"), "granularity": granularity, "bucket": bucket}
+                operations.append(ReplaceOne(
+                    rollup,
+                    {**rollup, "total": doc["total"], "admin_required": doc["admin_required"]},
+                    upsert=True
+                ))
+                if len(operations) >= 1000:
+                    self.rollups_collection.bulk_write(operations, ordered=False)
+                    written += len(operations)
+                    operations = []
+            if operations:
+                self.rollups_collection.bulk_write(operations, ordered=False)
+                written += len(operations)
+        return written
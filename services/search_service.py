@@ -0,0 +1,151 @@
+import re
+import logging
+from typing import List, Optional, Dict, Any
+
+from models.chat import ChatSummary
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 32
+
+SEARCH_PAGE_SIZE = 20
+
+# A chat matching the query in its user's name, city or country ranks above message-only matches
+USER_MATCH_WEIGHT = 2
+
+
+def tokenize(*texts: Optional[str]) -> List[str]:
+    """Distinct lower-cased search terms of the given texts, in first-seen order"""
+    terms = []
+    seen = set()
+    for text in texts:
+        for token in TOKEN_RE.findall((text or "").lower()):
+            token = token[:MAX_TERM_LENGTH]
+            if len(token) >= MIN_TERM_LENGTH and token not in seen:
+                seen.add(token)
+                terms.append(token)
+    return terms
+
+
+def user_terms(user) -> List[str]:
+    """Search terms of a user's name, city and country"""
+    return tokenize(getattr(user, "name", None), getattr(user, "city", None),
+                    getattr(user, "country", None))
+
+
+class SearchService:
+    """
+    Chat search over an inverted index kept on the chat documents.
+
+    `search_terms` holds every term of the chat's messages and its user,
+    `user_terms` only the user's. ChatService adds to both as chats are
+    created and messages arrive; `reindex_chat` rebuilds them for older chats.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.chats_collection = db.chats
+        self.messages_collection = db.chat_messages
+        self.users_collection = db.users
+
+    @staticmethod
+    def _terms_filter(tokens: List[str]) -> Dict[str, Any]:
+        # Every word must match; the last one is still being typed so it matches as a prefix
+        *words, partial = tokens
+        clauses = [{"search_terms": word} for word in words]
+        clauses.append({"search_terms": {"$regex": f"^{re.escape(partial)}"}})
+        return {"$and": clauses}
+
+    def search_chats(self, query: str, admin_id: Optional[str] = None,
+                     limit: int = SEARCH_PAGE_SIZE, skip: int = 0) -> List[ChatSummary]:
+        """Chats of the chat list matching `query`, best user matches first, then most recent"""
+        # chat_service imports tokenize from here
+        from services.chat_service import HAS_REPLIES
+
+        tokens = tokenize(query)
+        if not tokens:
+            # Single characters are not indexed as terms but still match as a prefix
+            tokens = TOKEN_RE.findall((query or "").lower())[-1:]
+            if not tokens:
+                return []
+
+        # Same chats as the chat list: not archived, no Job chats, only chats with replies
+        match = self._terms_filter(tokens)
+        match["$and"].extend(HAS_REPLIES["$and"])
+        match["$or"] = [{"archived": False}, {"archived": {"$exists": False}}]
+        match["subject"] = {"$ne": "Job"}
+        if admin_id:
+            match["admin_id"] = admin_id
+
+        partial = f"^{re.escape(tokens[-1])}"
+        pipeline = [
+            {"$match": match},
+            {"$addFields": {
+                "search_score": {"$multiply": [USER_MATCH_WEIGHT, {"$size": {"$filter": {
+                    "input": {"$ifNull": ["$user_terms", []]},
+                    "as": "term",
+                    "cond": {"$or": [
+                        {"$in": ["$$term", tokens[:-1]]},
+                        {"$regexMatch": {"input": "$$term", "regex": partial}}
+                    ]}
+                }}}]},
+                "sort_date": {"$ifNull": ["$updated_at", "$created_at"]}
+            }},
+            {"$sort": {"search_score": -1, "sort_date": -1}},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": ChatSummary.projection(aggregate=True)}
+        ]
+        return [ChatSummary.from_dict(chat_data)
+                for chat_data in self.chats_collection.aggregate(pipeline)]
+
+    def suggest(self, prefix: str, admin_id: Optional[str] = None, limit: int = 10) -> List[str]:
+        """Typeahead: the most used indexed terms starting with the last word of `prefix`"""
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+
+        regex = f"^{re.escape(tokens[-1])}"
+        match = {"search_terms": {"$regex": regex}}
+        if admin_id:
+            match["admin_id"] = admin_id
+
+        pipeline = [
+            {"$match": match},
+            {"$project": {"_id": 0, "search_terms": 1}},
+            {"$unwind": "$search_terms"},
+            {"$match": {"search_terms": {"$regex": regex}}},
+            {"$group": {"_id": "$search_terms", "chats": {"$sum": 1}}},
+            {"$sort": {"chats": -1, "_id": 1}},
+            {"$limit": limit}
+        ]
+        return [doc["_id"] for doc in self.chats_collection.aggregate(pipeline)]
+
+    def reindex_chat(self, chat_data: Dict[str, Any]) -> bool:
+        """Rebuild a chat's search terms from its stored messages and user"""
+        room_id = chat_data["room_id"]
+        user = self.users_collection.find_one(
+            {"user_id": chat_data.get("user_id")},
+            {"_id": 0, "name": 1, "city": 1, "country": 1}
+        ) or {}
+        user_fields = (user.get("name"), user.get("city"), user.get("country"))
+
+        contents = []
+        for bucket in self.messages_collection.find(
+                {"room_id": room_id}, {"_id": 0, "messages.content": 1}):
+            contents.extend(m.get("content") for m in bucket.get("messages", [])
+                            if isinstance(m.get("content"), str))
+        for message in chat_data.get("messages") or []:
+            if isinstance(message.get("content"), str):
+                contents.append(message["content"])
+
+        result = self.chats_collection.update_one(
+            {"room_id": room_id},
+            {"$set": {
+                "search_terms": tokenize(*contents, *user_fields),
+                "user_terms": tokenize(*user_fields)
+            }}
+        )
+        return result.matched_count > 0
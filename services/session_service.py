@@ -0,0 +1,113 @@
+import os
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from flask import current_app, g, has_app_context
+from flask_session.mongodb import MongoDBSessionInterface
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.utils import cached_property
+
+# An unchanged session has its expiry pushed back at most this often
+SESSION_TOUCH_INTERVAL = float(os.environ.get("SESSION_TOUCH_INTERVAL", 3600))
+# Seconds signed user claims are trusted before the user is looked up again
+USER_CLAIMS_MAX_AGE = int(os.environ.get("USER_CLAIMS_MAX_AGE", 6 * 3600))
+
+
+class ElidingMongoDBSessionInterface(MongoDBSessionInterface):
+    """
+    Flask-Session's MongoDB store with write elision.
+
+    Flask-Session rewrites the whole session document on every response of
+    a permanent session. Here the encoded session read at the start of the
+    request is kept on flask.g, and the session is only written back when
+    it differs, or when the stored expiry is more than
+    SESSION_TOUCH_INTERVAL seconds old. Nothing is cached across requests,
+    so every worker always reads the current session.
+    """
+
+    def __init__(self, app, touch_interval: float = SESSION_TOUCH_INTERVAL, **kwargs):
+        super().__init__(app, **kwargs)
+        self.touch_interval = touch_interval
+
+    @staticmethod
+    def _loaded(store_id: str):
+        """(encoded session, stored expiration) read for `store_id` in this request"""
+        if not has_app_context():
+            return None
+        loaded = g.get("_session_loaded")
+        return loaded[1:] if loaded and loaded[0] == store_id else None
+
+    def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        document = self.store.find_one({"id": store_id}, {"_id": 0, "val": 1, "expiration": 1})
+        if not document:
+            return None
+        encoded, expiration = bytes(document["val"]), document.get("expiration")
+        if expiration and expiration <= datetime.utcnow():
+            return None
+        if has_app_context():
+            g._session_loaded = (store_id, encoded, expiration)
+        return self.serializer.decode(encoded)
+
+    def _upsert_session(self, session_lifetime: timedelta, session, store_id: str):
+        encoded = self.serializer.encode(session)
+        loaded = self._loaded(store_id)
+        if loaded and loaded[0] == encoded and loaded[1]:
+            written_at = loaded[1] - session_lifetime
+            if (datetime.utcnow() - written_at).total_seconds() < self.touch_interval:
+                return
+        self.store.update_one(
+            {"id": store_id},
+            {"$set": {"id": store_id, "val": encoded, "expiration": datetime.utcnow() + session_lifetime}},
+            upsert=True,
+        )
+
+
+class UserClaims(NamedTuple):
+    """What hot widget routes need to know about the signed-in user"""
+    user_id: str
+    role: str
+    name: str
+
+
+class UserClaimsSigner:
+    """
+    Verified user identity carried in the session.
+
+    After a route has looked the user up, `issue` stores a signed, timed
+    token of their id, role and name; later requests `verify` it instead of
+    reading the users collection. Tokens older than `max_age` are rejected,
+    so the user is looked up again at least that often.
+    """
+
+    SESSION_KEY = "user_claims"
+
+    def __init__(self, max_age: int = USER_CLAIMS_MAX_AGE):
+        self.max_age = max_age
+
+    @cached_property
+    def _serializer(self):
+        return URLSafeTimedSerializer(current_app.secret_key, salt="min-user-claims")
+
+    def issue(self, session, user) -> UserClaims:
+        claims = UserClaims(user.user_id, session.get("role") or "user", user.name or "")
+        session[self.SESSION_KEY] = self._serializer.dumps(list(claims))
+        return claims
+
+    def verify(self, session) -> Optional[UserClaims]:
+        token = session.get(self.SESSION_KEY)
+        if not token or self.max_age <= 0:
+            return None
+        try:
+            claims = UserClaims(*self._serializer.loads(token, max_age=self.max_age))
+        except (BadSignature, TypeError, ValueError):
+            return None
+        # Claims only vouch for the user the session is signed in as
+        if claims.user_id != session.get("user_id"):
+            return None
+        return claims
+
+    def revoke(self, session):
+        session.pop(self.SESSION_KEY, None)
+
+
+user_claims = UserClaimsSigner()
@@ -0,0 +1,160 @@
+import os
+import time
+import threading
+from typing import Any, Dict, Optional
+
+from services.admin_cache import admin_cache
+
+# Seconds between checks of the stored settings version
+SETTINGS_POLL_INTERVAL = float(os.environ.get("SETTINGS_POLL_INTERVAL", 2))
+
+
+class FrozenDict(dict):
+    """A dict that refuses to change; use thaw() for a mutable copy"""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("Settings snapshots are read-only, write through SettingsService")
+
+    __setitem__ = __delitem__ = _immutable
+    update = pop = popitem = setdefault = clear = __ior__ = _immutable
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, set, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Plain, mutable copy of a frozen settings value"""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+def _get_path(data: Dict[str, Any], path: str):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+class SettingsService:
+    """
+    Superadmin settings (the `config` document with id "settings").
+
+    Readers get an immutable snapshot that is reloaded only when the stored
+    `version` changes; the version is checked at most every
+    `poll_interval` seconds, so every worker sees a change within that
+    time. Writers go through `update`/`add_to_set`/`pull`, which write and
+    bump the version only when the value actually changes. Per-admin merged
+    views are cached until the version changes or the admin is evicted
+    from the admin cache.
+    """
+
+    def __init__(self, db, poll_interval: float = SETTINGS_POLL_INTERVAL):
+        self.collection = db.config
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = None
+        self._checked_at = 0.0
+        # admin_id -> (settings version, cached at, merged view)
+        self._merged = {}
+        admin_cache.add_evict_listener(self._drop_merged)
+
+    def initialize(self, defaults: Dict[str, Any]):
+        """Create the settings document from `defaults` if missing, fill in new keys, and load it"""
+        doc = self.collection.find_one({"id": "settings"})
+        if not doc:
+            self.collection.insert_one({**defaults, "id": "settings", "version": 1})
+        else:
+            missing = {k: v for k, v in defaults.items() if k not in doc}
+            if missing or "version" not in doc:
+                self.collection.update_one(
+                    {"id": "settings"},
+                    {"$set": {**missing, "version": doc.get("version", 0) + 1}})
+        self._refresh(force=True)
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self._snapshot is not None and now - self._checked_at < self.poll_interval:
+            return
+        self._checked_at = now
+        try:
+            if not force and self._snapshot is not None:
+                stored = self.collection.find_one({"id": "settings"}, {"_id": 0, "version": 1})
+                if (stored or {}).get("version") == self._version:
+                    return
+            doc = self.collection.find_one({"id": "settings"}, {"_id": 0}) or {}
+        except Exception as e:
+            # Keep serving the last snapshot
+            print(f"Settings refresh failed: {e}")
+            if self._snapshot is None:
+                raise
+            return
+        with self._lock:
+            self._snapshot = freeze(doc)
+            self._version = doc.get("version")
+            self._merged = {}
+
+    def current(self) -> FrozenDict:
+        """The superadmin settings"""
+        self._refresh()
+        return self._snapshot
+
+    def for_admin(self, admin) -> FrozenDict:
+        """The settings an admin sees: superadmin settings overlaid with their own"""
+        snapshot = self.current()
+        if not admin:
+            return snapshot
+        with self._lock:
+            cached = self._merged.get(admin.admin_id)
+        if cached and cached[0] == self._version and time.monotonic() - cached[1] < admin_cache.ttl:
+            return cached[2]
+        merged = freeze({**snapshot, **(admin.settings or {})})
+        with self._lock:
+            self._merged[admin.admin_id] = (self._version, time.monotonic(), merged)
+        return merged
+
+    def _drop_merged(self, admin_id: Optional[str]):
+        with self._lock:
+            if admin_id is None:
+                self._merged = {}
+            else:
+                self._merged.pop(admin_id, None)
+
+    def _write(self, update: Dict[str, Any]) -> bool:
+        update.setdefault("$inc", {})["version"] = 1
+        self.collection.update_one({"id": "settings"}, update)
+        self._refresh(force=True)
+        return True
+
+    def update(self, changes: Dict[str, Any]) -> bool:
+        """$set dotted paths that differ from the stored settings; False when nothing changed"""
+        self._refresh(force=True)
+        changed = {path: value for path, value in changes.items()
+                   if thaw(_get_path(self._snapshot, path)) != value}
+        if not changed:
+            return False
+        return self._write({"$set": changed})
+
+    def add_to_set(self, field: str, value: Any) -> bool:
+        self._refresh(force=True)
+        if value in (_get_path(self._snapshot, field) or ()):
+            return False
+        return self._write({"$addToSet": {field: value}})
+
+    def pull(self, field: str, value: Any) -> bool:
+        self._refresh(force=True)
+        if value not in (_get_path(self._snapshot, field) or ()):
+            return False
+        return self._write({"$pull": {field: value}})
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, timedelta
 from models.tempuser import TempUser
-import requests
+from services.geoip_service import geoip
 
 
 class TempUserService:
@@ -14,24 +14,8 @@ class TempUserService:
     def create_user(self, name, ip=None, role="user"):
         user_id = str(uuid.uuid4())
 
-        # Get location info if IP is provided
-        country = None
-        city = None
-        if ip:
-            try:
-                geo = requests.get(f"http://ip-api.com/json/{ip}", timeout=5)
-                geo_data = geo.json()
-                country = geo_data.get("country", None)
-                city = geo_data.get("city")
-
-                if not country:
-                    geo = requests.get(f"https://ipwhois.app/json/{ip}", timeout=5)
-                    geo_data = geo.json()
-                    country = geo_data.get("country", None)
-                    city = geo_data.get("city")
-            except:
-                # If geo lookup fails, continue without location data
-                pass
+        # Temporary users live in memory only, so the local database is all they get
+        city, country = geoip.lookup(ip) or (None, None)
 
         # print(f"City: {city}, Country: {country}")
 
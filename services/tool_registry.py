@@ -0,0 +1,309 @@
+"""
+Aldar Exchange tool registry shared by the text bot (models/bot.py) and the
+voice bridge (ws-app.py).
+
+Every tool is defined once here: its schema, the function that executes it
+and how long its result may be cached. Declarations for each provider are
+generated from these definitions, so both paths send the same compact
+descriptions to Gemini.
+
+Run `python -m services.tool_registry` to print the token-size report.
+"""
+import os
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+import requests
+from dotenv import load_dotenv
+from services.llm_transport import get_transport
+
+load_dotenv()
+
+DEFAULT_ALDAR_BASE_URL = "https://aldarexchangeuat.net/ONLINEApp"
+# Cached tool results kept per process; least recently used ones are evicted beyond this
+TOOL_CACHE_MAX_ENTRIES = int(os.environ.get("TOOL_CACHE_MAX_ENTRIES", 1000))
+
+# Rough chars-per-token ratio used for the size report when no client is
+# available to count tokens exactly.
+CHARS_PER_TOKEN = 4
+
+
+def _get_exchange_rate(base_url, parameters):
+    response = requests.get(f"{base_url}/api/User/GetRate",
+                            params={"type": parameters.get("rate_type", 1)}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def _get_branch_details(base_url, parameters):
+    response = requests.get(
+        f"{base_url}/api/User/GetBranchesDetails", timeout=10)
+    response.raise_for_status()
+    branches = response.json()
+    # Wrap list in dictionary as Gemini expects dict response
+    return {"branches": branches, "total_count": len(branches)}
+
+
+def _calculate_exchange(base_url, parameters):
+    params = {
+        "type": parameters.get("transaction_type"),
+        "curcode": parameters.get("currency_code"),
+        "lcyamount": parameters.get("local_amount", 0),
+        "fcyamount": parameters.get("foreign_amount", 0)
+    }
+    response = requests.get(f"{base_url}/api/User/GetRate",
+                            params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def _get_transaction_status(base_url, parameters):
+    response = requests.get(f"{base_url}/api/User/GetTransactionDetails",
+                            params={"tranRefNo": parameters.get("transaction_ref_no")}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def _transfer_to_human_operator(base_url, parameters):
+    # The voice bridge ends the Gemini session itself, this only acknowledges
+    return {"status": "transferring", "reason": parameters.get("reason")}
+
+
+# name -> definition. `channels` lists which paths expose the tool, and
+# `cache_ttl` is how many seconds a successful result may be reused
+# (0 disables caching).
+TOOLS = {
+    "get_exchange_rate": {
+        "description": "Current Aldar Exchange rates. Use for any question about a currency's rate, price or value that needs no amount conversion. rate_type 1 = standard rate.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "rate_type": {
+                    "type": "integer",
+                    "description": "Rate type code, 1 for standard"
+                }
+            },
+            "required": ["rate_type"]
+        },
+        "executor": _get_exchange_rate,
+        "cache_ttl": 60,
+        "channels": ["text"],
+    },
+    "get_branch_details": {
+        "description": "All Aldar Exchange branches: names, addresses, phone numbers, coordinates, working days/hours and breaks. Use for any question about location, contact numbers, opening or closing times, or whether a branch is open.",
+        "parameters": {
+            "type": "object",
+            "properties": {}
+        },
+        "executor": _get_branch_details,
+        "cache_ttl": 6 * 60 * 60,
+        "channels": ["text", "voice"],
+    },
+    "calculate_exchange": {
+        "description": "Convert an amount between QAR and a foreign currency at live Aldar rates. Set exactly one of local_amount (QAR) or foreign_amount, the other to 0.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "transaction_type": {
+                    "type": "string",
+                    "description": "'tt' transfer, 'BUY' customer buys foreign currency, 'SELL' customer sells it",
+                    "enum": ["tt", "BUY", "SELL"]
+                },
+                "currency_code": {
+                    "type": "string",
+                    "description": "3-letter ISO currency code, e.g. USD"
+                },
+                "local_amount": {
+                    "type": "number",
+                    "description": "Amount in QAR, 0 if foreign_amount is given"
+                },
+                "foreign_amount": {
+                    "type": "number",
+                    "description": "Amount in foreign currency, 0 if local_amount is given"
+                }
+            },
+            "required": ["transaction_type", "currency_code", "local_amount", "foreign_amount"]
+        },
+        "executor": _calculate_exchange,
+        "cache_ttl": 60,
+        "channels": ["text", "voice"],
+    },
+    "get_transaction_status": {
+        "description": "Status and details of a sent transfer by reference number. Use when the user wants to track a transfer or payment and gives a reference number.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "transaction_ref_no": {
+                    "type": "string",
+                    "description": "Transaction reference number, e.g. 63897333251760"
+                }
+            },
+            "required": ["transaction_ref_no"]
+        },
+        "executor": _get_transaction_status,
+        "cache_ttl": 15,
+        "channels": ["text", "voice"],
+    },
+    "transfer_to_human_operator": {
+        "description": "Transfer the call to a human operator when the user asks for a person or cannot be helped.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "reason": {
+                    "type": "string",
+                    "description": "Short reason for the transfer"
+                }
+            },
+            "required": ["reason"]
+        },
+        "executor": _transfer_to_human_operator,
+        "cache_ttl": 0,
+        "channels": ["voice"],
+    },
+}
+
+
+class ToolRegistry:
+    def __init__(self, base_url=None):
+        base_url = base_url or os.getenv(
+            "ALDAR_BASE_API_URL") or DEFAULT_ALDAR_BASE_URL
+        self.base_url = base_url.rstrip("/")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def names(self, channel):
+        return [name for name, tool in TOOLS.items() if channel in tool["channels"]]
+
+    def declarations(self, channel):
+        """Plain dict function declarations for a channel"""
+        return [
+            {
+                "name": name,
+                "description": TOOLS[name]["description"],
+                "parameters": TOOLS[name]["parameters"],
+            }
+            for name in self.names(channel)
+        ]
+
+    def gemini_tools(self, channel="text"):
+        """Declarations as google.genai `types.Tool` objects for the text bot"""
+        from google.genai import types
+
+        return [types.Tool(function_declarations=[
+            types.FunctionDeclaration(**declaration)
+            for declaration in self.declarations(channel)
+        ])]
+
+    def live_tools(self, channel="voice"):
+        """Declarations in the dict form used by the Live API config"""
+        return [{"function_declarations": self.declarations(channel)}]
+
+    def execute(self, name, parameters):
+        """Run a tool, serving the result from cache while it is fresh"""
+        tool = TOOLS.get(name)
+        if not tool:
+            return {"error": f"Unknown tool: {name}"}
+
+        parameters = dict(parameters or {})
+        key = (name, json.dumps(parameters, sort_keys=True, default=str))
+        ttl = tool["cache_ttl"]
+
+        if ttl:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached and cached[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self.stats["hits"] += 1
+                    # Callers may change the result, the cached one must stay as returned by the API
+                    return copy.deepcopy(cached[1])
+                self.stats["misses"] += 1
+
+        try:
+            result = get_transport().call_tool(
+                name, parameters, lambda: tool["executor"](self.base_url, parameters))
+        except requests.exceptions.RequestException as e:
+            # Failures are never cached so the next turn retries the API
+            return {"error": f"API call failed: {str(e)}"}
+
+        if ttl:
+            with self._lock:
+                self._store(key, time.monotonic() + ttl, copy.deepcopy(result))
+        return result
+
+    def _store(self, key, expires, result):
+        # Caller holds the lock. Keys are model-written arguments, so bound the cache
+        now = time.monotonic()
+        for stale in [k for k, (until, _) in self._cache.items() if until <= now]:
+            del self._cache[stale]
+        self._cache[key] = (expires, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > TOOL_CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def cache_stats(self):
+        """Cache hits and misses since start, plus the hit rate"""
+        with self._lock:
+            hits, misses = self.stats["hits"], self.stats["misses"]
+        total = hits + misses
+        return {"hits": hits, "misses": misses,
+                "hit_rate": round(hits / total, 3) if total else None}
+
+    def token_report(self, client=None, model=None):
+        """
+        Approximate input tokens each declaration adds to every request.
+
+        Args:
+            client: optional google.genai Client, used to count tokens exactly
+            model: model name for the exact count
+
+        Returns:
+            dict of tool name -> {"chars", "tokens", "channels"} plus a
+            "total" entry
+        """
+        report = {}
+        for name, tool in TOOLS.items():
+            declaration = json.dumps({
+                "name": name,
+                "description": tool["description"],
+                "parameters": tool["parameters"],
+            })
+            tokens = None
+            if client and model:
+                try:
+                    tokens = client.models.count_tokens(
+                        model=model, contents=declaration).total_tokens
+                except Exception as e:
+                    print(f"Token count failed for {name}: {e}")
+            if tokens is None:
+                tokens = -(-len(declaration) // CHARS_PER_TOKEN)
+            report[name] = {
+                "chars": len(declaration),
+                "tokens": tokens,
+                "channels": tool["channels"],
+            }
+
+        report["total"] = {
+            channel: sum(r["tokens"] for n, r in report.items() if channel in r["channels"])
+            for channel in ("text", "voice")
+        }
+        return report
+
+
+# Process-wide registry so the result cache is shared by every chat
+tool_registry = ToolRegistry()
+
+
+if __name__ == "__main__":
+    report = tool_registry.token_report()
+    total = report.pop("total")
+    print(f"{'tool':<30}{'chars':>8}{'~tokens':>10}  channels")
+    for name, row in report.items():
+        print(f"{name:<30}{row['chars']:>8}{row['tokens']:>10}  {', '.join(row['channels'])}")
+    print(f"\nPer-turn tool overhead: text ~{total['text']} tokens, voice ~{total['voice']} tokens")
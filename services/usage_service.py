@@ -1,6 +1,68 @@
-from datetime import datetime, UTC
-from pymongo import MongoClient
-from typing import Dict, Any, List
+import atexit
+import calendar
+import threading
+import uuid
+from datetime import datetime, date, timedelta, UTC
+import numpy as np
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from services.admin_service import AdminService
+from typing import Dict, Any, List, Optional, Tuple
+
+
+def usage_slots(now: datetime) -> List[Tuple[str, str, int, int]]:
+    """(period, date key, array size, index) of the three usage documents `now` falls in"""
+    return [
+        ("daily", now.strftime("%Y-%m-%d"), 24, now.hour),
+        # Max days in month
+        ("monthly", now.strftime("%Y-%m"), 31, now.day - 1),
+        ("yearly", now.strftime("%Y"), 12, now.month - 1),
+    ]
+
+
+USAGE_FIELDS = ("cost", "input_tokens", "output_tokens")
+
+# Journals of a worker that stopped flushing are applied by other workers after this many seconds
+USAGE_JOURNAL_STALE = 60
+# Journal ids remembered per usage and admin document, so a re-applied journal is skipped
+USAGE_FLUSH_HISTORY = 100
+
+# Series granularity: (usage document period, slots per document)
+SERIES_LAYOUT = {
+    "hour": ("daily", 24),
+    "day": ("monthly", 31),
+    "month": ("yearly", 12),
+}
+
+
+def _document_keys(granularity: str, start: date, end: date) -> List[str]:
+    """Usage document `date` keys covering start..end for a series granularity"""
+    keys = []
+    if granularity == "hour":
+        day = start
+        while day <= end:
+            keys.append(day.strftime("%Y-%m-%d"))
+            day += timedelta(days=1)
+    elif granularity == "day":
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            keys.append(f"{year}-{str(month).zfill(2)}")
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    else:
+        keys = [str(year) for year in range(start.year, end.year + 1)]
+    return keys
+
+
+def _add_arrays(field: str, size: int, deltas: List[float]) -> Dict[str, Any]:
+    # Element-wise add onto the stored array, treating a missing document as zeros
+    return {"$map": {
+        "input": {"$range": [0, size]},
+        "as": "i",
+        "in": {"$add": [
+            {"$ifNull": [{"$arrayElemAt": [f"${field}", "$$i"]}, 0]},
+            {"$arrayElemAt": [{"$literal": deltas}, "$$i"]}
+        ]}
+    }}
 
 
 class UsageService:
@@ -8,6 +70,35 @@ class UsageService:
         self.db = db
         self.collection = db.usage
 
+    @staticmethod
+    def increment_op(admin_id: str, period: str, date_key: str, size: int,
+                     cost: List[float], input_tokens: List[int], output_tokens: List[int],
+                     now: datetime, flush_id: Optional[str] = None) -> UpdateOne:
+        """
+        Upsert adding per-slot deltas to one usage document.
+
+        An update pipeline builds the pre-sized arrays on insert and adds to
+        them otherwise, so creating and incrementing is a single operation.
+        With a `flush_id` the document remembers it and the op matches no
+        document once it was applied; its upsert then fails as a duplicate.
+        """
+        query = {"admin_id": admin_id, "period": period, "date": date_key}
+        fields = {
+            "cost": _add_arrays("cost", size, cost),
+            "input_tokens": _add_arrays("input_tokens", size, input_tokens),
+            "output_tokens": _add_arrays("output_tokens", size, output_tokens),
+            "last_updated": now
+        }
+        if flush_id:
+            query["flushes"] = {"$ne": flush_id}
+            fields["flushes"] = {"$slice": [
+                {"$concatArrays": [{"$ifNull": ["$flushes", []]}, [flush_id]]}, -USAGE_FLUSH_HISTORY]}
+        return UpdateOne(query, [{"$set": fields}], upsert=True)
+
+    def apply(self, operations: List[UpdateOne]):
+        if operations:
+            self.collection.bulk_write(operations, ordered=True)
+
     def get_cost(self, admin_id: str) -> Dict[str, Any]:
         """Retrieves all token usage data for a specific admin as a structured dictionary."""
         usage_data = {}
@@ -27,64 +118,113 @@ class UsageService:
         """Logs token usage for a specific admin into daily (hourly), monthly (daily), and yearly (monthly) records."""
         now = datetime.now(UTC)
 
-        hour_index = now.hour
-        day_index = now.day - 1  # 0-based index
-        month_index = now.month - 1  # 0-based index for months
+        operations = []
+        for period, date_key, size, index in usage_slots(now):
+            deltas = [[0] * size for _ in range(3)]
+            deltas[0][index] = cost
+            deltas[1][index] = input_tokens
+            deltas[2][index] = output_tokens
+            operations.append(self.increment_op(admin_id, period, date_key, size, *deltas, now))
 
-        periods = {
-            "daily": (now.strftime("%Y-%m-%d"), 24, hour_index),
-            # Max days in month
-            "monthly": (now.strftime("%Y-%m"), 31, day_index),
-            "yearly": (now.strftime("%Y"), 12, month_index),
-        }
-
-        for period, (date_key, size, index) in periods.items():
-            query = {"admin_id": admin_id, "period": period, "date": date_key}
-
-            # Ensure array exists and has the correct size
-            existing_doc = self.collection.find_one(query)
-            if not existing_doc:
-                self.collection.insert_one({
-                    "admin_id": admin_id,
-                    "period": period,
-                    "date": date_key,
-                    "cost": [0] * size,
-                    "input_tokens": [0] * size,
-                    "output_tokens": [0] * size,
-                    "last_updated": now
-                })
-
-            # Increment specific index
-            self.collection.update_one(
-                query,
-                {
-                    "$inc": {
-                        f"cost.{index}": cost,
-                        f"input_tokens.{index}": input_tokens,
-                        f"output_tokens.{index}": output_tokens,
-                    },
-                    "$set": {"last_updated": now}
-                },
-            )
+        # All three periods in one round trip
+        self.apply(operations)
 
     def get_admin_usage_summary(self, admin_id: str) -> Dict[str, Any]:
         """Gets a summary of usage for a specific admin across all periods."""
         summary = {
-            "daily": {"total_cost": 0, "total_input_tokens": 0, "total_output_tokens": 0},
-            "monthly": {"total_cost": 0, "total_input_tokens": 0, "total_output_tokens": 0},
-            "yearly": {"total_cost": 0, "total_input_tokens": 0, "total_output_tokens": 0},
+            period: {"total_cost": 0, "total_input_tokens": 0, "total_output_tokens": 0}
+            for period in ("daily", "monthly", "yearly")
         }
+        pipeline = [
+            {"$match": {"admin_id": admin_id}},
+            {"$group": {
+                "_id": "$period",
+                **{f"total_{field}": {"$sum": {"$sum": f"${field}"}} for field in USAGE_FIELDS}
+            }}
+        ]
+        for doc in self.collection.aggregate(pipeline):
+            if doc["_id"] in summary:
+                summary[doc["_id"]].update({k: v for k, v in doc.items() if k != "_id"})
+        return summary
 
-        for doc in self.collection.find({"admin_id": admin_id}):
-            period = doc["period"]
-            if period in summary:
-                summary[period]["total_cost"] += sum(doc.get("cost", []))
-                summary[period]["total_input_tokens"] += sum(
-                    doc.get("input_tokens", []))
-                summary[period]["total_output_tokens"] += sum(
-                    doc.get("output_tokens", []))
+    def get_usage_totals(self, start: date, end: date, admin_id: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Usage per admin between two days (inclusive), summed by the database.
 
-        return summary
+        Reads one monthly document per admin and month, slicing the first and
+        last month to the requested days.
+        """
+        start_key, end_key = start.strftime("%Y-%m"), end.strftime("%Y-%m")
+        match = {"period": "monthly", "date": {"$gte": start_key, "$lte": end_key}}
+        if admin_id:
+            match["admin_id"] = admin_id
+
+        first = {"$cond": [{"$eq": ["$date", start_key]}, start.day - 1, 0]}
+        last = {"$cond": [{"$eq": ["$date", end_key]}, end.day, 31]}
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": "$admin_id",
+                **{field: {"$sum": {"$sum": {"$slice": [f"${field}", first, {"$subtract": [last, first]}]}}}
+                   for field in USAGE_FIELDS}
+            }}
+        ]
+        return {doc["_id"]: {field: doc[field] for field in USAGE_FIELDS}
+                for doc in self.collection.aggregate(pipeline)}
+
+    def get_usage_series(self, start: date, end: date, granularity: str = "day",
+                         admin_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Chart series of usage between two days (inclusive) per hour, day or month.
+
+        Documents are stacked into a (documents x slots) matrix per field, so
+        summing admins and cutting the range are array operations.
+        """
+        if granularity not in SERIES_LAYOUT:
+            raise ValueError(f"Unsupported granularity '{granularity}'")
+        if end < start:
+            raise ValueError("end is before start")
+        period, slots = SERIES_LAYOUT[granularity]
+        keys = _document_keys(granularity, start, end)
+        rows = {key: i for i, key in enumerate(keys)}
+
+        match = {"period": period, "date": {"$in": keys}}
+        if admin_id:
+            match["admin_id"] = admin_id
+        docs = list(self.collection.find(match, {"_id": 0, "date": 1, **{f: 1 for f in USAGE_FIELDS}}))
+
+        matrices = {field: np.zeros((len(keys), slots)) for field in USAGE_FIELDS}
+        if docs:
+            row_index = np.array([rows[doc["date"]] for doc in docs])
+            for field in USAGE_FIELDS:
+                values = np.zeros((len(docs), slots))
+                for i, doc in enumerate(docs):
+                    stored = (doc.get(field) or [])[:slots]
+                    values[i, :len(stored)] = stored
+                np.add.at(matrices[field], row_index, values)
+
+        # Slots that are real points on the time axis, in order
+        if granularity == "hour":
+            labels = [f"{key} {str(h).zfill(2)}:00" for key in keys for h in range(24)]
+            valid = np.ones((len(keys), slots), dtype=bool)
+            first, last = 0, len(labels)
+        elif granularity == "day":
+            lengths = np.array([calendar.monthrange(int(k[:4]), int(k[5:]))[1] for k in keys])
+            valid = np.arange(slots)[None, :] < lengths[:, None]
+            labels = [f"{key}-{str(d).zfill(2)}" for key, n in zip(keys, lengths) for d in range(1, n + 1)]
+            first = start.day - 1
+            last = len(labels) - (int(lengths[-1]) - end.day)
+        else:
+            valid = np.ones((len(keys), slots), dtype=bool)
+            labels = [f"{key}-{str(m).zfill(2)}" for key in keys for m in range(1, 13)]
+            first, last = start.month - 1, len(labels) - (12 - end.month)
+
+        series = {"labels": labels[first:last]}
+        for field in USAGE_FIELDS:
+            values = matrices[field][valid][first:last]
+            series[field] = values.round(6).tolist()
+            series[f"total_{field}"] = float(values.sum())
+        return series
 
     def get_all_admins_usage(self) -> Dict[str, Dict[str, Any]]:
         """Retrieves usage data for all admins."""
@@ -112,6 +252,140 @@ class UsageService:
         self.collection.delete_many({"admin_id": admin_id})
 
 
+class UsageMeter:
+    """
+    Meters bot usage off the reply hot path.
+
+    `record` is a single upsert adding to this process's journal document
+    in usage_journal, instead of three usage writes and a token balance
+    write. Every `flush_interval` seconds the journal is sealed, a new one
+    takes its place, and the sealed one is applied as one usage bulk_write
+    plus one admins bulk_write, then deleted.
+
+    Usage is durable once `record` returns: the journals of a killed worker
+    are applied by the other workers' flushes after USAGE_JOURNAL_STALE
+    seconds. Applying is idempotent, each write stores the journal id on its
+    document and skips documents that already have it, so a journal retried
+    after an ambiguous error (a network error after the server committed)
+    is not charged twice. With a flush_interval of 0 every record is written
+    through immediately.
+    """
+
+    def __init__(self, db, flush_interval: float = 5.0):
+        self.usage_service = UsageService(db)
+        self.admin_service = AdminService(db)
+        self.usage_collection = db.usage
+        self.admins_collection = db.admins
+        self.journal = db.usage_journal
+        self.flush_interval = flush_interval
+        self.owner = uuid.uuid4().hex
+        self._journal_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="usage-meter", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, admin_id: str, input_tokens: int, output_tokens: int, cost: float):
+        if self.flush_interval <= 0:
+            self.usage_service.add_cost(admin_id, input_tokens, output_tokens, cost)
+            self.admin_service.update_tokens(admin_id, cost)
+            return
+        now = datetime.now(UTC)
+        increments = {f"tokens.{admin_id}": cost}
+        for period, date_key, size, index in usage_slots(now):
+            slot = f"usage.{admin_id}.{period}:{date_key}:{size}"
+            increments[f"{slot}.cost.{index}"] = cost
+            increments[f"{slot}.input_tokens.{index}"] = input_tokens
+            increments[f"{slot}.output_tokens.{index}"] = output_tokens
+
+        while True:
+            journal_id = self._journal_id
+            try:
+                self.journal.update_one(
+                    {"_id": journal_id, "sealed": {"$ne": True}},
+                    {"$inc": increments, "$setOnInsert": {"owner": self.owner, "opened_at": now}},
+                    upsert=True)
+                return
+            except DuplicateKeyError:
+                # Sealed for flushing meanwhile, write to its successor
+                self._rotate(journal_id)
+
+    def _rotate(self, journal_id):
+        with self._lock:
+            if self._journal_id == journal_id:
+                self._journal_id = uuid.uuid4().hex
+
+    def flush(self):
+        self._rotate(self._journal_id)
+        stale = datetime.now(UTC) - timedelta(seconds=max(USAGE_JOURNAL_STALE, 6 * self.flush_interval))
+        try:
+            journal_ids = [journal["_id"] for journal in self.journal.find({"$or": [
+                {"owner": self.owner, "_id": {"$ne": self._journal_id}},
+                {"owner": {"$ne": self.owner}, "opened_at": {"$lt": stale}},
+            ]}, {"_id": 1})]
+        except Exception as e:
+            print(f"Usage flush failed, retrying next interval: {e}")
+            return
+
+        for journal_id in journal_ids:
+            try:
+                journal = self.journal.find_one_and_update(
+                    {"_id": journal_id}, {"$set": {"sealed": True}},
+                    return_document=ReturnDocument.AFTER)
+                if journal:
+                    self._apply(journal)
+                    self.journal.delete_one({"_id": journal_id})
+            except Exception as e:
+                # The journal stays sealed; applying it again skips what was written
+                print(f"Usage flush failed, retrying next interval: {e}")
+
+    def _apply(self, journal):
+        flush_id = journal["_id"]
+        now = datetime.now(UTC)
+        operations = []
+        for admin_id, slots in (journal.get("usage") or {}).items():
+            for slot, fields in slots.items():
+                period, date_key, size = slot.split(":")
+                deltas = [[0] * int(size) for _ in USAGE_FIELDS]
+                for row, field in zip(deltas, USAGE_FIELDS):
+                    for index, value in (fields.get(field) or {}).items():
+                        row[int(index)] = value
+                operations.append(UsageService.increment_op(
+                    admin_id, period, date_key, int(size), *deltas, now, flush_id=flush_id))
+        if operations:
+            try:
+                self.usage_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Duplicates are documents this journal was already applied to
+                if e.details.get("writeConcernErrors") or any(
+                        error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+
+        tokens = {admin_id: cost for admin_id, cost in (journal.get("tokens") or {}).items() if cost}
+        if tokens:
+            try:
+                self.admins_collection.bulk_write([
+                    UpdateOne({"admin_id": admin_id, "usage_flushes": {"$ne": flush_id}},
+                              {"$inc": {"tokens": -cost},
+                               "$push": {"usage_flushes": {"$each": [flush_id], "$slice": -USAGE_FLUSH_HISTORY}}})
+                    for admin_id, cost in tokens.items()
+                ], ordered=False)
+            finally:
+                # Cached admins still carry the old balance
+                self.admin_service.invalidate_cache(*tokens)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
 def log_usage(admin_id: str, input_tokens: int, output_tokens: int, cost: float):
     """Logs token usage for a specific admin."""
     now = datetime.now(UTC)
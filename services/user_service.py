@@ -1,6 +1,6 @@
 import uuid
 from models.user import User
-import requests
+from services.geoip_service import geoip, geo_enricher
 
 
 class UserService:
@@ -13,21 +13,8 @@ class UserService:
     ):
         user_id = str(uuid.uuid4())
 
-        geo = requests.get(f"http://ip-api.com/json/{ip}")
-        # print(geo)
-        geo = geo.json()
-
-        country = geo.get("country", None)
-        city = geo.get("city")
-        if not country:
-
-            geo = requests.get(f"https://ipwhois.app/json/{ip}")
-            # print(geo)
-            geo = geo.json()
-            # print(geo)
-            country = geo.get("country", None)
-            city = geo.get("city")
-        # print(f"City: {city}, Country: {country}")
+        # Local database only; misses are resolved in the background
+        city, country = geoip.lookup(ip) or (None, None)
         user = User(
             name=name,
             email=email,
@@ -40,40 +27,44 @@ class UserService:
             desg=desg,
         )
         self.users_collection.insert_one(user.to_dict())
+        if not country:
+            geo_enricher.enqueue(user_id, ip)
         return user
 
     def get_user(self, name, email, phone):
+        """Pure read; derived fields are filled by backfill_user_fields.py, not here"""
         user_data = self.users_collection.find_one(
             {"name": name, "email": email, "phone": phone}
         )
-        if not user_data.get('company'):
-            
-            self.users_collection.update_one({'user_id': user_data.get('user_id')}, {
-                                             "$set": {"company": User.from_dict(user_data).company}})
         if user_data:
-            user_data["db"] = self.users_collection
             return User.from_dict(user_data)
         return None
 
     def get_user_by_id(self, user_id):
+        """Pure read; derived fields are filled by backfill_user_fields.py, not here"""
         user_data = self.users_collection.find_one({"user_id": user_id})
-
-        if not user_data.get('company'):
-            
-            self.users_collection.update_one({'user_id': user_data.get('user_id')}, {
-                                             "$set": {"company": User.from_dict(user_data).company}})
-
-
         if user_data:
-
-            user_data["db"] = self.users_collection
             return User.from_dict(user_data)
         return None
 
-    def get_users_by_ids(self, user_ids):
-        user_data = self.users_collection.find({"user_id": {"$in": user_ids}})
+    def get_users_by_ids(self, user_ids, fields=None):
+        projection = None
+        if fields:
+            projection = {"_id": 0, "user_id": 1, **{f: 1 for f in fields}}
+        user_data = self.users_collection.find(
+            {"user_id": {"$in": list(user_ids)}}, projection)
         return {user['user_id']: user for user in user_data}
 
+    def attach_usernames(self, chats, default="Unknown User"):
+        """Fill chat.username in one query for chats created before it was stored on the chat"""
+        missing = {chat.user_id for chat in chats if not getattr(chat, "username", None)}
+        if missing:
+            users = self.get_users_by_ids(missing, fields=("name",))
+            for chat in chats:
+                if not getattr(chat, "username", None):
+                    chat.username = users.get(chat.user_id, {}).get("name") or default
+        return chats
+
     def get_all_users(self):
         users = self.users_collection.find()
         return [User.from_dict(user) for user in users]
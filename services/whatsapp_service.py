@@ -4,10 +4,12 @@ from datetime import datetime, timezone
 from typing import TypedDict, Literal, Optional
 from pymongo.collection import Collection
 from bson import ObjectId
+from services.channel_messages import ChannelMessages, RECENT_MESSAGES, CHANNEL_PAGE_SIZE
 
 class WhatsappUser(TypedDict):
     phone_no: str
-    messages: list
+    messages: list  # Only the most recent, every message is in whatsapp_messages
+    message_count: int
     updated_at: datetime
     created_at: datetime
     admin_enabled:bool
@@ -16,11 +18,13 @@ class WhatsappService:
     def __init__(self, db):
         self.db = db
         self.whatsapp_collection: Collection[WhatsappUser] = db.whatsapp
+        self.store = ChannelMessages(self.whatsapp_collection, db.whatsapp_messages, "phone_no")
     
     def create(self, phone_no):
         wa_doc = {
             "phone_no": phone_no,
             "messages": [],
+            "message_count": 0,
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc),
             "admin_enabled":False
@@ -49,10 +53,6 @@ class WhatsappService:
         Returns:
             Message object with id if successful, None otherwise
         """
-        chat = self.get_by_phone_no(phone_no)
-        if not chat:
-            return None
-        
         # Generate unique message ID
         message_id = str(uuid.uuid4())
         
@@ -70,7 +70,13 @@ class WhatsappService:
             # Determine file extension based on sender
             file_extension = ".wav" if sender == "bot" else ".ogg"
             file_path = os.path.join('files', phone_no, f"{message_id}{file_extension}")
-            
+            message_doc["audio_path"] = file_path
+        
+        # One update, no read of the thread first
+        if not self.store.add(phone_no, message_doc):
+            return None
+
+        if "audio_path" in message_doc:
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
@@ -79,54 +85,25 @@ class WhatsappService:
                 f.write(audio_bytes)
             
             print(f"Saved audio file: {file_path}")
-            message_doc["audio_path"] = file_path
-        
-        print({"phone_no": phone_no})
-        
-        # Update database
-        result = self.whatsapp_collection.update_one(
-            {"phone_no": phone_no},
-            {
-                "$push": {"messages": message_doc},
-                "$set": {"updated_at": datetime.now(timezone.utc)}
-            }
-        )
         
         return message_id
-            # return type('Message', (), message_doc)()  # Return message object
-        # return None
     
-    def get_by_phone_no(self, phone_no):
-        chat_data = self.whatsapp_collection.find_one(
-            {"phone_no": phone_no},
-            {"_id": 0}
-        )
-        return chat_data
+    def exists(self, phone_no):
+        return self.store.exists(phone_no)
+
+    def get_by_phone_no(self, phone_no, message_limit=RECENT_MESSAGES):
+        """The chat with its last `message_limit` messages"""
+        return self.store.thread(phone_no, message_limit)
     
-    def get_messages(self, phone_no, limit=50):
-        """Get recent messages for a phone number"""
-        chat = self.get_by_phone_no(phone_no)
-        if not chat:
-            return []
-        
-        messages = chat.get("messages", [])
-        return messages[-limit:] if len(messages) > limit else messages
+    def get_messages(self, phone_no, limit=50, before=None):
+        """Get recent messages for a phone number, or the ones before `before`"""
+        return self.store.window(phone_no, limit, before)
     
     def get_message_by_id(self, phone_no, message_id):
         """Get a specific message by ID"""
-        chat = self.get_by_phone_no(phone_no)
-        if not chat:
-            return None
-        
-        for msg in chat.get("messages", []):
-            if msg.get("id") == message_id:
-                return msg
-        return None
+        return self.store.find(phone_no, message_id)
 
-    def get_all_chats(self):
-        chat_data = self.whatsapp_collection.find(
-            {},
-            {"_id": 0}
-        )
-        return chat_data
+    def list_chats(self, cursor=None, page_size=CHANNEL_PAGE_SIZE):
+        """(chats, next_cursor): a page of chats, newest activity first, with only the last message"""
+        return self.store.list_threads(cursor, page_size)
 
@@ -8,10 +8,11 @@ import aiohttp
 import asyncio
 import datetime
 from quart import Quart, websocket
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 import requests
+from services.tool_registry import tool_registry
+from services.llm_transport import get_transport
 
 # Load environment variables
 load_dotenv()
@@ -33,8 +34,9 @@ app = Quart(__name__)
 
 
 class GeminiTwilioBridge:
-    def __init__(self):
-        self.client = genai.Client(api_key=os.getenv("GEMINI_KEY"))
+    def __init__(self, client=None):
+        # Live, recording or scripted client depending on LLM_TRANSPORT
+        self.client = client or get_transport().genai_client(os.getenv("GEMINI_KEY"))
         self.model_id = "gemini-2.5-flash-native-audio-latest"
 
         # ---- Unique per-call identifiers ----
@@ -55,7 +57,7 @@ class GeminiTwilioBridge:
         self.merged_wav.setframerate(16000)
 
         # ---- Aldar Exchange API base URL ----
-        self.aldar_base_url = os.getenv("ALDAR_BASE_API_URL")
+        self.aldar_base_url = tool_registry.base_url
 
         print(f"📁 Created file for this call: {self.filename}")
 
@@ -77,117 +79,12 @@ class GeminiTwilioBridge:
                 },
             "systemInstruction":self.system_instruction,
 
-            "tools":[{"function_declarations":[
-                {
-                    "name": "get_branch_details",
-                    "description": "Get details of all Aldar Exchange branch locations including addresses, phone numbers, working hours, and coordinates.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {}
-                    }
-                },
-                {
-                    "name": "calculate_exchange",
-                    "description": "Calculate currency conversion between QAR and foreign currency. Specify either local currency amount (QAR) or foreign currency amount, not both.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "transaction_type": {
-                                "type": "string",
-                                "description": "Transaction type: 'tt' for transfer, 'BUY' for buying currency, 'SELL' for selling currency",
-                                "enum": ["tt", "BUY", "SELL"]
-                            },
-                            "currency_code": {
-                                "type": "string",
-                                "description": "3-letter ISO currency code (e.g., USD, EUR, GBP)"
-                            },
-                            "local_amount": {
-                                "type": "number",
-                                "description": "Amount in local currency (will always QAR or qatari riyal). Use 0 if specifying foreign amount."
-                            },
-                            "foreign_amount": {
-                                "type": "number",
-                                "description": "Amount in foreign currency. Use 0 if specifying local amount."
-                            }
-                        },
-                        "required": ["transaction_type", "currency_code", "local_amount", "foreign_amount"]
-                    }
-                },
-                {
-                    "name": "get_transaction_status",
-                    "description": "Get the status of a transaction using its reference number. Returns transaction status, message, and additional details if available.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "transaction_ref_no": {
-                                "type": "string",
-                                "description": "The transaction reference number (e.g., 63897333251760, 1882910250001460)"
-                            }
-                        },
-                        "required": ["transaction_ref_no"]
-                    }
-                },
-                {
-                    "name": "transfer_to_human_operator",
-                    "description": "Transfer the call to a human operator when the user requests to speak with a person, representative, or human agent. Use this when user explicitly asks to talk to someone or cannot be helped by the AI.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "reason": {
-                                "type": "string",
-                                "description": "Brief reason for the transfer (e.g., 'customer requested human agent', 'complex query requiring human assistance')"
-                            }
-                        },
-                        "required": ["reason"]
-                    }
-                }
-            ]}]
+            "tools": tool_registry.live_tools("voice")
         }
 
     def _call_aldar_api(self, function_name, parameters):
         """Execute actual API calls to Aldar Exchange"""
-        try:
-            if function_name == "get_exchange_rate":
-                rate_type = parameters.get("rate_type", 1)
-                url = f"{self.aldar_base_url}/api/User/GetRate"
-                response = requests.get(url, params={"type": rate_type})
-                response.raise_for_status()
-                return response.json()
-            
-            elif function_name == "get_branch_details":
-                url = f"{self.aldar_base_url}/api/User/GetBranchesDetails"
-                response = requests.get(url)
-                response.raise_for_status()
-                branches = response.json()
-                # Wrap list in dictionary as Gemini expects dict response
-                return {"branches": branches, "total_count": len(branches)}
-            
-            elif function_name == "calculate_exchange":
-                url = f"{self.aldar_base_url}/api/User/GetRate"
-                params = {
-                    "type": parameters.get("transaction_type"),
-                    "curcode": parameters.get("currency_code"),
-                    "lcyamount": parameters.get("local_amount", 0),
-                    "fcyamount": parameters.get("foreign_amount", 0)
-                }
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                return response.json()
-
-
-            elif function_name == "get_transaction_status":
-                tran_ref_no = parameters.get("transaction_ref_no")
-                url = f"{self.aldar_base_url}/api/User/GetTransactionDetails"
-                response = requests.get(url, params={"tranRefNo": tran_ref_no})
-                response.raise_for_status()
-                return response.json()
-
-
-            
-        except requests.exceptions.RequestException as e:
-            return {"error": f"API call failed: {str(e)}"}
-
-
+        return tool_registry.execute(function_name, parameters)
 
     def get_system_instruction(self):
         try: